@@ -0,0 +1,17 @@
+from django.contrib import admin
+
+from .models import AuditScan, AuditSession
+
+
+@admin.register(AuditSession)
+class AuditSessionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'location', 'status', 'started_by', 'created_at', 'closed_at')
+    list_filter = ('status',)
+    readonly_fields = ('created_at', 'closed_at')
+
+
+@admin.register(AuditScan)
+class AuditScanAdmin(admin.ModelAdmin):
+    list_display = ('equipment_uuid', 'session', 'observed_location', 'scanned_at')
+    list_filter = ('session',)
+    search_fields = ('equipment_uuid',)
@@ -0,0 +1,60 @@
+# Generated by Django 6.0 on 2026-10-19 21:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('locations', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('OPEN', 'Open'), ('CLOSED', 'Closed')], default='OPEN', max_length=20)),
+                ('note', models.TextField(blank=True, verbose_name='Note')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('closed_at', models.DateTimeField(blank=True, null=True)),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='audit_sessions', to='locations.location', verbose_name='Root Location')),
+                ('started_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='audit_sessions', to=settings.AUTH_USER_MODEL, verbose_name='Started By')),
+            ],
+            options={
+                'verbose_name': 'Audit Session',
+                'verbose_name_plural': 'Audit Sessions',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AuditScan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('equipment_uuid', models.UUIDField()),
+                ('scanned_at', models.DateTimeField()),
+                ('observed_location', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='locations.location')),
+                ('scanned_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scans', to='audits.auditsession')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('session', 'equipment_uuid'), name='unique_audit_scan')],
+            },
+        ),
+        migrations.CreateModel(
+            name='AuditSessionLocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='locations.location')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='locations', to='audits.auditsession')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('session', 'location'), name='unique_audit_location')],
+            },
+        ),
+    ]
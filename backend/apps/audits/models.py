@@ -0,0 +1,95 @@
+from django.conf import settings
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class AuditSession(models.Model):
+    """
+    A stock-take over a location subtree. The subtree is frozen into
+    AuditSessionLocation when the session opens, so the report compares
+    against the same set of locations however the tree changes meanwhile.
+    """
+
+    class Status(models.TextChoices):
+        OPEN = 'OPEN', _('Open')
+        CLOSED = 'CLOSED', _('Closed')
+
+    location = models.ForeignKey(
+        'locations.Location',
+        on_delete=models.PROTECT,
+        related_name='audit_sessions',
+        verbose_name=_('Root Location'),
+    )
+    status = models.CharField(
+        max_length=20, choices=Status.choices, default=Status.OPEN
+    )
+    note = models.TextField(blank=True, verbose_name=_('Note'))
+    started_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='audit_sessions',
+        verbose_name=_('Started By'),
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    closed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = _('Audit Session')
+        verbose_name_plural = _('Audit Sessions')
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f'Audit #{self.pk} ({self.location})'
+
+
+class AuditSessionLocation(models.Model):
+    session = models.ForeignKey(
+        AuditSession, on_delete=models.CASCADE, related_name='locations'
+    )
+    location = models.ForeignKey(
+        'locations.Location', on_delete=models.CASCADE, related_name='+'
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['session', 'location'], name='unique_audit_location'
+            )
+        ]
+
+
+class AuditScan(models.Model):
+    """
+    One scanned code per session. The UUID is not a foreign key: codes that
+    match no equipment are part of the report.
+    """
+
+    session = models.ForeignKey(
+        AuditSession, on_delete=models.CASCADE, related_name='scans'
+    )
+    equipment_uuid = models.UUIDField()
+    observed_location = models.ForeignKey(
+        'locations.Location',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+    )
+    scanned_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='+',
+    )
+    scanned_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['session', 'equipment_uuid'], name='unique_audit_scan'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.equipment_uuid} in audit #{self.session_id}'
@@ -0,0 +1,40 @@
+from rest_framework import serializers
+
+from apps.equipment.serializers import MAX_SCAN_BATCH
+from apps.locations.serializers import LocationSummarySerializer
+
+from .models import AuditSession
+
+
+class AuditSessionSerializer(serializers.ModelSerializer):
+    location_details = LocationSummarySerializer(source='location', read_only=True)
+    started_by = serializers.StringRelatedField(read_only=True)
+
+    class Meta:
+        model = AuditSession
+        fields = [
+            'id',
+            'location',
+            'location_details',
+            'status',
+            'note',
+            'started_by',
+            'created_at',
+            'closed_at',
+        ]
+        read_only_fields = ['status', 'started_by', 'created_at', 'closed_at']
+
+
+class AuditScanSerializer(serializers.Serializer):
+    uuid = serializers.UUIDField()
+    location = serializers.UUIDField(required=False)
+    scanned_at = serializers.DateTimeField(required=False)
+
+
+class AuditScanBatchSerializer(serializers.Serializer):
+    scans = AuditScanSerializer(many=True, allow_empty=False, max_length=MAX_SCAN_BATCH)
+
+
+class AuditCloseSerializer(serializers.Serializer):
+    mark_missing_lost = serializers.BooleanField(default=False)
+    apply_moves = serializers.BooleanField(default=False)
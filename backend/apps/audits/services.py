@@ -0,0 +1,284 @@
+"""
+Stock-take reconciliation.
+
+Every finding is a query over the session's frozen location scope and its
+scan table (anti-joins via EXISTS), so the database does the set work and
+the cost of a report does not depend on Python loops over 50k items.
+"""
+
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Subquery
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from apps.equipment import counters, sync
+from apps.equipment.models import Equipment
+from apps.equipment.serializers import MAX_SCAN_BATCH
+from apps.equipment.services import apply_scan_events
+from apps.locations.models import Location
+from apps.locations.services import get_descendant_ids
+from apps.transactions import events
+from apps.transactions.models import Transaction
+
+from .models import AuditScan, AuditSession, AuditSessionLocation
+
+# Statuses in which an item should physically be at its recorded location
+ON_SHELF_STATUSES = [
+    Equipment.Status.AVAILABLE,
+    Equipment.Status.PENDING_BORROW,
+    Equipment.Status.PENDING_DISPATCH,
+    Equipment.Status.MAINTENANCE,
+    Equipment.Status.TO_BE_MOVED,
+]
+
+SECTIONS = ('missing', 'unexpected', 'misplaced', 'unknown')
+
+
+def open_session(location, user, note=''):
+    with transaction.atomic():
+        session = AuditSession.objects.create(
+            location=location, started_by=user, note=note
+        )
+        AuditSessionLocation.objects.bulk_create(
+            AuditSessionLocation(session=session, location_id=pk)
+            for pk in get_descendant_ids(location.pk)
+        )
+    return session
+
+
+def record_scans(session, scans, user):
+    """
+    Stores a batch of scans (dicts with `uuid`, optional `location` and
+    `scanned_at`). Re-scanning a code keeps only the latest observation.
+    """
+    if session.status != AuditSession.Status.OPEN:
+        raise ValidationError('Audit session is closed')
+
+    latest = {}
+    for scan in scans:
+        latest[scan['uuid']] = scan
+    location_ids = {
+        scan['location'] for scan in latest.values() if scan.get('location')
+    }
+    unknown = location_ids - set(
+        Location.objects.filter(pk__in=location_ids).values_list('pk', flat=True)
+    )
+    if unknown:
+        raise ValidationError(
+            {'location': [f'Unknown location {pk}' for pk in sorted(map(str, unknown))]}
+        )
+
+    now = timezone.now()
+    AuditScan.objects.bulk_create(
+        [
+            AuditScan(
+                session=session,
+                equipment_uuid=uuid,
+                observed_location_id=scan.get('location'),
+                scanned_by=user,
+                scanned_at=scan.get('scanned_at') or now,
+            )
+            for uuid, scan in latest.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['session', 'equipment_uuid'],
+        update_fields=['observed_location', 'scanned_by', 'scanned_at'],
+    )
+    return len(latest)
+
+
+def _scope(session):
+    return AuditSessionLocation.objects.filter(session=session).values('location_id')
+
+
+def _scans(session):
+    return AuditScan.objects.filter(session=session)
+
+
+def expected_equipment(session):
+    return Equipment.objects.filter(
+        location_id__in=_scope(session), status__in=ON_SHELF_STATUSES
+    )
+
+
+def missing_equipment(session):
+    """
+    Expected on a shelf in scope, but never scanned.
+    """
+    scanned = _scans(session).filter(equipment_uuid=OuterRef('pk'))
+    return expected_equipment(session).exclude(Exists(scanned))
+
+
+def unexpected_equipment(session):
+    """
+    Scanned, but recorded outside the scope or in a status that means it
+    should not be on a shelf (borrowed, dispatched, lost, ...).
+    """
+    scanned = _scans(session).filter(equipment_uuid=OuterRef('pk'))
+    return Equipment.objects.filter(Exists(scanned)).exclude(
+        location_id__in=_scope(session), status__in=ON_SHELF_STATUSES
+    )
+
+
+def misplaced_equipment(session):
+    """
+    Expected in scope and scanned, but at a different location than recorded.
+    """
+    observed = _scans(session).filter(equipment_uuid=OuterRef('pk'))
+    return (
+        expected_equipment(session)
+        .annotate(observed_location=Subquery(observed.values('observed_location')[:1]))
+        .filter(observed_location__isnull=False)
+        .exclude(observed_location=F('location_id'))
+    )
+
+
+def unknown_scans(session):
+    """
+    Scanned codes that match no equipment at all.
+    """
+    return _scans(session).exclude(
+        Exists(Equipment.objects.filter(pk=OuterRef('equipment_uuid')))
+    )
+
+
+def _section(session, name):
+    return {
+        'missing': missing_equipment,
+        'unexpected': unexpected_equipment,
+        'misplaced': misplaced_equipment,
+        'unknown': unknown_scans,
+    }[name](session)
+
+
+def build_report(session, limit=100, offset=0):
+    """
+    Counts per finding plus one page (`limit`, `offset`) of items each.
+    """
+    report = {
+        'expected': expected_equipment(session).count(),
+        'scanned': _scans(session).count(),
+    }
+    for name in SECTIONS:
+        queryset = _section(session, name)
+        if name == 'unknown':
+            items = queryset.order_by('equipment_uuid').values(
+                'equipment_uuid', 'observed_location', 'scanned_at'
+            )
+        else:
+            fields = ['uuid', 'name', 'status', 'location', 'zone', 'cabinet', 'number']
+            if name == 'misplaced':
+                fields.append('observed_location')
+            items = queryset.order_by('uuid').values(*fields)
+        report[name] = {
+            'count': queryset.count(),
+            'items': list(items[offset : offset + limit]),
+        }
+    return report
+
+
+def mark_missing_lost(session, user):
+    """
+    Sets every missing item to LOST with one UPDATE and logs it with one bulk
+    INSERT of MARK_LOST transactions. Counters move per (status, category,
+    location) group rather than per item; the equipment.status events are
+    published in one insert when the transaction commits.
+
+    Items with a pending request are left alone: the request still has to be
+    approved or rejected, and both must find the item where it was requested.
+    """
+    pending = Transaction.objects.filter(
+        equipment=OuterRef('pk'), status=Transaction.Status.PENDING_APPROVAL
+    )
+    missing = missing_equipment(session).exclude(Exists(pending))
+    with transaction.atomic(), counters.batch(), sync.batch():
+        items = list(
+            missing.select_for_update().only(
+                'uuid', 'version', 'location_id', 'zone', 'cabinet', 'number'
+            )
+        )
+        groups = (
+            missing.values('status', 'category_id', 'location_id')
+            .order_by()
+            .annotate(n=Count('pk'))
+        )
+        for row in groups:
+            counters.record_change(
+                (row['status'], row['category_id'], row['location_id']),
+                (Equipment.Status.LOST, row['category_id'], row['location_id']),
+                count=row['n'],
+            )
+        missing.update(
+            status=Equipment.Status.LOST,
+            version=F('version') + 1,
+            updated_at=timezone.now(),
+        )
+        for item in items:
+            item.status = Equipment.Status.LOST
+            item.version += 1
+        Transaction.objects.bulk_create(
+            (
+                Transaction(
+                    equipment=item,
+                    user=user,
+                    action=Transaction.Action.MARK_LOST,
+                    status=Transaction.Status.COMPLETED,
+                    location_id=item.location_id,
+                    zone=item.zone,
+                    cabinet=item.cabinet,
+                    number=item.number,
+                    reason=f'Missing in audit session {session.pk}',
+                )
+                for item in items
+            ),
+            batch_size=500,
+        )
+        sync.record(sync.EQUIPMENT, [item.pk for item in items])
+        events.equipment_status_events(items)
+    return len(items)
+
+
+def apply_observed_locations(session, user):
+    """
+    Moves misplaced and unexpected items to where they were scanned, through
+    the same path as offline scan uploads (logged like manual edits).
+    """
+    misplaced = Equipment.objects.filter(pk=OuterRef('equipment_uuid')).exclude(
+        location_id=OuterRef('observed_location')
+    )
+    scans = (
+        _scans(session)
+        .filter(observed_location__isnull=False)
+        .filter(Exists(misplaced))
+        .order_by('pk')
+        .values_list('equipment_uuid', 'observed_location', 'scanned_at')
+    )
+    observed = [
+        {'uuid': uuid, 'location': location, 'scanned_at': scanned_at}
+        for uuid, location, scanned_at in scans.iterator()
+    ]
+    applied = 0
+    for start in range(0, len(observed), MAX_SCAN_BATCH):
+        report = apply_scan_events(observed[start : start + MAX_SCAN_BATCH], user)
+        applied += len(report['applied'])
+    return applied
+
+
+def close_session(session, user, mark_lost=False, apply_moves=False):
+    """
+    Closes the session and optionally applies its corrections. Returns the
+    report as it stood before the corrections, with the correction counts.
+    """
+    with transaction.atomic():
+        session = AuditSession.objects.select_for_update().get(pk=session.pk)
+        if session.status != AuditSession.Status.OPEN:
+            raise ValidationError('Audit session is already closed')
+        report = build_report(session)
+        report['corrections'] = {
+            'marked_lost': mark_missing_lost(session, user) if mark_lost else 0,
+            'moved': apply_observed_locations(session, user) if apply_moves else 0,
+        }
+        session.status = AuditSession.Status.CLOSED
+        session.closed_at = timezone.now()
+        session.save(update_fields=['status', 'closed_at'])
+    return session, report
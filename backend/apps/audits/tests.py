@@ -0,0 +1,148 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from apps.equipment import counters
+from apps.equipment.models import Equipment
+from apps.locations.models import Location
+from apps.transactions import events
+from apps.transactions.models import StreamEvent, Transaction
+
+from .models import AuditSession
+
+User = get_user_model()
+
+
+class AuditSessionTests(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username='auditor', email='auditor@test.com', password='password', role=User.Role.MANAGER)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.manager)
+        self.warehouse = Location.objects.create(name='Warehouse')
+        self.shelf = Location.objects.create(name='Shelf 1', parent=self.warehouse)
+        self.bin = Location.objects.create(name='Bin 3', parent=self.shelf)
+        self.office = Location.objects.create(name='Office')
+
+        self.present = Equipment.objects.create(name='Present', location=self.shelf)
+        self.missing = Equipment.objects.create(name='Missing', location=self.bin)
+        self.misplaced = Equipment.objects.create(name='Misplaced', location=self.shelf)
+        self.borrowed = Equipment.objects.create(name='Borrowed', location=self.shelf, status=Equipment.Status.BORROWED)
+        self.foreign = Equipment.objects.create(name='From Office', location=self.office)
+        self.unlocated = Equipment.objects.create(name='Unlocated')
+        self.elsewhere = Equipment.objects.create(name='Not Audited', location=self.office)
+
+    def _open(self):
+        response = self.client.post('/api/v1/audits/', {'location': str(self.warehouse.uuid)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+
+    def _scan(self, session_id, scans):
+        return self.client.post(f'/api/v1/audits/{session_id}/scans/', {'scans': scans}, format='json')
+
+    def _scan_all(self, session_id):
+        unknown = '22222222-2222-2222-2222-222222222222'
+        response = self._scan(session_id, [
+            {'uuid': str(self.present.uuid), 'location': str(self.shelf.uuid)},
+            {'uuid': str(self.misplaced.uuid), 'location': str(self.shelf.uuid)},
+            {'uuid': str(self.borrowed.uuid)},
+            {'uuid': str(self.foreign.uuid), 'location': str(self.bin.uuid)},
+        ])
+        self.assertEqual(response.data['stored'], 4)
+        # 第二批：重複掃描以最新位置為準
+        self._scan(session_id, [
+            {'uuid': str(self.misplaced.uuid), 'location': str(self.bin.uuid)},
+            {'uuid': str(self.unlocated.uuid)},
+            {'uuid': unknown},
+        ])
+        return unknown
+
+    def test_report_classifies_findings(self):
+        """測試盤點報告區分缺少、非預期、錯置與未知條碼"""
+        session_id = self._open()
+        unknown = self._scan_all(session_id)
+
+        response = self.client.get(f'/api/v1/audits/{session_id}/report/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data
+        self.assertEqual(data['expected'], 3)
+        self.assertEqual(data['scanned'], 6)
+        uuids = {name: {str(item.get('uuid', item.get('equipment_uuid'))) for item in data[name]['items']} for name in ('missing', 'unexpected', 'misplaced', 'unknown')}
+        self.assertEqual(uuids['missing'], {str(self.missing.uuid)})
+        self.assertEqual(uuids['unexpected'], {str(self.borrowed.uuid), str(self.foreign.uuid), str(self.unlocated.uuid)})
+        self.assertEqual(uuids['misplaced'], {str(self.misplaced.uuid)})
+        self.assertEqual(uuids['unknown'], {unknown})
+
+    def test_report_query_count_is_constant(self):
+        """測試報告查詢次數與資料量無關"""
+        session_id = self._open()
+        self._scan_all(session_id)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(f'/api/v1/audits/{session_id}/report/')
+
+        for i in range(30):
+            item = Equipment.objects.create(name=f'Bulk {i}', location=self.bin)
+            if i % 2:
+                self._scan(session_id, [{'uuid': str(item.uuid), 'location': str(self.shelf.uuid)}])
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(f'/api/v1/audits/{session_id}/report/')
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(response.data['missing']['count'], 16)
+
+    def test_close_applies_bulk_corrections(self):
+        """測試結束盤點時批量標記遺失並修正位置"""
+        session_id = self._open()
+        self._scan_all(session_id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/v1/audits/{session_id}/close/', {'mark_missing_lost': True, 'apply_moves': True}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['corrections'], {'marked_lost': 1, 'moved': 2})
+        self.assertEqual(response.data['session']['status'], AuditSession.Status.CLOSED)
+        self.missing.refresh_from_db()
+        self.assertEqual((self.missing.status, self.missing.version), (Equipment.Status.LOST, 2))
+        lost = Transaction.objects.get(equipment=self.missing, action=Transaction.Action.MARK_LOST)
+        self.assertEqual((lost.user, lost.status, lost.location), (self.manager, Transaction.Status.COMPLETED, self.missing.location))
+        self.assertIn(f'audit session {session_id}', lost.reason)
+        event = StreamEvent.objects.get(kind=events.EQUIPMENT_STATUS, payload__uuid=str(self.missing.uuid))
+        self.assertEqual(event.payload, {'uuid': str(self.missing.uuid), 'status': Equipment.Status.LOST, 'version': 2})
+        self.assertEqual(Equipment.objects.get(pk=self.misplaced.pk).location, self.bin)
+        self.assertEqual(Equipment.objects.get(pk=self.foreign.pk).location, self.bin)
+        self.assertTrue(Transaction.objects.filter(equipment=self.misplaced, action=Transaction.Action.MOVE_CONFIRM).exists())
+        self.assertEqual(Equipment.objects.get(pk=self.elsewhere.pk).status, Equipment.Status.AVAILABLE)
+        self.assertEqual(counters.reconcile(fix=False), {})
+
+        # 已結束的盤點不可再掃描或重複結束
+        self.assertEqual(self._scan(session_id, [{'uuid': str(self.present.uuid)}]).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.post(f'/api/v1/audits/{session_id}/close/').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_mark_lost_skips_items_with_pending_requests(self):
+        """測試標記遺失時略過仍有待審核申請的設備，申請之後仍可處理"""
+        requester = User.objects.create_user(username='audit_borrower', email='audit_borrower@test.com', password='password')
+        borrower = APIClient()
+        borrower.force_authenticate(user=requester)
+        response = borrower.post('/api/v1/transactions/borrow/', {'equipment_uuid': str(self.missing.uuid)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        session_id = self._open()
+        self._scan_all(session_id)
+
+        response = self.client.post(f'/api/v1/audits/{session_id}/close/', {'mark_missing_lost': True}, format='json')
+        self.assertEqual(response.data['corrections']['marked_lost'], 0)
+        self.missing.refresh_from_db()
+        self.assertEqual(self.missing.status, Equipment.Status.PENDING_BORROW)
+
+        request_id = Transaction.objects.get(equipment=self.missing, status=Transaction.Status.PENDING_APPROVAL).id
+        response = self.client.post(f'/api/v1/transactions/{request_id}/reject-borrow/', {'rejection_reason': 'Not on the shelf'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Equipment.objects.get(pk=self.missing.pk).status, Equipment.Status.AVAILABLE)
+        self.assertEqual(counters.reconcile(fix=False), {})
+
+    def test_only_managers_open_sessions(self):
+        """測試只有管理員可以開始盤點"""
+        user = User.objects.create_user(username='audit_user', email='audit_user@test.com', password='password')
+        self.client.force_authenticate(user=user)
+        response = self.client.post('/api/v1/audits/', {'location': str(self.warehouse.uuid)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
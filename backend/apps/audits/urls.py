@@ -0,0 +1,11 @@
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+
+from .views import AuditSessionViewSet
+
+router = DefaultRouter()
+router.register(r'audits', AuditSessionViewSet)
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
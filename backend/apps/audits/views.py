@@ -0,0 +1,81 @@
+from rest_framework import mixins, permissions, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from apps.users.permissions import IsManagerOrAdmin
+
+from . import services
+from .models import AuditSession
+from .serializers import (
+    AuditCloseSerializer,
+    AuditScanBatchSerializer,
+    AuditSessionSerializer,
+)
+
+REPORT_PAGE_SIZE = 100
+REPORT_MAX_PAGE_SIZE = 1000
+
+
+class AuditSessionViewSet(
+    mixins.CreateModelMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    Stock-take sessions: open over a location subtree, stream scans in with
+    `scans`, read findings from `report`, then `close` with optional bulk
+    corrections.
+    """
+
+    queryset = AuditSession.objects.select_related('location', 'started_by')
+    serializer_class = AuditSessionSerializer
+
+    def get_permissions(self):
+        if self.action in ['create', 'close']:
+            permission_classes = [IsManagerOrAdmin]
+        else:
+            permission_classes = [permissions.IsAuthenticated]
+        return [permission() for permission in permission_classes]
+
+    def perform_create(self, serializer):
+        session = services.open_session(
+            serializer.validated_data['location'],
+            self.request.user,
+            note=serializer.validated_data.get('note', ''),
+        )
+        serializer.instance = session
+
+    @action(detail=True, methods=['post'], serializer_class=AuditScanBatchSerializer)
+    def scans(self, request, pk=None):  # noqa: ARG002
+        session = self.get_object()
+        serializer = AuditScanBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        stored = services.record_scans(
+            session, serializer.validated_data['scans'], request.user
+        )
+        return Response({'stored': stored})
+
+    @action(detail=True, methods=['get'])
+    def report(self, request, pk=None):  # noqa: ARG002
+        session = self.get_object()
+        try:
+            limit = int(request.query_params.get('limit', REPORT_PAGE_SIZE))
+            offset = int(request.query_params.get('offset', 0))
+        except ValueError:
+            return Response({'detail': 'limit and offset must be integers'}, status=400)
+        limit = min(max(limit, 0), REPORT_MAX_PAGE_SIZE)
+        report = services.build_report(session, limit=limit, offset=max(offset, 0))
+        return Response({'session': self.get_serializer(session).data, **report})
+
+    @action(detail=True, methods=['post'], serializer_class=AuditCloseSerializer)
+    def close(self, request, pk=None):  # noqa: ARG002
+        serializer = AuditCloseSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        session, report = services.close_session(
+            self.get_object(),
+            request.user,
+            mark_lost=serializer.validated_data['mark_missing_lost'],
+            apply_moves=serializer.validated_data['apply_moves'],
+        )
+        return Response({'session': AuditSessionSerializer(session).data, **report})
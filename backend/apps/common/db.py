@@ -0,0 +1,58 @@
+"""
+Primary/replica routing.
+
+Writes always go to `default`. Reads go to a replica only while a request
+has opted in through ReplicaRoutingMiddleware (safe-method requests from
+clients that have not written recently); management commands, background
+jobs and every read inside a transaction on `default` stay on the primary,
+which keeps the select_for_update paths of TransactionService there.
+"""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_read_alias = ContextVar('replica_read_alias', default=None)
+
+
+def pick_replica():
+    replicas = settings.DATABASE_REPLICAS
+    return random.choice(replicas) if replicas else None
+
+
+@contextmanager
+def use_replica(alias):
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def use_primary():
+    """
+    Reads inside the block go to the primary, e.g. to re-read a row this
+    request just wrote.
+    """
+    return use_replica(None)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):  # noqa: ARG002
+        alias = _read_alias.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):  # noqa: ARG002
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):  # noqa: ARG002
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):  # noqa: ARG002
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,197 @@
+"""
+Protected media for local storage.
+
+Files are stored under unique names (a random suffix on every upload), so a
+URL always refers to the same bytes and browsers may cache it for good.
+Storage URLs carry an HMAC signature valid for one to two MEDIA_URL_TTL
+windows: API responses hand them to <img> tags and downloads, which cannot
+send the JWT header. serve_media accepts a valid signature or a JWT, then
+either names the file for the front proxy (MEDIA_SENDFILE = x-accel-redirect
+for nginx, x-sendfile for Apache/lighttpd), which also takes care of ranges,
+or streams it itself with single-range support.
+
+Uploads are untrusted: only raster images are shown inline, everything else
+(HTML, SVG, PDF, ...) is sent as a download, and every response carries a
+sandbox CSP so a file opened directly cannot run script in the site's origin.
+"""
+
+import mimetypes
+import os
+import re
+import time
+from urllib.parse import quote, urlencode
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.crypto import constant_time_compare, get_random_string, salted_hmac
+from django.utils.http import content_disposition_header, http_date
+from rest_framework import permissions
+from rest_framework.decorators import (
+    api_view,
+    authentication_classes,
+    permission_classes,
+)
+
+from apps.users.authentication import QueryParamJWTAuthentication
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+# Content behind a URL never changes; `private` keeps shared caches out
+CACHE_CONTROL = 'private, max-age=31536000, immutable'
+INLINE_CONTENT_TYPES = frozenset({'image/jpeg', 'image/png', 'image/gif', 'image/webp'})
+
+
+def _signature(name, expires):
+    return salted_hmac('media', f'{name}:{expires}').hexdigest()[:32]
+
+
+def signed_query(name, now=None):
+    """
+    Query string authorizing `name`. The expiry is rounded to MEDIA_URL_TTL
+    windows so the URL, and with it the browser cache entry, stays the same
+    for a whole window.
+    """
+    ttl = settings.MEDIA_URL_TTL
+    expires = (int(now or time.time()) // ttl + 2) * ttl
+    return urlencode({'expires': expires, 'signature': _signature(name, expires)})
+
+
+def has_valid_signature(name, params, now=None):
+    try:
+        expires = int(params.get('expires', ''))
+    except ValueError:
+        return False
+    return expires > (now or time.time()) and constant_time_compare(
+        params.get('signature', ''), _signature(name, expires)
+    )
+
+
+class ProtectedMediaStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        directory, file_name = os.path.split(name)
+        root, ext = os.path.splitext(file_name)
+        name = os.path.join(directory, f'{root}_{get_random_string(7)}{ext}')
+        return super().get_available_name(name, max_length=max_length)
+
+    def url(self, name):
+        return f'{super().url(name)}?{signed_query(name)}'
+
+
+class SignedOrAuthenticated(permissions.BasePermission):
+    def has_permission(self, request, view):
+        return has_valid_signature(view.kwargs['path'], request.query_params) or bool(
+            request.user and request.user.is_authenticated
+        )
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single `bytes=` range, None to send the
+    whole file (no or unsupported header), or ValueError if unsatisfiable.
+    """
+    match = RANGE_PATTERN.match(header or '')
+    if not match or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError('Empty suffix range')
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError('Range not satisfiable')
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+@api_view(['GET', 'HEAD'])
+@authentication_classes([QueryParamJWTAuthentication])
+@permission_classes([SignedOrAuthenticated])
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404() from None
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404() from None
+    if not os.path.isfile(full_path):
+        raise Http404()
+
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': CACHE_CONTROL,
+        'Accept-Ranges': 'bytes',
+        'Content-Security-Policy': 'sandbox',
+    }
+    if request.headers.get('If-None-Match') == etag:
+        return HttpResponse(status=304, headers=headers)
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    as_attachment = content_type not in INLINE_CONTENT_TYPES
+    file_name = os.path.basename(full_path)
+    headers['Content-Disposition'] = content_disposition_header(
+        as_attachment, file_name
+    )
+    mode = settings.MEDIA_SENDFILE
+    if mode == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + quote(path)
+        return response
+    if mode == 'x-sendfile':
+        response = HttpResponse(content_type=content_type, headers=headers)
+        response['X-Sendfile'] = full_path
+        return response
+
+    size = stat.st_size
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != etag:
+        # The client's partial copy is outdated: send everything
+        range_header = None
+    try:
+        byte_range = parse_range(range_header, size)
+    except ValueError:
+        return HttpResponse(
+            status=416, headers={**headers, 'Content-Range': f'bytes */{size}'}
+        )
+
+    if byte_range is None:
+        response = FileResponse(
+            open(full_path, 'rb'),  # noqa: SIM115 (closed by FileResponse)
+            as_attachment=as_attachment,
+            filename=file_name,
+            content_type=content_type,
+            headers=headers,
+        )
+        response['Content-Length'] = size
+        return response
+    start, end = byte_range
+    response = StreamingHttpResponse(
+        _read_range(full_path, start, end - start + 1),
+        status=206,
+        content_type=content_type,
+        headers=headers,
+    )
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = end - start + 1
+    return response
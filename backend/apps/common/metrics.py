@@ -0,0 +1,182 @@
+"""
+Per-view request metrics in Prometheus text format.
+
+RequestMetricsMiddleware (apps.common.middleware) records wall time, query
+time, query count and response rendering time for every request, labelled
+with the DRF view and action (`EquipmentViewSet.list`). Each process keeps
+its histograms in memory. With METRICS_DIR set, every process also writes
+them to `<METRICS_DIR>/<pid>.json` at most every METRICS_FLUSH_SECONDS, and
+/metrics adds up the files of all gunicorn workers. This is the same scheme
+as prometheus_client's multiprocess mode: totals of exited workers stay in
+their files, so clear the directory when the server starts.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+
+PREFIX = 'qrems_'
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# name -> (help, buckets)
+HISTOGRAMS = {
+    'http_request_duration_seconds': (
+        'Wall time spent handling the request.',
+        TIME_BUCKETS,
+    ),
+    'http_request_db_seconds': (
+        'Time spent executing database queries.',
+        TIME_BUCKETS,
+    ),
+    'http_request_serialize_seconds': (
+        'Time spent rendering the response body.',
+        TIME_BUCKETS,
+    ),
+    'http_request_queries': ('Database queries per request.', QUERY_BUCKETS),
+}
+REQUESTS_TOTAL = 'http_requests_total'
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (histogram, view, method) -> per-bucket counts, +Inf count, sum
+        self._histograms = {}
+        # (view, method, status) -> count
+        self._requests = {}
+        self._flushed_at = 0.0
+
+    def observe(self, view, method, status, values):
+        """`values` maps histogram names to this request's measurement."""
+        with self._lock:
+            for name, value in values.items():
+                buckets = HISTOGRAMS[name][1]
+                series = self._histograms.setdefault(
+                    (name, view, method), [0] * (len(buckets) + 2)
+                )
+                series[bisect_left(buckets, value)] += 1
+                series[-1] += value
+            key = (view, method, str(status))
+            self._requests[key] = self._requests.get(key, 0) + 1
+        directory = settings.METRICS_DIR
+        if (
+            directory
+            and time.monotonic() - self._flushed_at >= settings.METRICS_FLUSH_SECONDS
+        ):
+            self.flush(directory)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'histograms': [[*key, list(v)] for key, v in self._histograms.items()],
+                'requests': [[*key, count] for key, count in self._requests.items()],
+            }
+
+    def flush(self, directory, pid=None):
+        self._flushed_at = time.monotonic()
+        path = Path(directory) / f'{pid or os.getpid()}.json'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_suffix(f'.{threading.get_ident()}.tmp')
+        temporary.write_text(json.dumps(self.snapshot()))
+        # Readers only ever see a complete file
+        os.replace(temporary, path)
+
+    def collect(self, directory=None):
+        """This process's metrics plus those of the other workers' files."""
+        snapshots = [self.snapshot()]
+        if directory:
+            own = f'{os.getpid()}.json'
+            for path in Path(directory).glob('*.json'):
+                if path.name == own:
+                    continue
+                try:
+                    snapshots.append(json.loads(path.read_text()))
+                except (OSError, ValueError):
+                    continue
+        return merge(snapshots)
+
+
+def merge(snapshots):
+    histograms = {}
+    requests = {}
+    for snapshot in snapshots:
+        for name, view, method, values in snapshot['histograms']:
+            series = histograms.setdefault((name, view, method), [0] * len(values))
+            for i, value in enumerate(values):
+                series[i] += value
+        for view, method, status, count in snapshot['requests']:
+            key = (view, method, status)
+            requests[key] = requests.get(key, 0) + count
+    return histograms, requests
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+    return '{' + pairs + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(histograms, requests):
+    """Prometheus text exposition format, version 0.0.4."""
+    lines = [
+        f'# HELP {PREFIX}{REQUESTS_TOTAL} Requests handled, by view and status.',
+        f'# TYPE {PREFIX}{REQUESTS_TOTAL} counter',
+    ]
+    for (view, method, status), count in sorted(requests.items()):
+        labels = _labels(view=view, method=method, status=status)
+        lines.append(f'{PREFIX}{REQUESTS_TOTAL}{labels} {count}')
+
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        metric = PREFIX + name
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} histogram']
+        for (series_name, view, method), values in sorted(histograms.items()):
+            if series_name != name:
+                continue
+            cumulative = 0
+            for bound, count in zip((*buckets, '+Inf'), values[:-1], strict=True):
+                cumulative += count
+                labels = _labels(view=view, method=method, le=bound)
+                lines.append(f'{metric}_bucket{labels} {cumulative}')
+            labels = _labels(view=view, method=method)
+            lines.append(f'{metric}_sum{labels} {_number(values[-1])}')
+            lines.append(f'{metric}_count{labels} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+@atexit.register
+def _flush_on_exit():
+    if settings.configured and settings.METRICS_DIR:
+        registry.flush(settings.METRICS_DIR)
+
+
+def metrics_view(request):
+    """
+    GET /metrics for Prometheus. Requires `Authorization: Bearer
+    <METRICS_TOKEN>` when METRICS_TOKEN is set.
+    """
+    token = settings.METRICS_TOKEN
+    if token and not constant_time_compare(
+        request.headers.get('Authorization', ''), f'Bearer {token}'
+    ):
+        return HttpResponse(status=401)
+    body = render(*registry.collect(settings.METRICS_DIR))
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
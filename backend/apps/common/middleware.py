@@ -0,0 +1,228 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import metrics, queries
+from .db import pick_replica, use_replica
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PRIMARY_PIN_COOKIE = 'db_primary_pin'
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Sends the reads of safe-method requests to a replica. A request with
+    another method sets a short-lived cookie that keeps the client's reads on
+    the primary for REPLICA_PIN_SECONDS, so it sees its own writes despite
+    replication lag.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        with use_replica(self._read_alias(request)):
+            response = self.get_response(request)
+        return self._pin_writer(request, response)
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+
+        # The alias is a context variable, so the ORM's sync_to_async threads
+        # see it too
+        with use_replica(self._read_alias(request)):
+            response = await self.get_response(request)
+        return self._pin_writer(request, response)
+
+    def _read_alias(self, request):
+        safe = request.method in SAFE_METHODS
+        pinned = PRIMARY_PIN_COOKIE in request.COOKIES
+        return pick_replica() if safe and not pinned else None
+
+    def _pin_writer(self, request, response):
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(
+                PRIMARY_PIN_COOKIE,
+                '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
+
+
+class QueryTimer:
+    """execute_wrapper that counts queries and adds up their duration."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+def view_name(request):
+    """
+    `<class>.<action>` for DRF views (`EquipmentViewSet.list`), the function
+    name for plain views. Derived from code, not the URL, so the label set
+    stays bounded.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    view = match.func
+    cls = getattr(view, 'cls', None)
+    if cls is None:
+        return view.__name__
+    method = request.method.lower()
+    action = (getattr(view, 'actions', None) or {}).get(method)
+    if action:
+        return f'{cls.__name__}.{action}'
+    if getattr(view, 'actions', None) is None and hasattr(cls, method):
+        return f'{cls.__name__}.{method}'
+    return cls.__name__
+
+
+class RequestMetricsMiddleware:
+    """
+    Measures wall time, database time and query count (all connections) and
+    response rendering time, returns them in a Server-Timing header and
+    records them in apps.common.metrics. Listed first so the time includes
+    the other middleware. Streaming responses are timed up to their first
+    byte.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # Django would run a sync hook through sync_to_async
+            self.process_template_response = self._aprocess_template_response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with queries.observe_queries(timer):
+            response = self.get_response(request)
+        return self._record(request, response, timer, started)
+
+    async def __acall__(self, request):
+        timer = QueryTimer()
+        started = time.perf_counter()
+        # Also counts the queries the ORM runs in sync_to_async threads
+        with queries.observe_queries(timer):
+            response = await self.get_response(request)
+        return self._record(request, response, timer, started)
+
+    def _record(self, request, response, timer, started):
+        total = time.perf_counter() - started
+        serialize = getattr(request, '_render_seconds', 0.0)
+
+        metrics.registry.observe(
+            view_name(request),
+            request.method,
+            response.status_code,
+            {
+                'http_request_duration_seconds': total,
+                'http_request_db_seconds': timer.seconds,
+                'http_request_serialize_seconds': serialize,
+                'http_request_queries': timer.count,
+            },
+        )
+        response['Server-Timing'] = ', '.join(
+            [
+                f'db;dur={timer.seconds * 1000:.1f};desc="{timer.count} queries"',
+                f'serialize;dur={serialize * 1000:.1f}',
+                f'total;dur={total * 1000:.1f}',
+            ]
+        )
+        return response
+
+    def process_template_response(self, request, response):
+        # Called last among the middleware, right before DRF renders the body
+        started = time.perf_counter()
+
+        def rendered(_response):
+            request._render_seconds = time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    async def _aprocess_template_response(self, request, response):
+        return RequestMetricsMiddleware.process_template_response(
+            self, request, response
+        )
+
+
+class QueryInspectorMiddleware:
+    """
+    Development/test check for N+1 queries and per-view query budgets (see
+    apps.common.queries); QUERY_INSPECTOR picks 'off', 'warn' or 'raise'.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        mode = settings.QUERY_INSPECTOR
+        if mode == queries.OFF:
+            return self.get_response(request)
+
+        with queries.inspect_queries() as inspector:
+            response = self.get_response(request)
+        self._check(request, inspector, mode)
+        return response
+
+    async def __acall__(self, request):
+        mode = settings.QUERY_INSPECTOR
+        if mode == queries.OFF:
+            return await self.get_response(request)
+
+        with queries.inspect_queries() as inspector:
+            response = await self.get_response(request)
+        self._check(request, inspector, mode)
+        return response
+
+    def _check(self, request, inspector, mode):
+        match = getattr(request, 'resolver_match', None)
+        name = view_name(request)
+        checked, budget = queries.view_budget(
+            getattr(match.func, 'cls', None) if match else None,
+            name.rpartition('.')[2],
+        )
+        if checked:
+            problems = inspector.problems(budget, settings.QUERY_REPEAT_THRESHOLD)
+            queries.report(f'{request.method} {request.path} ({name})', problems, mode)
@@ -0,0 +1,23 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class HistoryCursorPagination(CursorPagination):
+    """
+    Keyset pagination for append-only logs: newest first, stable under inserts
+    and O(page size) regardless of how deep the client pages.
+    """
+
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class LargePageNumberPagination(PageNumberPagination):
+    """
+    Page-number pagination that lets admin screens ask for bigger pages with
+    `?page_size=`; only for views whose queryset has a constant query plan.
+    """
+
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
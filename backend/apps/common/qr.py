@@ -0,0 +1,89 @@
+"""
+QR code rendering from qrcode's module matrix.
+
+qrcode's PIL image factory draws every dark module as its own rectangle.
+Here the matrix is turned into a 1-bit image in one step instead, by packing
+one pixel per module and letting Pillow scale it up with nearest-neighbour
+resampling. SVG output merges each row's dark modules into horizontal runs,
+one path segment per run.
+"""
+
+from io import BytesIO
+from itertools import groupby
+
+import qrcode
+from PIL import Image
+
+DEFAULT_BOX_SIZE = 10
+DEFAULT_BORDER = 4
+MAX_SIZE = 4096
+MAX_BORDER = 16
+
+
+def module_matrix(data, border=DEFAULT_BORDER, error_correction=None):
+    """
+    Boolean matrix (True = dark) including a `border`-module quiet zone.
+    """
+    qr = qrcode.QRCode(
+        version=None,
+        error_correction=error_correction or qrcode.constants.ERROR_CORRECT_L,
+        border=border,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+
+def _bitmap_pillow(matrix, scale):
+    side = len(matrix)
+    padding = -side % 8
+    rows = bytearray()
+    for row in matrix:
+        bits = int(''.join('0' if dark else '1' for dark in row), 2) << padding
+        rows += bits.to_bytes((side + padding) // 8, 'big')
+    image = Image.frombytes('1', (side, side), bytes(rows))
+    if scale == 1:
+        return image
+    return image.resize((side * scale, side * scale), Image.Resampling.NEAREST)
+
+
+def render_png(matrix, scale=DEFAULT_BOX_SIZE):
+    """
+    1-bit PNG with every module `scale` pixels wide.
+    """
+    image = _bitmap_pillow(matrix, scale)
+    buffer = BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def render_svg(matrix, size=None):
+    """
+    SVG in module units (viewBox), one `h` segment per horizontal run of dark
+    modules. `size` sets the rendered width/height in pixels.
+    """
+    side = len(matrix)
+    segments = []
+    for y, row in enumerate(matrix):
+        x = 0
+        for dark, run in groupby(row):
+            length = sum(1 for _ in run)
+            if dark:
+                segments.append(f'M{x} {y}h{length}v1h-{length}z')
+            x += length
+    size = size or side * DEFAULT_BOX_SIZE
+    return (
+        '<svg xmlns="http://www.w3.org/2000/svg" '
+        f'width="{size}" height="{size}" viewBox="0 0 {side} {side}" '
+        'shape-rendering="crispEdges">'
+        f'<rect width="{side}" height="{side}" fill="#fff"/>'
+        f'<path d="{"".join(segments)}" fill="#000"/>'
+        '</svg>'
+    )
+
+
+def scale_for_size(matrix, size):
+    """
+    Largest whole-pixel module size that fits in `size` pixels (at least 1).
+    """
+    return max(1, size // len(matrix))
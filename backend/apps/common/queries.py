@@ -0,0 +1,237 @@
+"""
+N+1 query detection for development and tests.
+
+QueryInspector is an execute_wrapper that records the SQL a block of code
+runs, with the application frames that ran each statement. Statements that
+differ only in their parameters (or the length of an IN list) have the same
+shape; a shape that runs QUERY_REPEAT_THRESHOLD or more times is reported as
+an N+1 pattern, as is running more queries than the budget.
+
+- QueryInspectorMiddleware (apps.common.middleware) checks every request when
+  QUERY_INSPECTOR is 'warn' (log a warning with the stack) or 'raise' (raise
+  QueryBudgetError, which fails the test that made the request).
+- query_budget() does the same around any block of code.
+- QueryCheckingTestRunner (TEST_RUNNER) runs the test suite with 'raise'
+  and leaves out tests tagged 'slow' unless they are asked for.
+
+Views declare their budgets next to the code, per action:
+
+    query_budgets = {'list': 8, 'retrieve': 6, 'bulk_approve': None}
+
+None turns both checks off for actions that do per-item work by design.
+Code that repeats a statement on purpose (one UPDATE per distinct key, say)
+wraps it in expected_repeats() instead.
+"""
+
+import logging
+import re
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test.runner import DiscoverRunner
+
+logger = logging.getLogger(__name__)
+
+OFF = 'off'
+WARN = 'warn'
+RAISE = 'raise'
+
+# Statements every atomic block issues; repeating them is not an N+1
+_TRANSACTION_CONTROL = re.compile(
+    r'^\s*(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT|BEGIN|COMMIT)\b',
+    re.IGNORECASE,
+)
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+\b')
+_MULTI_VALUES = re.compile(r'VALUES (\([^()]*\))(?:, \([^()]*\))+')
+
+_expected = ContextVar('expected_repeats', default=False)
+
+_THIS_FILE = str(Path(__file__).resolve())
+_APP_ROOT = str(Path(settings.BASE_DIR).resolve())
+
+
+class QueryBudgetError(AssertionError):
+    pass
+
+
+def query_shape(sql):
+    """`sql` with parameters, literals, IN lists and multi-row VALUES folded."""
+    sql = _IN_LIST.sub('IN (...)', sql)
+    sql = _MULTI_VALUES.sub(r'VALUES \1, ...', sql)
+    sql = _STRING.sub('?', sql)
+    return _NUMBER.sub('?', sql)
+
+
+@contextmanager
+def expected_repeats():
+    """Queries run inside count towards budgets but not as N+1 patterns."""
+    token = _expected.set(True)
+    try:
+        yield
+    finally:
+        _expected.reset(token)
+
+
+def _app_stack():
+    """Frames of this project's code (not Django, DRF or this module)."""
+    return [
+        frame
+        for frame in traceback.extract_stack()[:-2]
+        if frame.filename.startswith(_APP_ROOT)
+        and frame.filename != _THIS_FILE
+        and '/site-packages/' not in frame.filename
+    ]
+
+
+class QueryInspector:
+    """execute_wrapper recording statement shapes and where they ran."""
+
+    def __init__(self):
+        self.count = 0
+        self.shapes = Counter()
+        # shape -> stack of its first run
+        self.stacks = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if _TRANSACTION_CONTROL.match(sql):
+            return execute(sql, params, many, context)
+        self.count += 1
+        if not _expected.get():
+            shape = query_shape(sql)
+            self.shapes[shape] += 1
+            if shape not in self.stacks:
+                self.stacks[shape] = _app_stack()
+        return execute(sql, params, many, context)
+
+    def repeated(self, threshold):
+        return [
+            (shape, count)
+            for shape, count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+    def problems(self, budget, threshold):
+        """Messages for each repeated shape and for going over `budget`."""
+        messages = []
+        if budget is not None and self.count > budget:
+            messages.append(f'{self.count} queries, budget {budget}')
+        for shape, count in self.repeated(threshold):
+            stack = ''.join(traceback.format_list(self.stacks[shape]))
+            messages.append(
+                f'N+1: {count} x {shape}\nFirst run from:\n{stack.rstrip()}'
+            )
+        return messages
+
+
+# execute_wrappers observing the current block. They are kept in a context
+# variable rather than on the connections, so a block in async code also sees
+# the queries the ORM runs in sync_to_async threads on their own connections.
+_observers = ContextVar('query_observers', default=())
+
+
+def _dispatch(execute, sql, params, many, context):
+    for observer in reversed(_observers.get()):
+        execute = partial(observer, execute)
+    return execute(sql, params, many, context)
+
+
+def _install(connection, **kwargs):  # noqa: ARG001
+    if _dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_dispatch)
+
+
+connection_created.connect(_install)
+
+
+@contextmanager
+def observe_queries(wrapper):
+    """
+    Runs the execute_wrapper `wrapper` around every query of the block, on
+    any connection and in any thread the block's context is carried to.
+    """
+    for connection in connections.all(initialized_only=True):
+        _install(connection)
+    token = _observers.set((*_observers.get(), wrapper))
+    try:
+        yield
+    finally:
+        _observers.reset(token)
+
+
+@contextmanager
+def inspect_queries(using=None):
+    """Records the queries of all connections (or just `using`)."""
+    inspector = QueryInspector()
+
+    def observer(execute, sql, params, many, context):
+        if using and context['connection'].alias != using:
+            return execute(sql, params, many, context)
+        return inspector(execute, sql, params, many, context)
+
+    with observe_queries(observer):
+        yield inspector
+
+
+def report(label, messages, mode):
+    if not messages:
+        return
+    text = f'{label}: ' + '\n'.join(messages)
+    if mode == RAISE:
+        raise QueryBudgetError(text)
+    logger.warning(text)
+
+
+@contextmanager
+def query_budget(budget=None, threshold=None, mode=RAISE, label='query_budget'):
+    """
+    Checks the block for N+1 patterns and, given `budget`, its query count:
+
+        with query_budget(5):
+            serializer.data
+    """
+    threshold = threshold or settings.QUERY_REPEAT_THRESHOLD
+    with inspect_queries() as inspector:
+        yield inspector
+    report(label, inspector.problems(budget, threshold), mode)
+
+
+def view_budget(view_class, action):
+    """
+    (checked, budget) from the view's `query_budgets`: unlisted actions are
+    only checked for repeats, None turns the checks off.
+    """
+    budgets = getattr(view_class, 'query_budgets', None) or {}
+    if action not in budgets:
+        return True, None
+    budget = budgets[action]
+    return budget is not None, budget
+
+
+class QueryCheckingTestRunner(DiscoverRunner):
+    """
+    Fails any test whose requests contain an N+1 or exceed a budget. Tests
+    tagged 'slow' (live servers, timed load runs) only run with --tag slow.
+    """
+
+    def __init__(self, *args, tags=None, exclude_tags=None, **kwargs):
+        if 'slow' not in (tags or ()):
+            exclude_tags = [*(exclude_tags or ()), 'slow']
+        super().__init__(*args, tags=tags, exclude_tags=exclude_tags, **kwargs)
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._query_inspector = settings.QUERY_INSPECTOR
+        settings.QUERY_INSPECTOR = RAISE
+
+    def teardown_test_environment(self, **kwargs):
+        settings.QUERY_INSPECTOR = self._query_inspector
+        super().teardown_test_environment(**kwargs)
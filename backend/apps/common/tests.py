@@ -0,0 +1,333 @@
+import json
+import shutil
+import tempfile
+from unittest import mock
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIHandler
+from django.db import router, transaction
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.equipment.models import Equipment
+from apps.equipment.views import EquipmentViewSet
+from apps.locations.models import Location
+
+from .db import use_primary, use_replica
+from .media import CACHE_CONTROL, parse_range
+from .metrics import MetricsRegistry
+from .middleware import PRIMARY_PIN_COOKIE, ReplicaRoutingMiddleware
+from .queries import QueryBudgetError, expected_repeats, query_budget, query_shape
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'], REPLICA_PIN_SECONDS=5)
+class ReplicaRoutingTests(TransactionTestCase):
+    def _route(self, method, cookies=None):
+        seen = {}
+
+        def view(request):  # noqa: ARG001
+            seen['read'] = router.db_for_read(Equipment)
+            seen['write'] = router.db_for_write(Equipment)
+            return HttpResponse()
+
+        request = RequestFactory().generic(method, '/api/v1/equipment/')
+        request.COOKIES.update(cookies or {})
+        return seen, ReplicaRoutingMiddleware(view)(request)
+
+    def test_safe_reads_use_replica_until_client_writes(self):
+        """測試 GET 讀取走 replica，寫入後短時間內固定走 primary"""
+        seen, response = self._route('GET')
+        self.assertEqual(seen, {'read': 'replica_0', 'write': 'default'})
+        self.assertNotIn(PRIMARY_PIN_COOKIE, response.cookies)
+
+        seen, response = self._route('POST')
+        self.assertEqual(seen['read'], 'default')
+        self.assertEqual(response.cookies[PRIMARY_PIN_COOKIE]['max-age'], 5)
+
+        seen, _ = self._route('GET', cookies={PRIMARY_PIN_COOKIE: '1'})
+        self.assertEqual(seen['read'], 'default')
+
+    def test_async_requests_route_without_adapting(self):
+        """測試 async 模式下 middleware 本身為 coroutine，讀取同樣走 replica"""
+        seen = {}
+
+        async def view(request):  # noqa: ARG001
+            seen['read'] = await sync_to_async(router.db_for_read)(Equipment)
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        async_to_sync(middleware)(RequestFactory().get('/api/v1/equipment/'))
+        self.assertEqual(seen['read'], 'replica_0')
+
+        response = async_to_sync(middleware)(RequestFactory().post('/api/v1/equipment/'))
+        self.assertEqual(seen['read'], 'default')
+        self.assertEqual(response.cookies[PRIMARY_PIN_COOKIE]['max-age'], 5)
+
+    def test_transactions_and_background_work_stay_on_primary(self):
+        """測試交易內 (含 select_for_update) 與請求外的讀取都走 primary"""
+        self.assertEqual(router.db_for_read(Equipment), 'default')
+        with use_replica('replica_0'):
+            self.assertEqual(router.db_for_read(Equipment), 'replica_0')
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Equipment), 'default')
+                self.assertEqual(Equipment.objects.select_for_update().db, 'default')
+            with use_primary():
+                self.assertEqual(router.db_for_read(Equipment), 'default')
+
+
+class ProtectedMediaTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, MEDIA_SENDFILE=''
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.name = default_storage.save(
+            'attachments/manual.pdf', ContentFile(bytes(range(256)) * 4)
+        )
+        self.client = APIClient()
+
+    def test_upload_names_are_unique_and_urls_signed(self):
+        """測試上傳檔名加上隨機後綴，網址帶簽章"""
+        other = default_storage.save('attachments/manual.pdf', ContentFile(b'x'))
+        self.assertNotEqual(self.name, other)
+        self.assertRegex(self.name, r'^attachments/manual_\w{7}\.pdf$')
+        self.assertIn('signature=', default_storage.url(self.name))
+
+    def test_signed_url_or_jwt_required(self):
+        """測試需有效簽章或登入才能讀取檔案"""
+        url = default_storage.url(self.name)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(256)) * 4)
+        self.assertEqual(response['Cache-Control'], CACHE_CONTROL)
+
+        path = url.split('?')[0]
+        self.assertEqual(self.client.get(path).status_code, 401)
+        self.assertEqual(
+            self.client.get(f'{path}?expires=9999999999&signature=bad').status_code,
+            401,
+        )
+
+        user = get_user_model().objects.create_user(username='viewer', password='x')
+        self.client.force_authenticate(user)
+        self.assertEqual(self.client.get(path).status_code, 200)
+        self.assertEqual(self.client.get('/api/media/../settings.py').status_code, 404)
+
+    def test_only_raster_images_are_served_inline(self):
+        """測試只有點陣圖片內嵌顯示，HTML/SVG 等一律下載，且所有回應帶 sandbox CSP"""
+        page = default_storage.save('attachments/page.html', ContentFile(b'<script>alert(1)</script>'))
+        response = self.client.get(default_storage.url(page))
+        self.assertEqual(response['Content-Security-Policy'], 'sandbox')
+        self.assertTrue(response['Content-Disposition'].startswith('attachment; filename="page_'))
+        svg = default_storage.save('equipment_images/logo.svg', ContentFile(b'<svg/>'))
+        self.assertTrue(self.client.get(default_storage.url(svg), HTTP_RANGE='bytes=0-1')['Content-Disposition'].startswith('attachment'))
+
+        image = default_storage.save('equipment_images/photo.png', ContentFile(b'png'))
+        response = self.client.get(default_storage.url(image))
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertTrue(response['Content-Disposition'].startswith('inline'))
+        self.assertEqual(response['Content-Security-Policy'], 'sandbox')
+
+    def test_range_and_conditional_requests(self):
+        """測試 Range 回傳 206/416，ETag 相符回傳 304"""
+        url = default_storage.url(self.name)
+        response = self.client.get(url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(10, 20)))
+
+        response = self.client.get(url, HTTP_RANGE='bytes=2000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+        etag = response['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, HTTP_RANGE='bytes=0-0', HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(
+        MEDIA_SENDFILE='x-accel-redirect', MEDIA_ACCEL_PREFIX='/protected-media/'
+    )
+    def test_accel_redirect_hands_off_to_proxy(self):
+        """測試 X-Accel-Redirect 模式只回傳標頭，由 nginx 傳送檔案"""
+        response = self.client.get(default_storage.url(self.name))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.name}')
+        self.assertEqual(response.content, b'')
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_parse_range(self):
+        """測試 Range 標頭解析"""
+        self.assertIsNone(parse_range(None, 100))
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 100))
+        self.assertEqual(parse_range('bytes=0-', 100), (0, 99))
+        self.assertEqual(parse_range('bytes=90-200', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        with self.assertRaises(ValueError):
+            parse_range('bytes=100-', 100)
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        self.metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.metrics_dir)
+        self.user = get_user_model().objects.create_user(username='metrics', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_server_timing_and_view_labels(self):
+        """測試回應帶 Server-Timing，/metrics 依 ViewSet action 彙總"""
+        response = self.client.get('/api/v1/equipment/')
+        self.assertEqual(response.status_code, 200)
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertIn('serialize;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn(
+            'qrems_http_requests_total{view="EquipmentViewSet.list",method="GET",status="200"}',
+            body,
+        )
+        self.assertIn(
+            'qrems_http_request_queries_bucket{view="EquipmentViewSet.list",method="GET",le="+Inf"}',
+            body,
+        )
+
+    @override_settings(ROOT_URLCONF='config.urls_async')
+    def test_async_requests_are_timed(self):
+        """測試 ASGI 下 async view 在 sync_to_async 執行緒中的查詢也計入 Server-Timing"""
+        equipment = Equipment.objects.create(name='Timed')
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        response = async_to_sync(self.async_client.get)(f'/api/v1/equipment/{equipment.uuid}/', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+
+        response = async_to_sync(self.async_client.get)('/api/v1/equipment/', headers=headers)
+        self.assertIn('serialize;dur=', response['Server-Timing'])
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token(self):
+        """測試設定 METRICS_TOKEN 時需帶 Bearer token"""
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+    def test_worker_files_are_merged(self):
+        """測試多個 worker 的統計檔案會加總"""
+        worker = MetricsRegistry()
+        values = {'http_request_duration_seconds': 0.02, 'http_request_queries': 3}
+        with override_settings(METRICS_DIR=''):
+            worker.observe('EquipmentViewSet.list', 'GET', 200, values)
+            worker.observe('EquipmentViewSet.list', 'GET', 200, values)
+        worker.flush(self.metrics_dir, pid=1)
+        worker.flush(self.metrics_dir, pid=2)
+        with open(f'{self.metrics_dir}/1.json') as file:
+            self.assertEqual(len(json.load(file)['requests']), 1)
+
+        histograms, requests = MetricsRegistry().collect(self.metrics_dir)
+        self.assertEqual(requests[('EquipmentViewSet.list', 'GET', '200')], 4)
+        series = histograms[('http_request_queries', 'EquipmentViewSet.list', 'GET')]
+        # le=5 bucket, then the sum
+        self.assertEqual(series[3], 4)
+        self.assertEqual(series[-1], 12)
+
+
+class QueryInspectorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        root = Location.objects.create(name='Root')
+        for i in range(4):
+            Location.objects.create(name=f'Room {i}', parent=root)
+
+    def _paths(self):
+        # Location.__str__ reads each parent on its own
+        return [str(location) for location in Location.objects.filter(parent__isnull=False)]
+
+    def test_query_shape_ignores_parameters(self):
+        """測試只有參數、常數或 IN 清單長度不同的 SQL 視為同一形狀"""
+        self.assertEqual(
+            query_shape('SELECT * FROM t WHERE id IN (%s, %s, %s) LIMIT 21'),
+            query_shape("SELECT * FROM t WHERE id IN (%s) LIMIT 1"),
+        )
+        self.assertEqual(query_shape("SELECT 'a', t1.x FROM t1"), "SELECT ?, t1.x FROM t1")
+
+    def test_repeated_query_raises_with_stack(self):
+        """測試重複執行相同形狀的查詢時報告 N+1 並附上呼叫位置"""
+        with self.assertRaises(QueryBudgetError) as raised, query_budget():
+            self._paths()
+        message = str(raised.exception)
+        self.assertIn('N+1: 4 x SELECT', message)
+        self.assertIn('locations/models.py', message)
+        self.assertIn('in _paths', message)
+
+        with query_budget(), expected_repeats():
+            self._paths()
+
+    def test_budget(self):
+        """測試超過查詢數預算時報告"""
+        with self.assertRaisesMessage(QueryBudgetError, '2 queries, budget 1'), query_budget(1):
+            list(Location.objects.all())
+            list(Equipment.objects.all())
+        with query_budget(2):
+            list(Location.objects.all())
+            list(Equipment.objects.all())
+
+    def test_middleware_uses_view_budgets(self):
+        """測試 middleware 依 ViewSet 的 query_budgets 檢查，warn 模式只記錄警告"""
+        client = APIClient()
+        client.force_authenticate(get_user_model().objects.create_user(username='budget', password='x'))
+        with mock.patch.object(EquipmentViewSet, 'query_budgets', {'list': 1}):
+            with self.assertRaises(QueryBudgetError):
+                client.get('/api/v1/equipment/')
+            with override_settings(QUERY_INSPECTOR='warn'), self.assertLogs('apps.common.queries', 'WARNING') as logs:
+                self.assertEqual(client.get('/api/v1/equipment/').status_code, 200)
+        self.assertIn('GET /api/v1/equipment/ (EquipmentViewSet.list)', logs.output[0])
+
+        with mock.patch.object(EquipmentViewSet, 'query_budgets', {'list': None}):
+            self.assertEqual(client.get('/api/v1/equipment/').status_code, 200)
+
+    def test_middleware_checks_async_requests(self):
+        """測試 ASGI 下 middleware 同樣依 query_budgets 檢查"""
+        user = get_user_model().objects.create_user(username='async_budget', password='x')
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+        with mock.patch.object(EquipmentViewSet, 'query_budgets', {'list': 0}), self.assertRaises(QueryBudgetError):
+            async_to_sync(self.async_client.get)('/api/v1/equipment/', headers=headers)
+
+
+class AsgiMiddlewareChainTests(SimpleTestCase):
+    @override_settings(DEBUG=True)
+    def test_asgi_handler_builds_chain_without_adapting(self):
+        """測試 ASGI handler 建立 middleware 鏈時每一層都原生 async，不需轉換"""
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            handler = ASGIHandler()
+        layer, chain = handler._middleware_chain, []
+        # Each middleware sits inside convert_exception_to_response; an
+        # adapted one would show up as a SyncToAsync/AsyncToSync layer
+        while hasattr(layer, '__wrapped__'):
+            self.assertTrue(iscoroutinefunction(layer), layer)
+            middleware = layer.__wrapped__
+            if not hasattr(middleware, 'get_response'):
+                break
+            chain.append(f'{type(middleware).__module__}.{type(middleware).__name__}')
+            layer = middleware.get_response
+        self.assertEqual(chain, settings.MIDDLEWARE)
+        self.assertTrue(all(iscoroutinefunction(hook) for hook in handler._template_response_middleware))
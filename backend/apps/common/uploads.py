@@ -0,0 +1,247 @@
+"""
+Two-phase direct uploads for file fields.
+
+1. POST /api/v1/uploads/ names a target field, the file name, type and size
+   and gets back an object key, a URL to PUT the bytes to and an upload
+   token. With USE_S3 the URL is presigned for the bucket, so the bytes go
+   straight to storage; otherwise it points at local_upload, a stand-in that
+   writes into MEDIA_ROOT.
+2. The client PUTs the file, then calls the finalize action of the owning
+   resource (e.g. POST /equipment/<uuid>/image/) with the token. That
+   attaches the key to the model and, for images, queues the compression
+   that multipart uploads get inline in Model.save().
+
+Post-processing runs after commit in a small per-process thread pool; if the
+process dies first, the upload simply stays uncompressed.
+"""
+
+import logging
+import mimetypes
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.apps import apps
+from django.conf import settings
+from django.core import signing
+from django.core.files import File
+from django.db import close_old_connections, models, transaction
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+from rest_framework import permissions, serializers, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .media import INLINE_CONTENT_TYPES
+from .utils import compress_image
+
+logger = logging.getLogger(__name__)
+
+# target name -> (model label, file field)
+TARGETS = {
+    'equipment_image': ('equipment.Equipment', 'image'),
+    'attachment': ('equipment.Attachment', 'file'),
+    'transaction_image': ('transactions.Transaction', 'image'),
+}
+TOKEN_SALT = 'apps.common.uploads'
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='upload-processing')
+
+
+def _field(target):
+    label, field_name = TARGETS[target]
+    return apps.get_model(label)._meta.get_field(field_name)
+
+
+def object_key(field, filename, content_type):
+    """
+    A fresh storage name under the field's upload_to. The extension follows
+    the declared content type, which storage enforces on the PUT, not the
+    client's file name, since the extension decides how the file is served.
+    """
+    storage = field.storage
+    root = os.path.splitext(storage.get_valid_name(os.path.basename(filename)))[0]
+    ext = mimetypes.guess_extension(content_type) or ''
+    name = f'{root or "upload"}_{get_random_string(12)}{ext}'
+    return storage.generate_filename(os.path.join(field.upload_to, name))
+
+
+def _presigned_put(field, key, content_type):
+    storage = field.storage
+    return storage.bucket.meta.client.generate_presigned_url(
+        'put_object',
+        Params={
+            'Bucket': storage.bucket_name,
+            'Key': storage._normalize_name(key),
+            'ContentType': content_type,
+        },
+        ExpiresIn=settings.UPLOAD_URL_EXPIRES,
+    )
+
+
+def claim_upload(token, target, user):
+    """
+    Storage key of a finished upload, checked against the target field and
+    the user who requested it. Raises ValidationError otherwise.
+    """
+    try:
+        data = signing.loads(
+            token or '', salt=TOKEN_SALT, max_age=2 * settings.UPLOAD_URL_EXPIRES
+        )
+    except signing.BadSignature:
+        raise ValidationError(
+            {'upload_token': 'Invalid or expired upload token'}
+        ) from None
+    if data['target'] != target or data['user'] != user.pk:
+        raise ValidationError(
+            {'upload_token': 'Upload token was issued for another upload'}
+        )
+    storage = _field(target).storage
+    key = data['key']
+    if not storage.exists(key):
+        raise ValidationError({'upload_token': 'File has not been uploaded'})
+    if storage.size(key) > settings.UPLOAD_MAX_BYTES:
+        storage.delete(key)
+        raise ValidationError({'upload_token': 'File is too large'})
+    return key
+
+
+def process_upload(model_label, pk, field_name, name):
+    """
+    Compresses an image attached by key and swaps the stored name, unless the
+    field has changed in the meantime.
+    """
+    model = apps.get_model(model_label)
+    instance = model._default_manager.filter(pk=pk).first()
+    file = getattr(instance, field_name, None)
+    if not file or file.name != name:
+        return
+    compressed = compress_image(file)
+    file.close()
+    if compressed is None:
+        return
+    storage = file.storage
+    new_name = storage.save(compressed.name, compressed)
+    with transaction.atomic():
+        instance = model._default_manager.select_for_update().filter(pk=pk).first()
+        if instance is None or getattr(instance, field_name).name != name:
+            stale = new_name
+        else:
+            setattr(instance, field_name, new_name)
+            instance.save()
+            stale = name
+    storage.delete(stale)
+
+
+def _run(*args):
+    close_old_connections()
+    try:
+        process_upload(*args)
+    except Exception:
+        logger.exception('Post-processing of upload %s failed', args)
+    finally:
+        close_old_connections()
+
+
+def enqueue_processing(instance, field_name):
+    """Queues post-processing of a file attached by key, once committed."""
+    field = instance._meta.get_field(field_name)
+    if not isinstance(field, models.ImageField):
+        return
+    name = getattr(instance, field_name).name
+    args = (instance._meta.label, instance.pk, field_name, name)
+    transaction.on_commit(partial(_executor.submit, _run, *args))
+
+
+class UploadRequestSerializer(serializers.Serializer):
+    target = serializers.ChoiceField(choices=sorted(TARGETS))
+    filename = serializers.CharField(max_length=200)
+    content_type = serializers.CharField(max_length=100)
+    size = serializers.IntegerField(min_value=1)
+
+    def validate_size(self, value):
+        if value > settings.UPLOAD_MAX_BYTES:
+            raise serializers.ValidationError(
+                f'Files are limited to {settings.UPLOAD_MAX_BYTES} bytes'
+            )
+        return value
+
+    def validate_content_type(self, value):
+        # Drop parameters such as charset; the bare type names the extension
+        return value.split(';')[0].strip().lower()
+
+    def validate(self, attrs):
+        field = _field(attrs['target'])
+        if (
+            isinstance(field, models.ImageField)
+            and attrs['content_type'] not in INLINE_CONTENT_TYPES
+        ):
+            raise serializers.ValidationError(
+                {'content_type': 'Expected a JPEG, PNG, GIF or WebP image'}
+            )
+        return attrs
+
+
+class UploadView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = UploadRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        field = _field(data['target'])
+        key = object_key(field, data['filename'], data['content_type'])
+        token = signing.dumps(
+            {
+                'key': key,
+                'target': data['target'],
+                'user': request.user.pk,
+                'type': data['content_type'],
+                'size': data['size'],
+            },
+            salt=TOKEN_SALT,
+        )
+        if settings.USE_S3:
+            url = _presigned_put(field, key, data['content_type'])
+        else:
+            url = request.build_absolute_uri(f'{reverse("upload-local")}?token={token}')
+        return Response(
+            {
+                'key': key,
+                'method': 'PUT',
+                'url': url,
+                'headers': {'Content-Type': data['content_type']},
+                'upload_token': token,
+                'expires_in': settings.UPLOAD_URL_EXPIRES,
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+
+@csrf_exempt
+@require_http_methods(['PUT'])
+def local_upload(request):
+    """Local-filesystem stand-in for a presigned PUT URL."""
+    try:
+        data = signing.loads(
+            request.GET.get('token', ''),
+            salt=TOKEN_SALT,
+            max_age=settings.UPLOAD_URL_EXPIRES,
+        )
+    except signing.BadSignature:
+        return JsonResponse({'detail': 'Invalid or expired upload URL'}, status=403)
+    if request.content_type != data['type']:
+        return JsonResponse({'detail': 'Content-Type does not match'}, status=400)
+    length = int(request.META.get('CONTENT_LENGTH') or 0)
+    if length > settings.UPLOAD_MAX_BYTES:
+        return JsonResponse({'detail': 'File is too large'}, status=413)
+    storage = _field(data['target']).storage
+    if storage.exists(data['key']):
+        return JsonResponse({'detail': 'Already uploaded'}, status=409)
+    # _save writes under exactly this name (save() would pick a new one)
+    storage._save(data['key'], File(request, name=data['key']))
+    return HttpResponse(status=200)
@@ -0,0 +1,116 @@
+"""
+Async versions of the hottest equipment read paths: detail, scan lookup and
+QR image. Only the ASGI application routes here (config/urls_async.py puts
+these paths ahead of the DRF router); under WSGI the viewset serves them.
+
+Each view answers GET/HEAD itself with the async ORM and cache API, so a
+slow client or database round trip parks a coroutine instead of a worker
+thread. Other methods are handed to the matching EquipmentViewSet action,
+which keeps writes, OPTIONS and 405s identical to the WSGI setup.
+"""
+
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import (
+    APIException,
+    AuthenticationFailed,
+    NotAuthenticated,
+    NotFound,
+)
+from rest_framework.renderers import JSONRenderer
+
+from apps.locations.services import aget_location_context
+from apps.users.authentication import CachedJWTAuthentication
+
+from .models import Equipment
+from .scan import aresolve_scan
+from .serializers import EquipmentSerializer
+from .views import EquipmentViewSet, equipment_etag, qr_options, qr_response
+
+_authentication = CachedJWTAuthentication()
+
+
+def _json(data, status=200):
+    return HttpResponse(
+        JSONRenderer().render(data), status=status, content_type='application/json'
+    )
+
+
+def _error(request, exc):
+    # Same body and headers as DRF's exception handler
+    detail = (
+        exc.detail if isinstance(exc.detail, (dict, list)) else {'detail': exc.detail}
+    )
+    response = _json(detail, status=exc.status_code)
+    if isinstance(exc, (AuthenticationFailed, NotAuthenticated)):
+        response['WWW-Authenticate'] = _authentication.authenticate_header(request)
+    return response
+
+
+def async_read(fallback):
+    """
+    Serves GET/HEAD from the decorated coroutine for authenticated users
+    and every other method from `fallback`, a synchronous DRF view.
+    """
+
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def wrapper(request, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return await sync_to_async(fallback)(request, **kwargs)
+            try:
+                result = await _authentication.aauthenticate(request)
+                if result is None:
+                    raise NotAuthenticated()
+                request.user, request.auth = result
+                return await view(request, **kwargs)
+            except APIException as exc:
+                return _error(request, exc)
+
+        return wrapper
+
+    return decorator
+
+
+@async_read(
+    EquipmentViewSet.as_view(
+        {
+            'get': 'retrieve',
+            'put': 'update',
+            'patch': 'partial_update',
+            'delete': 'destroy',
+        }
+    )
+)
+async def equipment_detail(request, uuid):
+    queryset = EquipmentSerializer.setup_eager_loading(
+        Equipment.objects.filter(pk=uuid)
+    )
+    equipment = await queryset.afirst()
+    if equipment is None:
+        raise NotFound('No Equipment matches the given query.')
+    context = {'request': request, **await aget_location_context()}
+    response = _json(EquipmentSerializer(equipment, context=context).data)
+    response['ETag'] = equipment_etag(equipment.version)
+    return response
+
+
+@async_read(EquipmentViewSet.as_view({'get': 'scan'}))
+async def equipment_scan(request, uuid):
+    payload = await aresolve_scan(uuid, request.user)
+    if payload is None:
+        raise NotFound()
+    return _json(payload)
+
+
+@async_read(EquipmentViewSet.as_view({'get': 'qr'}))
+async def equipment_qr(request, uuid):
+    options = qr_options(request.GET)
+    if not await Equipment.objects.filter(pk=uuid).aexists():
+        raise NotFound('No Equipment matches the given query.')
+    # Rendering is CPU-bound; run it in a worker thread, off the event loop
+    return await sync_to_async(qr_response, thread_sensitive=False)(uuid, *options)
@@ -0,0 +1,63 @@
+"""
+Short equipment codes for QR labels.
+
+A code is the equipment UUID's 16 bytes in RFC 4648 base32 without padding:
+26 characters from A-Z and 2-7. Together with an upper-case scheme and host,
+the whole scan URL fits QR alphanumeric mode (5.5 bits per character instead
+of 8), which with the shorter id drops the code by at least one version.
+Codes are derived, not stored, so every existing item has one.
+"""
+
+import base64
+import binascii
+import re
+import uuid
+from urllib.parse import urlsplit, urlunsplit
+
+from decouple import config
+
+CODE_LENGTH = 26
+SHORT_PATH = '/S/'
+CODE_PATTERN = re.compile(r'^[A-Z2-7]{26}$')
+
+
+def short_code(equipment_uuid):
+    return base64.b32encode(uuid.UUID(str(equipment_uuid)).bytes).decode()[:CODE_LENGTH]
+
+
+def parse_code(value):
+    """
+    UUID for a short code or a hyphenated UUID (older labels); None if
+    `value` is neither.
+    """
+    value = str(value).strip()
+    if CODE_PATTERN.match(value.upper()):
+        try:
+            return uuid.UUID(bytes=base64.b32decode(value.upper() + '======'))
+        except (binascii.Error, ValueError):
+            return None
+    try:
+        return uuid.UUID(value)
+    except ValueError:
+        return None
+
+
+def _frontend_url():
+    return config('FRONTEND_URL', default='http://localhost:5173').rstrip('/')
+
+
+def scan_url(equipment_uuid):
+    """
+    URL encoded in equipment QR codes. Scheme and host are case-insensitive,
+    so they are upper-cased to stay in the alphanumeric character set.
+    """
+    parts = urlsplit(_frontend_url())
+    base = urlunsplit((parts.scheme.upper(), parts.netloc.upper(), parts.path, '', ''))
+    return f'{base}{SHORT_PATH}{short_code(equipment_uuid)}'
+
+
+def legacy_scan_url(equipment_uuid):
+    """
+    The previous QR payload; the frontend still resolves these.
+    """
+    return f'{_frontend_url()}/scan/{equipment_uuid}'
@@ -0,0 +1,168 @@
+"""
+Incrementally maintained inventory counters.
+
+Every write that changes an equipment's (status, category, location) reports
+the old and new key through record_change(); the matching InventoryCounter
+rows are adjusted in the same database transaction as the write itself.
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from apps.common import queries
+
+_pending = ContextVar('inventory_counter_batch', default=None)
+
+
+def counter_key(status, category_id, location_id):
+    return (status, category_id, location_id)
+
+
+def key_string(key):
+    status, category_id, location_id = key
+    return f'{status}:{category_id or "-"}:{location_id or "-"}'
+
+
+def record_change(before, after, count=1):
+    """
+    Moves `count` items from the `before` key to the `after` key. Either may
+    be None (creation / deletion).
+    """
+    if before == after:
+        return
+    deltas = Counter()
+    if before is not None:
+        deltas[before] -= count
+    if after is not None:
+        deltas[after] += count
+
+    batch = _pending.get()
+    if batch is not None:
+        batch.update(deltas)
+    else:
+        apply_deltas(deltas)
+
+
+@contextmanager
+def batch():
+    """
+    Collects changes and writes one UPDATE per distinct key on exit, for bulk
+    operations. Must be used inside the same atomic block as the writes.
+    """
+    if _pending.get() is not None:
+        # Already batching: let the outer block flush
+        yield
+        return
+    deltas = Counter()
+    token = _pending.set(deltas)
+    try:
+        yield
+    finally:
+        _pending.reset(token)
+    apply_deltas(deltas)
+
+
+def apply_deltas(deltas):
+    from .models import InventoryCounter
+
+    # One UPDATE per distinct key by design, not an N+1
+    with queries.expected_repeats():
+        for key, delta in deltas.items():
+            if not delta:
+                continue
+            updated = InventoryCounter.objects.filter(key=key_string(key)).update(
+                count=F('count') + delta
+            )
+            if updated:
+                continue
+            status, category_id, location_id = key
+            try:
+                with transaction.atomic():
+                    InventoryCounter.objects.create(
+                        key=key_string(key),
+                        status=status,
+                        category_id=category_id,
+                        location_id=location_id,
+                        count=delta,
+                    )
+            except IntegrityError:
+                # Created concurrently; the row exists now
+                InventoryCounter.objects.filter(key=key_string(key)).update(
+                    count=F('count') + delta
+                )
+
+
+def fold_into_null(field, value):
+    """
+    Called before a Category or Location is deleted: the equipment it held
+    falls back to NULL (on_delete=SET_NULL), so its counters move with it.
+    """
+    from .models import InventoryCounter
+
+    deltas = Counter()
+    for row in InventoryCounter.objects.filter(**{field: value}):
+        key = (row.status, row.category_id, row.location_id)
+        deltas[key] -= row.count
+        status, category_id, location_id = key
+        if field == 'category':
+            category_id = None
+        else:
+            location_id = None
+        deltas[(status, category_id, location_id)] += row.count
+    apply_deltas(deltas)
+
+
+def compute_actual():
+    """
+    Recomputes the counters from the equipment table with one GROUP BY.
+    """
+    from .models import Equipment
+
+    return Counter(
+        {
+            (row['status'], row['category_id'], row['location_id']): row['n']
+            for row in Equipment.objects.values('status', 'category_id', 'location_id')
+            .order_by()
+            .annotate(n=Count('pk'))
+        }
+    )
+
+
+def reconcile(fix=True):
+    """
+    Compares stored counters with a fresh recount. Returns {key: (stored,
+    actual)} for every key that drifted; with fix=True rewrites the table.
+    """
+    from .models import InventoryCounter
+
+    with transaction.atomic():
+        stored = Counter(
+            {
+                (row.status, row.category_id, row.location_id): row.count
+                for row in InventoryCounter.objects.select_for_update()
+            }
+        )
+        actual = compute_actual()
+        drift = {
+            key: (stored[key], actual[key])
+            for key in set(stored) | set(actual)
+            if stored[key] != actual[key]
+        }
+        if fix and drift:
+            InventoryCounter.objects.all().delete()
+            InventoryCounter.objects.bulk_create(
+                InventoryCounter(
+                    key=key_string(key),
+                    status=key[0],
+                    category_id=key[1],
+                    location_id=key[2],
+                    count=count,
+                )
+                for key, count in actual.items()
+                if count
+            )
+    return drift
@@ -0,0 +1,200 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.equipment import codes
+from apps.equipment.models import Equipment
+
+User = get_user_model()
+
+BENCH_MARKER = {'benchmark': 'asgi'}
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the equipment read endpoints in-process: the ASGI handler '
+        'with concurrent coroutines versus the WSGI handler with a thread pool '
+        'the size of one gthread worker. Measures handler concurrency only; '
+        'run a load generator against real servers for end-to-end numbers.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=32)
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument(
+            '--threads', type=int, default=8, help='WSGI threads (gunicorn --threads)'
+        )
+        parser.add_argument(
+            '--endpoint', choices=['detail', 'scan', 'qr', 'all'], default='all'
+        )
+        parser.add_argument('--items', type=int, default=50)
+        parser.add_argument(
+            '--client-delay-ms',
+            type=float,
+            default=0,
+            help='Time a slow client takes to receive each response',
+        )
+
+    def handle(self, *_args, **options):
+        user, _ = User.objects.get_or_create(
+            username='bench_asgi', defaults={'email': 'bench_asgi@example.com'}
+        )
+        self.authorization = f'Bearer {AccessToken.for_user(user)}'.encode()
+        items = Equipment.objects.bulk_create(
+            Equipment(name=f'ASGI bench {i}', rdf_metadata=BENCH_MARKER)
+            for i in range(options['items'])
+        )
+        self.delay = options['client_delay_ms'] / 1000
+        paths = self._paths(items, options['endpoint'])
+        requests = [paths[i % len(paths)] for i in range(options['requests'])]
+
+        try:
+            with override_settings(ROOT_URLCONF='config.urls'):
+                self._report(
+                    'wsgi',
+                    *asyncio.run(
+                        self._run_wsgi(requests, options['clients'], options['threads'])
+                    ),
+                )
+            with override_settings(ROOT_URLCONF='config.urls_async'):
+                self._report(
+                    'asgi', *asyncio.run(self._run_asgi(requests, options['clients']))
+                )
+        finally:
+            Equipment.objects.filter(rdf_metadata=BENCH_MARKER).delete()
+            user.delete()
+
+    def _paths(self, items, endpoint):
+        paths = []
+        for item in items:
+            base = f'/api/v1/equipment/{item.uuid}/'
+            if endpoint in ('detail', 'all'):
+                paths.append(base)
+            if endpoint in ('scan', 'all'):
+                paths.append(f'/api/v1/equipment/{codes.short_code(item.uuid)}/scan/')
+            if endpoint in ('qr', 'all'):
+                paths.append(f'{base}qr/')
+        return paths
+
+    def _report(self, name, seconds, latencies, errors):
+        self.stdout.write(
+            f'{name}: {len(latencies) / seconds:8.1f} req/s  '
+            f'p50 {statistics.median(latencies) * 1000:7.2f} ms  '
+            f'p95 {percentile(latencies, 0.95) * 1000:7.2f} ms  '
+            f'p99 {percentile(latencies, 0.99) * 1000:7.2f} ms  '
+            f'errors {errors}'
+        )
+
+    async def _clients(self, requests, clients, call):
+        """
+        Closed loop: each client sends its next request once the previous
+        response has arrived. Latency includes any wait for a free worker.
+        """
+        queue = list(reversed(requests))
+        latencies = []
+        errors = 0
+
+        async def client():
+            nonlocal errors
+            while queue:
+                path = queue.pop()
+                started = time.perf_counter()
+                failed = await call(path)
+                latencies.append(time.perf_counter() - started)
+                errors += failed
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(clients)))
+        return time.perf_counter() - started, latencies, errors
+
+    async def _run_wsgi(self, requests, clients, threads):
+        handler = WSGIHandler()
+        loop = asyncio.get_running_loop()
+
+        def call(path):
+            environ = {
+                'REQUEST_METHOD': 'GET',
+                'PATH_INFO': path,
+                'QUERY_STRING': '',
+                'SERVER_NAME': 'localhost',
+                'SERVER_PORT': '80',
+                'HTTP_HOST': 'localhost',
+                'HTTP_AUTHORIZATION': self.authorization.decode(),
+                'wsgi.input': BytesIO(),
+                'wsgi.url_scheme': 'http',
+            }
+            status = []
+            body = handler(environ, lambda line, _headers: status.append(line))
+            b''.join(body)
+            body.close()
+            # A sync worker thread stays busy until the client has the body
+            time.sleep(self.delay)
+            return not status[0].startswith('200')
+
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            result = await self._clients(
+                requests,
+                clients,
+                lambda path: loop.run_in_executor(executor, call, path),
+            )
+            # Each pool thread opened its own connection
+            list(executor.map(lambda _: connection.close(), range(threads)))
+        return result
+
+    async def _run_asgi(self, requests, clients):
+        handler = ASGIHandler()
+
+        async def call(path):
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': 'GET',
+                'scheme': 'http',
+                'path': path,
+                'raw_path': path.encode(),
+                'root_path': '',
+                'query_string': b'',
+                'headers': [
+                    (b'host', b'localhost'),
+                    (b'authorization', self.authorization),
+                ],
+                'server': ('localhost', 80),
+            }
+            received = False
+            status = []
+
+            async def receive():
+                nonlocal received
+                if not received:
+                    received = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                # No disconnect; the handler cancels this wait when done
+                await asyncio.Future()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+                elif not message.get('more_body'):
+                    # Only this coroutine waits on the slow client
+                    await asyncio.sleep(self.delay)
+
+            await handler(scope, receive, send)
+            return status[0] != 200
+
+        return await self._clients(requests, clients, call)
@@ -0,0 +1,439 @@
+import json
+import platform
+import statistics
+import time
+from io import StringIO
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.common import queries
+from apps.common.middleware import QueryTimer
+from apps.equipment.models import Equipment
+from apps.transactions.models import Transaction
+from apps.transactions.services import TransactionService
+from apps.users.models import User
+
+from .benchmark_asgi import percentile
+from .generate_test_data import USERNAME_PREFIX
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+
+# generate_test_data options of the seeded dataset. Results are only
+# comparable between runs on the same dataset.
+DATASET = {
+    'seed': 0,
+    'equipment': 2000,
+    'transactions_per_item': 10,
+    'end': '2026-01-01',
+}
+BULK_APPROVE_SIZE = 20
+
+
+class Bench:
+    """
+    Runs requests through the full middleware stack with django.test.Client,
+    timing each one and counting its queries.
+    """
+
+    def __init__(self, user, manager):
+        self.client = Client()
+        self.tokens = {
+            account.pk: f'Bearer {AccessToken.for_user(account)}'
+            for account in (user, manager)
+        }
+        self.user = user
+        self.manager = manager
+        self.recording = True
+        # endpoint -> {'method', 'path', 'seconds': [], 'queries': [], 'errors'}
+        self.samples = {}
+        self.available = list(
+            Equipment.objects.filter(
+                status=Equipment.Status.AVAILABLE, rdf_metadata__generated=True
+            )
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+
+    def measure(self, name, method, path, account, data=None):
+        timer = QueryTimer()
+        with connection.execute_wrapper(timer):
+            started = time.perf_counter()
+            response = getattr(self.client, method.lower())(
+                path,
+                data=data,
+                content_type='application/json' if data is not None else None,
+                HTTP_AUTHORIZATION=self.tokens[account.pk],
+            )
+            if response.streaming:
+                b''.join(response.streaming_content)
+            seconds = time.perf_counter() - started
+        if self.recording:
+            sample = self.samples.setdefault(
+                name,
+                {
+                    'method': method,
+                    # Without ids, so paths line up across datasets
+                    'path': path.split('?')[0],
+                    'seconds': [],
+                    'queries': [],
+                    'errors': 0,
+                },
+            )
+            sample['seconds'].append(seconds)
+            sample['queries'].append(timer.count)
+            sample['errors'] += response.status_code >= 400
+        return response
+
+    def take_available(self, count):
+        if len(self.available) < count:
+            raise CommandError(
+                'Ran out of AVAILABLE equipment; use a larger dataset or fewer '
+                'iterations'
+            )
+        taken, self.available = self.available[:count], self.available[count:]
+        return taken
+
+
+def list_scenario(name, query=''):
+    def run(bench, context):
+        bench.measure(
+            name,
+            'GET',
+            f'/api/v1/equipment/{query.format(**context)}',
+            bench.user,
+        )
+
+    return name, run
+
+
+def history(bench, context):
+    bench.measure(
+        'equipment_history',
+        'GET',
+        f'/api/v1/equipment/{context["busiest"]}/history/',
+        bench.user,
+    )
+
+
+def qr(bench, context):
+    bench.measure(
+        'equipment_qr', 'GET', f'/api/v1/equipment/{context["busiest"]}/qr/', bench.user
+    )
+
+
+def pending_transactions(bench, context):  # noqa: ARG001
+    bench.measure(
+        'transaction_list_pending',
+        'GET',
+        '/api/v1/transactions/?status=PENDING_APPROVAL',
+        bench.manager,
+    )
+
+
+def borrow_cycle(bench, context):  # noqa: ARG001
+    """borrow -> approve -> return request -> approve; the item ends AVAILABLE."""
+    (equipment_uuid,) = bench.take_available(1)
+    body = {'equipment_uuid': str(equipment_uuid)}
+    txn = bench.measure(
+        'borrow', 'POST', '/api/v1/transactions/borrow/', bench.user, body
+    ).json()
+    bench.measure(
+        'approve_borrow',
+        'POST',
+        f'/api/v1/transactions/{txn["id"]}/approve-borrow/',
+        bench.manager,
+        {},
+    )
+    txn = bench.measure(
+        'return_request',
+        'POST',
+        '/api/v1/transactions/return-request/',
+        bench.user,
+        body,
+    ).json()
+    bench.measure(
+        'approve_return',
+        'POST',
+        f'/api/v1/transactions/{txn["id"]}/approve-return/',
+        bench.manager,
+        {},
+    )
+    bench.available.append(equipment_uuid)
+
+
+def bulk_approve(bench, context):  # noqa: ARG001
+    # The pending requests are set up outside the measurement
+    ids = [
+        TransactionService.create_borrow_request(
+            user=bench.user, equipment_uuid=equipment_uuid
+        ).id
+        for equipment_uuid in bench.take_available(BULK_APPROVE_SIZE)
+    ]
+    bench.measure(
+        'bulk_approve',
+        'POST',
+        '/api/v1/transactions/bulk-approve/',
+        bench.manager,
+        {'transaction_ids': ids},
+    )
+
+
+# Read-only scenarios first, so the writes cannot change what they read
+SCENARIOS = dict(
+    [
+        list_scenario('equipment_list'),
+        list_scenario('equipment_list_category', '?category={category}'),
+        list_scenario('equipment_list_status', '?status=AVAILABLE'),
+        list_scenario('equipment_list_zone', '?zone=A'),
+        list_scenario('equipment_list_cabinet', '?cabinet=3'),
+        list_scenario('equipment_list_number', '?number=7'),
+        list_scenario('equipment_list_location', '?location={leaf}'),
+        list_scenario('equipment_list_location_subtree', '?location={root}'),
+        list_scenario('equipment_list_target_location', '?target_location={leaf}'),
+        ('equipment_history', history),
+        ('equipment_qr', qr),
+        ('transaction_list_pending', pending_transactions),
+        ('borrow_cycle', borrow_cycle),
+        ('bulk_approve', bulk_approve),
+    ]
+)
+
+
+def summarize(sample):
+    milliseconds = [seconds * 1000 for seconds in sample['seconds']]
+    return {
+        'method': sample['method'],
+        'path': sample['path'],
+        'samples': len(milliseconds),
+        'p50_ms': round(percentile(milliseconds, 0.5), 3),
+        'p95_ms': round(percentile(milliseconds, 0.95), 3),
+        'p99_ms': round(percentile(milliseconds, 0.99), 3),
+        'mean_ms': round(statistics.fmean(milliseconds), 3),
+        'max_ms': round(max(milliseconds), 3),
+        'queries': max(sample['queries']),
+        'queries_min': min(sample['queries']),
+        'errors': sample['errors'],
+    }
+
+
+def compare(baseline, results, tolerance, min_delta_ms):
+    """
+    Regressions of `results` against `baseline` as messages. A query count
+    above the baseline's always counts; p50/p95 count when they are more than
+    `tolerance` (a fraction) and `min_delta_ms` above it.
+    """
+    regressions = []
+    for name, current in results['endpoints'].items():
+        before = baseline['endpoints'].get(name)
+        if before is None:
+            continue
+        if current['errors']:
+            regressions.append(f'{name}: {current["errors"]} failed requests')
+        if current['queries'] > before['queries']:
+            regressions.append(
+                f'{name}: {current["queries"]} queries (baseline {before["queries"]})'
+            )
+        for key in ('p50_ms', 'p95_ms'):
+            limit = max(before[key] * (1 + tolerance), before[key] + min_delta_ms)
+            if current[key] > limit:
+                regressions.append(
+                    f'{name}: {key} {current[key]:.2f} (baseline {before[key]:.2f})'
+                )
+    return regressions
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the key API endpoints on a seeded dataset: latency '
+        'percentiles and query counts per endpoint, written as JSON and '
+        'compared against a committed baseline. Runs in a throwaway test '
+        'database unless --in-place is given. Exits non-zero on regressions.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument(
+            '--warmup', type=int, default=3, help='Unrecorded runs per scenario'
+        )
+        parser.add_argument('--equipment', type=int, default=DATASET['equipment'])
+        parser.add_argument(
+            '--transactions-per-item',
+            type=float,
+            default=DATASET['transactions_per_item'],
+        )
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            choices=list(SCENARIOS),
+            help='Run only these scenarios (repeatable)',
+        )
+        parser.add_argument('--output', type=Path, help='Write the results here')
+        parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE)
+        parser.add_argument(
+            '--update-baseline',
+            action='store_true',
+            help='Write the results to --baseline instead of comparing',
+        )
+        parser.add_argument('--no-compare', action='store_true')
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=1.0,
+            help='Allowed p50/p95 slowdown as a fraction of the baseline',
+        )
+        parser.add_argument(
+            '--min-delta-ms',
+            type=float,
+            default=2.0,
+            help='Ignore latency changes smaller than this',
+        )
+        parser.add_argument(
+            '--in-place',
+            action='store_true',
+            help=(
+                'Use the configured database. Replaces earlier generate_test_data '
+                'rows and leaves the benchmark writes behind.'
+            ),
+        )
+
+    def handle(self, *_args, **options):
+        if options['in_place']:
+            results = self._run(options)
+        else:
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                results = self._run(options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self._report(results)
+        if options['output']:
+            self._write(options['output'], results)
+        if options['update_baseline']:
+            self._write(options['baseline'], results)
+            return
+        if options['no_compare'] or not options['baseline'].exists():
+            return
+        baseline = json.loads(options['baseline'].read_text())
+        if baseline['meta']['database'] != results['meta']['database']:
+            # Timings and even query counts differ between backends
+            raise CommandError(
+                f'{options["baseline"]} was recorded on '
+                f'{baseline["meta"]["database"]}, this run used '
+                f'{results["meta"]["database"]}; record a baseline for it with '
+                '--update-baseline --baseline <path>, or pass --no-compare'
+            )
+        if baseline['meta']['dataset'] != results['meta']['dataset']:
+            raise CommandError(
+                f'{options["baseline"]} was recorded on another dataset '
+                f'({baseline["meta"]["dataset"]}); use the same options or --no-compare'
+            )
+        regressions = compare(
+            baseline, results, options['tolerance'], options['min_delta_ms']
+        )
+        if regressions:
+            for message in regressions:
+                self.stderr.write(message)
+            raise CommandError(f'{len(regressions)} regressions against the baseline')
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
+
+    def _run(self, options):
+        dataset = {
+            **DATASET,
+            'equipment': options['equipment'],
+            'transactions_per_item': options['transactions_per_item'],
+        }
+        self.stdout.write(f'Seeding {dataset}...')
+        call_command(
+            'generate_test_data',
+            '--seed',
+            str(dataset['seed']),
+            '--equipment',
+            str(dataset['equipment']),
+            '--transactions-per-item',
+            str(dataset['transactions_per_item']),
+            '--end',
+            dataset['end'],
+            *(['--clear'] if options['in_place'] else []),
+            stdout=StringIO(),
+        )
+
+        generated = User.objects.filter(username__startswith=USERNAME_PREFIX)
+        bench = Bench(
+            user=generated.filter(role=User.Role.USER).order_by('username').first(),
+            manager=generated.filter(role=User.Role.MANAGER)
+            .order_by('username')
+            .first(),
+        )
+        context = self._context()
+        names = options['scenario'] or list(SCENARIOS)
+        # The N+1 inspector's bookkeeping would be measured too
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            QUERY_INSPECTOR=queries.OFF,
+        ):
+            for name in names:
+                scenario = SCENARIOS[name]
+                bench.recording = False
+                for _ in range(options['warmup']):
+                    scenario(bench, context)
+                bench.recording = True
+                for _ in range(options['iterations']):
+                    scenario(bench, context)
+
+        return {
+            'meta': {
+                'dataset': dataset,
+                'database': connection.vendor,
+                'iterations': options['iterations'],
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'endpoints': {
+                name: summarize(sample) for name, sample in bench.samples.items()
+            },
+        }
+
+    def _context(self):
+        """Ids the scenario URLs refer to, picked deterministically."""
+        generated = Equipment.objects.filter(rdf_metadata__generated=True)
+        busiest = (
+            Transaction.objects.filter(equipment__in=generated)
+            .values('equipment')
+            .annotate(count=Count('id'))
+            .order_by('-count', 'equipment')
+            .first()
+        )
+        first = generated.order_by('pk').first()
+        root = first.location
+        while root.parent_id:
+            root = root.parent
+        return {
+            'busiest': busiest['equipment'],
+            'category': first.category_id,
+            'root': root.pk,
+            'leaf': first.location_id,
+        }
+
+    def _report(self, results):
+        for name, result in results['endpoints'].items():
+            self.stdout.write(
+                f'{name:>32}: p50 {result["p50_ms"]:8.2f} ms  '
+                f'p95 {result["p95_ms"]:8.2f} ms  '
+                f'p99 {result["p99_ms"]:8.2f} ms  '
+                f'{result["queries"]:3d} queries  errors {result["errors"]}'
+            )
+
+    def _write(self, path, results):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(results, indent=2) + '\n')
+        self.stdout.write(f'Wrote {path}')
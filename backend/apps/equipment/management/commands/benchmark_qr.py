@@ -0,0 +1,103 @@
+import time
+import uuid
+from io import BytesIO
+
+import qrcode
+from django.core.management.base import BaseCommand
+
+from apps.common import qr
+from apps.equipment import codes
+
+
+def pil_factory_png(data):
+    """
+    The previous QR endpoint path: qrcode's PIL image factory, which draws
+    every dark module as its own rectangle. Kept here only as the baseline.
+    """
+    code = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=10,
+        border=4,
+    )
+    code.add_data(data)
+    code.make(fit=True)
+    img = code.make_image(fill_color='black', back_color='white')
+    buffer = BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def matrix_png(data):
+    return qr.render_png(qr.module_matrix(data))
+
+
+def pillow_png(data):
+    # Forces the fallback rasterizer, whatever is installed
+    image = qr._bitmap_pillow(qr.module_matrix(data), qr.DEFAULT_BOX_SIZE)
+    buffer = BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def matrix_svg(data):
+    return qr.render_svg(qr.module_matrix(data)).encode()
+
+
+RENDERERS = {
+    'pil': pil_factory_png,
+    'png': matrix_png,
+    'png-pillow': pillow_png,
+    'svg': matrix_svg,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks QR rendering: qrcode's PIL image factory versus the "
+        'matrix rasterizer (NumPy when installed) and merged-run SVG'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=200)
+        parser.add_argument('--renderer', choices=[*RENDERERS, 'all'], default='all')
+
+    def handle(self, *_args, **options):
+        names = (
+            list(RENDERERS) if options['renderer'] == 'all' else [options['renderer']]
+        )
+        uuids = [uuid.uuid4() for _ in range(options['count'])]
+        self._report_payloads(uuids[0])
+        self.stdout.write(f'NumPy: {"yes" if qr.np is not None else "no"}')
+
+        for name in names:
+            render = RENDERERS[name]
+            # The baseline renders the old payload, as the endpoint used to
+            url = codes.legacy_scan_url if name == 'pil' else codes.scan_url
+            payloads = [url(value) for value in uuids]
+            render(payloads[0])  # Warm-up
+            started = time.perf_counter()
+            size = sum(len(render(data)) for data in payloads)
+            seconds = time.perf_counter() - started
+            self.stdout.write(
+                f'{name:>10}: {len(payloads) / seconds:8.1f} codes/s, '
+                f'{seconds / len(payloads) * 1000:6.2f} ms/code, '
+                f'{size / len(payloads):8.0f} bytes/code'
+            )
+
+    def _report_payloads(self, equipment_uuid):
+        for label, url in (
+            ('legacy', codes.legacy_scan_url),
+            ('short', codes.scan_url),
+        ):
+            data = url(equipment_uuid)
+            code = qrcode.QRCode(
+                error_correction=qrcode.constants.ERROR_CORRECT_L, border=0
+            )
+            code.add_data(data)
+            code.make(fit=True)
+            side = code.modules_count
+            self.stdout.write(
+                f'{label:>10}: version {code.version}, {side}x{side} = '
+                f'{side * side} modules, {len(data)} chars ({data})'
+            )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.equipment import sync
+
+
+class Command(BaseCommand):
+    help = (
+        'Removes delta-sync log rows superseded by a newer change to the same '
+        'object. Clients at any watermark stay consistent'
+    )
+
+    def handle(self, *_args, **_options):
+        removed = sync.compact()
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} superseded changes.'))
@@ -1,143 +1,432 @@
 import random
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import UTC, datetime, timedelta
 
-from django.core.management.base import BaseCommand
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
 
-from apps.equipment.models import Equipment
+from apps.equipment import counters, sync
+from apps.equipment.models import Category, Equipment
+from apps.locations.models import Location
+from apps.transactions.models import BorrowReminder, Transaction
+from apps.transactions.state_machine import Phase, get_transition
+from apps.users.models import User
+
+# Marks generated rows so --clear removes them and nothing else
+MARKER = '[generated]'
+USERNAME_PREFIX = 'gen_user_'
+
+PRODUCTS = {
+    'Laptop': [
+        'MacBook Air M2',
+        'MacBook Pro M1',
+        'Dell XPS 13',
+        'Lenovo ThinkPad X1',
+        'HP Spectre x360',
+        'Asus ZenBook Duo',
+    ],
+    'Monitor': [
+        'Dell UltraSharp 27',
+        'LG 27UN850',
+        'BenQ PD3220U',
+        'Samsung Odyssey G9',
+        'ViewSonic ColorPro',
+    ],
+    'Peripherals': [
+        'Logitech MX Keys',
+        'Keychron K3',
+        'Magic Mouse 2',
+        'Wacom Intuos Pro',
+        'Elgato Stream Deck',
+    ],
+    'Audio/Video': [
+        'Sony WH-1000XM5',
+        'Bose QC45',
+        'Blue Yeti Microphone',
+        'Logitech C920 Webcam',
+        'Canon EOS R5',
+    ],
+    'Furniture': [
+        'Herman Miller Aeron',
+        'Steelcase Leap',
+        'IKEA Markus',
+        'Standing Desk (Motorized)',
+        'Whiteboard (Mobile)',
+    ],
+    'Development Boards': [
+        'Raspberry Pi 5',
+        'Arduino Uno R3',
+        'Jetson Nano',
+        'ESP32 DevKit',
+        'STM32 Nucleo',
+    ],
+    'Tablet': [
+        'iPad Pro 12.9',
+        'Samsung Galaxy Tab S9',
+        'iPad Mini 6',
+        'Microsoft Surface Pro 9',
+    ],
+    'Phone': [
+        'iPhone 15 Pro',
+        'Google Pixel 8',
+        'Samsung Galaxy S24',
+        'iPhone SE 3',
+    ],
+    'Network': [
+        'Ubiquiti UniFi Dream Machine',
+        'Cisco Switch 2960',
+        'Synology NAS DS923+',
+        'Starlink Kit',
+        'Netgear Router',
+    ],
+    'Tools': [
+        'Soldering Iron Station',
+        '3D Printer Ender 3',
+        'Digital Multimeter',
+        'Electric Screwdriver Set',
+        'Laser Cutter',
+    ],
+}
+LEVEL_NAMES = ['Building', 'Floor', 'Room', 'Shelf', 'Bin']
+
+Action = Transaction.Action
+TxnStatus = Transaction.Status
+
+# Share of AVAILABLE steps that start a dispatch or a move instead of a borrow
+DISPATCH_SHARE = 0.005
+MOVE_SHARE = 0.12
+# Outcome of requests that are decided
+APPROVE_SHARE = 0.9
+# Chance that an item's last request is still waiting for approval
+PENDING_SHARE = 0.05
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """
+    Lets bulk_create keep the created_at/updated_at values set on the objects
+    instead of overwriting them with auto_now / auto_now_add.
+    """
+    fields = [
+        field
+        for model in models
+        for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
 
 
 class Command(BaseCommand):
-    help = 'Generates extensive test data for equipment'
-
-    def handle(self, *_args, **_kwargs):
-        # Clear existing data
-        self.stdout.write('Clearing existing equipment...')
-        Equipment.objects.all().delete()
-
-        # Category Mapping
-        category_map = {
-            'Laptop': Equipment.Category.LAPTOP,
-            'Monitor': Equipment.Category.MONITOR,
-            'Peripherals': Equipment.Category.PERIPHERALS,
-            'Audio/Video': Equipment.Category.AUDIO_VIDEO,
-            'Furniture': Equipment.Category.FURNITURE,
-            'Development Boards': Equipment.Category.DEV_BOARD,
-            'Tablet': Equipment.Category.TABLET,
-            'Phone': Equipment.Category.PHONE,
-            'Network': Equipment.Category.NETWORK,
-            'Tools': Equipment.Category.TOOLS,
-        }
-
-        categories_data = {
-            'Laptop': [
-                'MacBook Air M2',
-                'MacBook Pro M1',
-                'Dell XPS 13',
-                'Lenovo ThinkPad X1',
-                'HP Spectre x360',
-                'Asus ZenBook Duo',
-            ],
-            'Monitor': [
-                'Dell UltraSharp 27',
-                'LG 27UN850',
-                'BenQ PD3220U',
-                'Samsung Odyssey G9',
-                'ViewSonic ColorPro',
-            ],
-            'Peripherals': [
-                'Logitech MX Keys',
-                'Keychron K3',
-                'Magic Mouse 2',
-                'Wacom Intuos Pro',
-                'Elgato Stream Deck',
-            ],
-            'Audio/Video': [
-                'Sony WH-1000XM5',
-                'Bose QC45',
-                'Blue Yeti Microphone',
-                'Logitech C920 Webcam',
-                'Canon EOS R5',
-            ],
-            'Furniture': [
-                'Herman Miller Aeron',
-                'Steelcase Leap',
-                'IKEA Markus',
-                'Standing Desk (Motorized)',
-                'Whiteboard (Mobile)',
-            ],
-            'Development Boards': [
-                'Raspberry Pi 5',
-                'Arduino Uno R3',
-                'Jetson Nano',
-                'ESP32 DevKit',
-                'STM32 Nucleo',
-            ],
-            'Tablet': [
-                'iPad Pro 12.9',
-                'Samsung Galaxy Tab S9',
-                'iPad Mini 6',
-                'Microsoft Surface Pro 9',
-            ],
-            'Phone': [
-                'iPhone 15 Pro',
-                'Google Pixel 8',
-                'Samsung Galaxy S24',
-                'iPhone SE 3',
-            ],
-            'Network': [
-                'Ubiquiti UniFi Dream Machine',
-                'Cisco Switch 2960',
-                'Synology NAS DS923+',
-                'Starlink Kit',
-                'Netgear Router',
-            ],
-            'Tools': [
-                'Soldering Iron Station',
-                '3D Printer Ender 3',
-                'Digital Multimeter',
-                'Electric Screwdriver Set',
-                'Laser Cutter',
-            ],
-        }
-
-        statuses = [
-            Equipment.Status.AVAILABLE,
-        ]
+    help = (
+        'Generates a deterministic synthetic dataset (users, categories, a '
+        'location tree, equipment and transaction histories whose final state '
+        'matches Equipment.status) for development and benchmarks. The same '
+        '--seed and scale options always produce the same rows.'
+    )
 
-        self.stdout.write('Generating extended equipment data with new categories...')
-
-        created_count = 0
-        for cat_key, items in categories_data.items():
-            db_category = category_map.get(cat_key, Equipment.Category.OTHER)
-
-            for name in items:
-                # Create variations
-                for i in range(1, 3):  # Create 2 of each
-                    full_name = f'{name} #{i}'
-
-                    # Randomized description
-                    desc_prefix = f'這是一台屬於 {cat_key} 類別的設備。'
-                    desc_suffix = (
-                        '適合辦公或開發使用。' if i == 1 else '備用機，狀況良好。'
-                    )
-
-                    status = random.choice(statuses)
-
-                    equipment = Equipment.objects.create(
-                        name=full_name,
-                        description=f'{desc_prefix} {desc_suffix}',
-                        status=status,
-                        category=db_category,
-                        rdf_metadata={
-                            'legacy_category': cat_key,
-                            'specs': 'Standard Config',
-                            'test_batch': 'v4_expanded',
-                        },
-                    )
-                    self.stdout.write(f'Created: [{db_category}] {equipment.name}')
-                    created_count += 1
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument(
+            '--managers', type=int, default=5, help='Of --users, how many approve'
+        )
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--location-depth', type=int, default=3)
+        parser.add_argument('--location-fanout', type=int, default=4)
+        parser.add_argument('--equipment', type=int, default=1000)
+        parser.add_argument(
+            '--transactions-per-item',
+            type=float,
+            default=10,
+            help='Average history length; actual lengths vary per item',
+        )
+        parser.add_argument(
+            '--days', type=int, default=365, help='Time span the histories cover'
+        )
+        parser.add_argument(
+            '--end',
+            type=datetime.fromisoformat,
+            default=None,
+            help='Histories end at this ISO date/time (default: today 00:00 UTC)',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Use bulk_create for transactions on PostgreSQL too (default COPY)',
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Remove rows from a previous run of this command first '
+            '(required when they exist)',
+        )
+
+    def handle(self, *_args, **options):
+        started = time.perf_counter()
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.use_copy = connection.vendor == 'postgresql' and not options['no_copy']
+        end = options['end'] or timezone.now().replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        if timezone.is_naive(end):
+            end = end.replace(tzinfo=UTC)
+        self.end = end
+        self.start = end - timedelta(days=options['days'])
 
+        if options['clear']:
+            self._clear()
+        elif self._has_generated():
+            # Seeded usernames, emails and UUIDs would collide with them
+            raise CommandError(
+                'Generated data from a previous run exists; pass --clear to replace it'
+            )
+
+        with explicit_timestamps(Equipment, Transaction), transaction.atomic():
+            users, managers = self._users(options['users'], options['managers'])
+            categories = self._categories(options['categories'])
+            leaves = self._locations(
+                options['location_depth'], options['location_fanout']
+            )
+            equipment_count, txn_count = self._equipment(
+                options['equipment'],
+                options['transactions_per_item'],
+                users,
+                managers,
+                categories,
+                leaves,
+            )
+
+        # bulk_create skips Equipment.save(), which maintains these
+        drift = counters.reconcile()
         self.stdout.write(
             self.style.SUCCESS(
-                f'\nSuccessfully created {created_count} equipment items.'
+                f'Created {len(users)} users, {len(categories)} categories, '
+                f'{self.location_count} locations, {equipment_count} equipment '
+                f'items and {txn_count} transactions in '
+                f'{time.perf_counter() - started:.1f}s '
+                f'({len(drift)} inventory counters rebuilt).'
+            )
+        )
+
+    def _uuid(self):
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    def _when(self, low, high):
+        return low + (high - low) * self.rng.random()
+
+    def _has_generated(self):
+        return (
+            User.objects.filter(username__startswith=USERNAME_PREFIX).exists()
+            or Equipment.objects.filter(rdf_metadata__generated=True).exists()
+            or Location.objects.filter(description=MARKER).exists()
+            or Category.objects.filter(description=MARKER).exists()
+        )
+
+    def _clear(self):
+        self.stdout.write('Removing previously generated data...')
+        generated = Equipment.objects.filter(rdf_metadata__generated=True)
+        with transaction.atomic(), counters.batch(), sync.batch():
+            BorrowReminder.objects.filter(transaction__equipment__in=generated).delete()
+            # One DELETE instead of the collector loading every transaction;
+            # reminders, the only rows pointing at them, are gone already
+            transactions = Transaction.objects.filter(equipment__in=generated)
+            transactions._raw_delete(transactions.db)
+            generated.delete()
+        # Separately: the batched counter deltas above still name these rows
+        with transaction.atomic():
+            Location.objects.filter(description=MARKER).delete()
+            Category.objects.filter(description=MARKER).delete()
+            User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+    def _users(self, count, manager_count):
+        # Hashing is slow by design; every generated user shares one hash
+        password = make_password('password')
+        users = User.objects.bulk_create(
+            User(
+                username=f'{USERNAME_PREFIX}{i:05d}',
+                email=f'{USERNAME_PREFIX}{i:05d}@example.com',
+                password=password,
+                role=User.Role.MANAGER if i < manager_count else User.Role.USER,
+            )
+            for i in range(max(count, manager_count, 1))
+        )
+        managers = users[: max(manager_count, 1)]
+        return [user.pk for user in users], [user.pk for user in managers]
+
+    def _categories(self, count):
+        bases = list(PRODUCTS)
+        categories = Category.objects.bulk_create(
+            Category(
+                name=f'Gen {bases[i % len(bases)]} {i // len(bases) + 1}',
+                description=MARKER,
             )
+            for i in range(count)
         )
+        sync.record(sync.CATEGORY, [category.pk for category in categories])
+        return [
+            (category.pk, bases[i % len(bases)])
+            for i, category in enumerate(categories)
+        ]
+
+    def _locations(self, depth, fanout):
+        """Builds the tree level by level; returns the leaf location ids."""
+        level = [None]
+        created = []
+        for depth_index in range(depth):
+            name = LEVEL_NAMES[min(depth_index, len(LEVEL_NAMES) - 1)]
+            level = Location.objects.bulk_create(
+                Location(
+                    uuid=self._uuid(),
+                    name=f'{name} {i + 1}',
+                    description=MARKER,
+                    parent=parent,
+                )
+                for parent in level
+                for i in range(fanout)
+            )
+            created.extend(level)
+        sync.record(sync.LOCATION, [location.pk for location in created])
+        self.location_count = len(created)
+        return [location.pk for location in level] or [None]
+
+    def _equipment(self, count, per_item, users, managers, categories, leaves):
+        equipment_count = txn_count = 0
+        items, transactions = [], []
+        for i in range(count):
+            category_id, base = (
+                self.rng.choice(categories) if categories else (None, 'Laptop')
+            )
+            item = Equipment(
+                uuid=self._uuid(),
+                name=f'{self.rng.choice(PRODUCTS[base])} #{i + 1}',
+                description=f'這是一台屬於 {base} 類別的設備。',
+                category_id=category_id,
+                location_id=self.rng.choice(leaves),
+                zone=self.rng.choice('ABCD'),
+                cabinet=str(self.rng.randint(1, 20)),
+                number=str(self.rng.randint(1, 50)),
+                rdf_metadata={'generated': True, 'specs': 'Standard Config'},
+                created_at=self._when(
+                    self.start, self.start + (self.end - self.start) / 5
+                ),
+            )
+            history = self._history(
+                item, round(self.rng.uniform(0, 2 * per_item)), users, managers, leaves
+            )
+            item.updated_at = history[-1].updated_at if history else item.created_at
+            items.append(item)
+            transactions.extend(history)
+            if len(transactions) >= self.batch_size or len(items) >= self.batch_size:
+                equipment_count += self._flush(items, transactions)
+                txn_count += len(transactions)
+                items, transactions = [], []
+        equipment_count += self._flush(items, transactions)
+        txn_count += len(transactions)
+        return equipment_count, txn_count
+
+    def _history(self, item, steps, users, managers, leaves):
+        """
+        Walks `item` through `steps` transactions along the service layer's
+        transitions and leaves its status, location and version at the end
+        state. Only the last request can still be pending.
+        """
+        status = Equipment.Status.AVAILABLE
+        # Every transition bumps the version (see state_machine.apply_transition)
+        item.version = 1
+        times = sorted(self._when(item.created_at, self.end) for _ in range(steps))
+        history = []
+        borrower = None
+        for index, created_at in enumerate(times):
+            last = index == steps - 1
+            next_at = self.end if last else times[index + 1]
+            decided_at = created_at + (next_at - created_at) * self.rng.uniform(
+                0.05, 0.5
+            )
+
+            if status == Equipment.Status.IN_TRANSIT:
+                item.location_id = self.rng.choice(leaves)
+                action, phase = Action.MOVE_CONFIRM, Phase.DIRECT
+            elif status == Equipment.Status.BORROWED:
+                action, phase = Action.RETURN, Phase.REQUEST
+            elif status == Equipment.Status.AVAILABLE:
+                roll = self.rng.random()
+                if roll < DISPATCH_SHARE:
+                    action = Action.DISPATCH
+                elif roll < DISPATCH_SHARE + MOVE_SHARE:
+                    action = Action.MOVE_START
+                else:
+                    action = Action.BORROW
+                phase = Phase.DIRECT if action == Action.MOVE_START else Phase.REQUEST
+            else:
+                # DISPATCHED is final
+                break
+
+            txn = Transaction(
+                equipment_id=item.uuid,
+                action=action,
+                user_id=borrower if action == Action.RETURN else self.rng.choice(users),
+                location_id=item.location_id,
+                zone=item.zone,
+                cabinet=item.cabinet,
+                number=item.number,
+                created_at=created_at,
+                updated_at=created_at,
+            )
+            if phase == Phase.DIRECT:
+                txn.status = TxnStatus.COMPLETED
+            elif last and self.rng.random() < PENDING_SHARE:
+                txn.status = TxnStatus.PENDING_APPROVAL
+            else:
+                item.version += 1
+                approved = self.rng.random() < APPROVE_SHARE
+                txn.status = TxnStatus.COMPLETED if approved else TxnStatus.REJECTED
+                txn.admin_verifier_id = self.rng.choice(managers)
+                txn.updated_at = decided_at
+                phase = Phase.APPROVE if approved else Phase.REJECT
+            if action == Action.BORROW:
+                txn.due_date = created_at + timedelta(days=self.rng.randint(3, 30))
+                borrower = txn.user_id
+
+            status = get_transition(action, phase).target
+            item.version += 1
+            history.append(txn)
+        item.status = status
+        return history
+
+    def _flush(self, items, transactions):
+        Equipment.objects.bulk_create(items, batch_size=self.batch_size)
+        with sync.batch():
+            sync.record(sync.EQUIPMENT, [item.pk for item in items])
+        if self.use_copy:
+            self._copy(transactions)
+        else:
+            Transaction.objects.bulk_create(transactions, batch_size=self.batch_size)
+        return len(items)
+
+    def _copy(self, transactions):
+        """COPY ... FROM STDIN through psycopg; several times faster than INSERT."""
+        fields = [f for f in Transaction._meta.concrete_fields if not f.primary_key]
+        columns = ', '.join(connection.ops.quote_name(f.column) for f in fields)
+        table = connection.ops.quote_name(Transaction._meta.db_table)
+        statement = f'COPY {table} ({columns}) FROM STDIN'
+        with connection.cursor() as cursor, cursor.cursor.copy(statement) as copy:
+            for txn in transactions:
+                copy.write_row(
+                    [
+                        f.get_db_prep_save(getattr(txn, f.attname), connection)
+                        for f in fields
+                    ]
+                )
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from apps.equipment import counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes inventory counters from the equipment table, reports any '
+        'drift and rewrites the counters unless --check is given'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report drift; exit with status 1 if any is found',
+        )
+
+    def handle(self, *_args, **options):
+        drift = counters.reconcile(fix=not options['check'])
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Inventory counters are in sync.'))
+            return
+
+        for key, (stored, actual) in sorted(drift.items(), key=str):
+            self.stdout.write(
+                f'{counters.key_string(key)}: stored={stored} actual={actual}'
+            )
+        if options['check']:
+            self.stderr.write(f'{len(drift)} counters drifted.')
+            raise SystemExit(1)
+        self.stdout.write(self.style.SUCCESS(f'Fixed {len(drift)} counters.'))
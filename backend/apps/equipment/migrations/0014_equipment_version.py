@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-19 16:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0013_alter_equipment_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='equipment',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, verbose_name='版本'),
+        ),
+    ]
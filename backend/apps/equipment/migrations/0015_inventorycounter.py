@@ -0,0 +1,52 @@
+# Generated by Django 6.0 on 2026-10-19 18:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_counters(apps, schema_editor):  # noqa: ARG001
+    equipment_model = apps.get_model('equipment', 'Equipment')
+    counter_model = apps.get_model('equipment', 'InventoryCounter')
+    rows = (
+        equipment_model.objects.values('status', 'category_id', 'location_id')
+        .order_by()
+        .annotate(n=Count('pk'))
+    )
+    counter_model.objects.bulk_create(
+        counter_model(
+            key=f'{row["status"]}:{row["category_id"] or "-"}:{row["location_id"] or "-"}',
+            status=row['status'],
+            category_id=row['category_id'],
+            location_id=row['location_id'],
+            count=row['n'],
+        )
+        for row in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0014_equipment_version'),
+        ('locations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('status', models.CharField(choices=[('AVAILABLE', 'Available'), ('BORROWED', 'Borrowed'), ('PENDING_BORROW', 'Pending Borrow'), ('PENDING_RETURN', 'Pending Return'), ('PENDING_DISPATCH', 'Pending Dispatch'), ('MAINTENANCE', 'Maintenance'), ('TO_BE_MOVED', 'To Be Moved'), ('IN_TRANSIT', 'In Transit'), ('LOST', 'Lost'), ('DISPATCHED', 'Dispatched'), ('DISPOSED', 'Disposed')], max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='equipment.category')),
+                ('location', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='locations.location')),
+            ],
+            options={
+                'verbose_name': '庫存統計',
+                'verbose_name_plural': '庫存統計列表',
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 6.0 on 2026-10-19 20:10
+
+from django.db import migrations, models
+
+
+def seed_sync_log(apps, schema_editor):  # noqa: ARG001
+    # One row per existing object, so a sync from 0 returns everything
+    change_model = apps.get_model('equipment', 'SyncChange')
+    sources = [
+        ('category', apps.get_model('equipment', 'Category')),
+        ('location', apps.get_model('locations', 'Location')),
+        ('equipment', apps.get_model('equipment', 'Equipment')),
+    ]
+    for name, model in sources:
+        change_model.objects.bulk_create(
+            (
+                change_model(model=name, object_id=str(pk))
+                for pk in model.objects.values_list('pk', flat=True).iterator()
+            ),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0015_inventorycounter'),
+        ('locations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('model', models.CharField(choices=[('equipment', '設備'), ('location', '位置'), ('category', '類別')], max_length=20)),
+                ('object_id', models.CharField(max_length=64)),
+                ('deleted', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': '同步變更',
+                'verbose_name_plural': '同步變更列表',
+                'indexes': [models.Index(fields=['model', 'object_id', 'id'], name='equipment_s_model_999536_idx')],
+            },
+        ),
+        migrations.RunPython(seed_sync_log, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,12 @@
 import uuid
 
-from django.db import models
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 
 from apps.common.utils import compress_image
 
+from . import counters, sync
+
 
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True, verbose_name='類別名稱')
@@ -86,6 +88,11 @@ class Equipment(models.Model):
 
     rdf_metadata = models.JSONField(default=dict, blank=True, verbose_name='RDF元數據')
 
+    # Incremented on every write; exposed as the ETag for optimistic locking
+    version = models.PositiveIntegerField(
+        default=1, editable=False, verbose_name='版本'
+    )
+
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='建立時間')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新時間')
 
@@ -96,23 +103,142 @@ class Equipment(models.Model):
     def __str__(self):
         return self.name
 
+    def _compress_new_image(self):
+        # Compress a file uploaded with this save. Images attached by storage
+        # key (apps.common.uploads) are already stored and compressed later.
+        if self.image and not self.image._committed:
+            compressed = compress_image(self.image)
+            if compressed:
+                self.image.save(compressed.name, compressed, save=False)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_counter_key()
+        return instance
+
+    @property
+    def counter_key(self):
+        return counters.counter_key(self.status, self.category_id, self.location_id)
+
+    def _remember_counter_key(self):
+        # The (status, category, location) this instance was read or saved at,
+        # tagged with its version so stale snapshots are never trusted
+        fields = self.__dict__
+        if {'version', 'status', 'category_id', 'location_id'} <= fields.keys():
+            self._saved_counter_key = (self.version, self.counter_key)
+
     def save(self, *args, **kwargs):
-        # Compress image if it's new or changed
-        if self.image:
-            # Check if this is a new instance or image has changed
-            try:
-                this = Equipment.objects.get(pk=self.pk)
-                if this.image != self.image:
-                    compressed = compress_image(self.image)
-                    if compressed:
-                        self.image.save(compressed.name, compressed, save=False)
-            except Equipment.DoesNotExist:
-                # New instance
-                compressed = compress_image(self.image)
-                if compressed:
-                    self.image.save(compressed.name, compressed, save=False)
-
-        super().save(*args, **kwargs)
+        """
+        Inserts new rows normally. Updates keep last-write-wins semantics but
+        go through save_if_version, so the version is bumped by the same
+        conditional UPDATE and the counters see the state actually replaced.
+        """
+        if self._state.adding:
+            self._compress_new_image()
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                counters.record_change(None, self.counter_key)
+                sync.record(sync.EQUIPMENT, [self.pk])
+            self._remember_counter_key()
+            return
+        expected_version = self.version
+        while not self.save_if_version(expected_version):
+            # Someone saved since this instance was read; retry against the
+            # version now current instead of refusing the write
+            expected_version = (
+                Equipment.objects.filter(pk=self.pk)
+                .values_list('version', flat=True)
+                .first()
+            )
+            if expected_version is None:
+                self._state.adding = True
+                return self.save(*args, **kwargs)
+
+    def save_if_version(self, expected_version):
+        """
+        Writes every field with a single UPDATE ... WHERE version = expected_version.
+        Returns False, writing nothing, if another request has saved in between.
+        """
+        self._compress_new_image()
+        values = {
+            field.attname: field.pre_save(self, False)
+            for field in self._meta.concrete_fields
+            if not field.primary_key
+        }
+        values['version'] = expected_version + 1
+        with transaction.atomic():
+            version, before = getattr(self, '_saved_counter_key', (None, None))
+            if version != expected_version:
+                before = (
+                    Equipment.objects.filter(pk=self.pk, version=expected_version)
+                    .values_list('status', 'category_id', 'location_id')
+                    .first()
+                )
+            updated = Equipment.objects.filter(
+                pk=self.pk, version=expected_version
+            ).update(**values)
+            if not updated:
+                return False
+            self.version = expected_version + 1
+            counters.record_change(before, self.counter_key)
+            sync.record(sync.EQUIPMENT, [self.pk])
+        self._remember_counter_key()
+        return True
+
+
+class InventoryCounter(models.Model):
+    """
+    Number of equipment items per (status, category, location), maintained by
+    apps.equipment.counters alongside every equipment write.
+    """
+
+    # '<status>:<category id or ->:<location uuid or ->', unique even for NULLs
+    key = models.CharField(max_length=100, unique=True)
+    status = models.CharField(max_length=20, choices=Equipment.Status.choices)
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, null=True, related_name='+'
+    )
+    location = models.ForeignKey(
+        'locations.Location', on_delete=models.CASCADE, null=True, related_name='+'
+    )
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = '庫存統計'
+        verbose_name_plural = '庫存統計列表'
+
+    def __str__(self):
+        return f'{self.key} = {self.count}'
+
+
+class SyncChange(models.Model):
+    """
+    Change log behind the delta-sync API. Every write to an equipment item,
+    location or category appends a row; the auto-increment id is the sync
+    watermark. Compaction keeps only the newest row per object, so replaying
+    from 0 always yields a complete snapshot including tombstones.
+    """
+
+    class Model(models.TextChoices):
+        EQUIPMENT = 'equipment', '設備'
+        LOCATION = 'location', '位置'
+        CATEGORY = 'category', '類別'
+
+    id = models.BigAutoField(primary_key=True)
+    model = models.CharField(max_length=20, choices=Model.choices)
+    # Equipment / location UUID or category id, as text
+    object_id = models.CharField(max_length=64)
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = '同步變更'
+        verbose_name_plural = '同步變更列表'
+        indexes = [models.Index(fields=['model', 'object_id', 'id'])]
+
+    def __str__(self):
+        return f'#{self.id} {self.model}:{self.object_id}'
 
 
 class Attachment(models.Model):
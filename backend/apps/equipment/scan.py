@@ -0,0 +1,187 @@
+"""
+Everything the QR landing page needs for one equipment item, in one call.
+
+The equipment row and the ids of its pending / possession transactions come
+from a single query. Its version then keys a cache entry, so repeat scans of
+an unchanged item cost that one query; a miss adds the transactions and the
+location paths. Every status change bumps the version, which also covers new
+and resolved transactions.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+
+from apps.locations.services import aget_location_context, get_location_context
+from apps.transactions.models import Transaction
+from apps.transactions.state_machine import TRANSITIONS, Phase
+from apps.users.models import User
+from apps.users.serializers import UserSerializer
+
+from .codes import parse_code
+from .models import Equipment
+from .serializers import EquipmentSummarySerializer
+
+Status = Equipment.Status
+Action = Transaction.Action
+
+# Statuses in which somebody holds the item through a completed transaction
+HELD_STATUSES = {Status.BORROWED, Status.PENDING_RETURN, Status.DISPATCHED}
+
+
+def _is_privileged(user):
+    return user.role in [User.Role.MANAGER, User.Role.ADMIN] or user.is_staff
+
+
+def _role(user):
+    return 'STAFF' if _is_privileged(user) else user.role
+
+
+def _can(action, phase, status):
+    return status in TRANSITIONS[(action, phase)].sources
+
+
+def allowed_actions(equipment_status, pending, privileged):
+    """
+    Actions the scan page offers, from the transition table and the same
+    permissions the transaction and equipment endpoints enforce. RETURN for
+    the borrower is added per request, since it depends on the user.
+    """
+    actions = ['EDIT']
+    if _can(Action.BORROW, Phase.REQUEST, equipment_status):
+        actions.append('BORROW')
+    if _can(Action.DISPATCH, Phase.REQUEST, equipment_status):
+        actions.append('DISPATCH')
+    if privileged and _can(Action.RETURN, Phase.REQUEST, equipment_status):
+        actions.append('RETURN')
+    if _can(Action.MOVE_START, Phase.DIRECT, equipment_status):
+        actions.append('MOVE_START')
+    if _can(Action.MOVE_CONFIRM, Phase.DIRECT, equipment_status):
+        actions.append('MOVE_CONFIRM')
+    if privileged:
+        if pending is not None:
+            actions += ['APPROVE', 'REJECT']
+        actions.append('DELETE')
+    return actions
+
+
+def _transaction_summary(txn):
+    return {
+        'id': txn.id,
+        'action': txn.action,
+        'status': txn.status,
+        'user': UserSerializer(txn.user).data,
+        'due_date': txn.due_date,
+        'created_at': txn.created_at,
+        'updated_at': txn.updated_at,
+    }
+
+
+def _scan_queryset(equipment_uuid):
+    pending = Transaction.objects.filter(
+        equipment=OuterRef('pk'), status=Transaction.Status.PENDING_APPROVAL
+    ).order_by('-created_at', '-id')
+    possession = Transaction.objects.filter(
+        equipment=OuterRef('pk'),
+        action__in=[Action.BORROW, Action.DISPATCH],
+        status=Transaction.Status.COMPLETED,
+    ).order_by('-created_at', '-id')
+    return (
+        Equipment.objects.filter(pk=equipment_uuid)
+        .select_related('location')
+        .annotate(
+            pending_id=Subquery(pending.values('pk')[:1]),
+            possession_id=Subquery(possession.values('pk')[:1]),
+        )
+    )
+
+
+def _cache_key(equipment, user):
+    return f'scan:{equipment.pk}:{equipment.version}:{_role(user)}'
+
+
+def _transaction_ids(equipment):
+    ids = [equipment.pending_id]
+    if equipment.status in HELD_STATUSES:
+        ids.append(equipment.possession_id)
+    return [pk for pk in ids if pk]
+
+
+def _build_payload(equipment, transactions, location_context, privileged):
+    pending_txn = transactions.get(equipment.pending_id)
+    holder_txn = (
+        transactions.get(equipment.possession_id)
+        if equipment.status in HELD_STATUSES
+        else None
+    )
+    return {
+        'equipment': EquipmentSummarySerializer(
+            equipment, context=location_context
+        ).data,
+        'holder': _transaction_summary(holder_txn) if holder_txn else None,
+        'pending': _transaction_summary(pending_txn) if pending_txn else None,
+        'actions': allowed_actions(equipment.status, pending_txn, privileged),
+    }
+
+
+def _for_user(payload, equipment, user, privileged):
+    holder = payload['holder']
+    if (
+        not privileged
+        and holder
+        and holder['user']['id'] == user.pk
+        and _can(Action.RETURN, Phase.REQUEST, equipment.status)
+    ):
+        payload = {**payload, 'actions': [*payload['actions'], 'RETURN']}
+    return payload
+
+
+def resolve_scan(equipment_uuid, user):
+    """
+    Returns the scan payload, or None if no equipment has this UUID. A short
+    label code (see codes.py) is accepted as well.
+    """
+    equipment_uuid = parse_code(equipment_uuid)
+    if equipment_uuid is None:
+        return None
+    equipment = _scan_queryset(equipment_uuid).first()
+    if equipment is None:
+        return None
+
+    privileged = _is_privileged(user)
+    key = _cache_key(equipment, user)
+    payload = cache.get(key)
+    if payload is None:
+        transactions = Transaction.objects.select_related('user').in_bulk(
+            _transaction_ids(equipment)
+        )
+        payload = _build_payload(
+            equipment, transactions, get_location_context(), privileged
+        )
+        cache.set(key, payload, settings.SCAN_CACHE_TIMEOUT)
+    return _for_user(payload, equipment, user, privileged)
+
+
+async def aresolve_scan(equipment_uuid, user):
+    """
+    resolve_scan() on the async ORM and cache API, for the ASGI views.
+    """
+    equipment_uuid = parse_code(equipment_uuid)
+    if equipment_uuid is None:
+        return None
+    equipment = await _scan_queryset(equipment_uuid).afirst()
+    if equipment is None:
+        return None
+
+    privileged = _is_privileged(user)
+    key = _cache_key(equipment, user)
+    payload = await cache.aget(key)
+    if payload is None:
+        transactions = await Transaction.objects.select_related('user').ain_bulk(
+            _transaction_ids(equipment)
+        )
+        payload = _build_payload(
+            equipment, transactions, await aget_location_context(), privileged
+        )
+        await cache.aset(key, payload, settings.SCAN_CACHE_TIMEOUT)
+    return _for_user(payload, equipment, user, privileged)
@@ -1,11 +1,16 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
 
 from apps.locations.models import Location
-from apps.locations.serializers import LocationSerializer
+from apps.locations.serializers import LocationSerializer, LocationSummarySerializer
+from apps.transactions.models import Transaction
 from apps.users.serializers import UserSerializer
 
 from .models import Attachment, Category, Equipment
 
+# Upper bound for one offline scan upload; clients split larger queues
+MAX_SCAN_BATCH = 2000
+
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -62,10 +67,11 @@ class EquipmentSerializer(serializers.ModelSerializer):
             'rdf_metadata',
             'created_at',
             'updated_at',
+            'version',
             'attachments',
             'current_possession',
         ]
-        read_only_fields = ['uuid', 'created_at', 'updated_at']
+        read_only_fields = ['uuid', 'created_at', 'updated_at', 'version']
 
     def to_representation(self, instance):
         ret = super().to_representation(instance)
@@ -78,9 +84,32 @@ class EquipmentSerializer(serializers.ModelSerializer):
             )
         return ret
 
+    @staticmethod
+    def setup_eager_loading(queryset, prefix=''):
+        """
+        Adds the joins and prefetches this serializer reads, so serializing a
+        page costs a fixed number of queries. `prefix` is the lookup path when
+        the equipment is reached through a relation (e.g. 'equipment__').
+        """
+        return queryset.select_related(
+            f'{prefix}category', f'{prefix}location', f'{prefix}target_location'
+        ).prefetch_related(
+            f'{prefix}attachments',
+            Prefetch(
+                f'{prefix}transactions',
+                queryset=Transaction.objects.select_related('user').order_by(
+                    '-created_at'
+                )[:1],
+                to_attr='latest_transactions',
+            ),
+        )
+
     def get_current_possession(self, obj):
-        # We assume the 'transactions' related name is available
-        last_txn = obj.transactions.order_by('-created_at').first()
+        if hasattr(obj, 'latest_transactions'):
+            # Prefetched by setup_eager_loading
+            last_txn = next(iter(obj.latest_transactions), None)
+        else:
+            last_txn = obj.transactions.order_by('-created_at').first()
         if last_txn and last_txn.action == 'BORROW' and last_txn.status == 'COMPLETED':
             return UserSerializer(last_txn.user).data
         return None
@@ -128,3 +157,71 @@ class EquipmentSerializer(serializers.ModelSerializer):
                 del data['image']
 
         return super().to_internal_value(data)
+
+
+class EquipmentSummarySerializer(serializers.ModelSerializer):
+    """
+    Flat, read-only equipment header for endpoints that list related rows
+    (history, scan) and must not re-run the full nested serialization.
+    """
+
+    location_details = LocationSummarySerializer(source='location', read_only=True)
+
+    class Meta:
+        model = Equipment
+        fields = [
+            'uuid',
+            'name',
+            'status',
+            'category',
+            'location',
+            'location_details',
+            'zone',
+            'cabinet',
+            'number',
+            'version',
+            'updated_at',
+        ]
+        read_only_fields = fields
+
+
+class EquipmentSyncSerializer(serializers.ModelSerializer):
+    """
+    Flat equipment row for the delta-sync API. References locations and
+    categories by key only; clients sync those separately.
+    """
+
+    class Meta:
+        model = Equipment
+        fields = [
+            'uuid',
+            'name',
+            'description',
+            'status',
+            'category',
+            'location',
+            'zone',
+            'cabinet',
+            'number',
+            'target_location',
+            'target_zone',
+            'target_cabinet',
+            'target_number',
+            'image',
+            'version',
+            'updated_at',
+        ]
+        read_only_fields = fields
+
+
+class ScanEventSerializer(serializers.Serializer):
+    uuid = serializers.UUIDField()
+    scanned_at = serializers.DateTimeField()
+    location = serializers.UUIDField(required=False)
+    zone = serializers.CharField(max_length=50, required=False, allow_blank=True)
+    cabinet = serializers.CharField(max_length=50, required=False, allow_blank=True)
+    number = serializers.CharField(max_length=50, required=False, allow_blank=True)
+
+
+class ScanBatchSerializer(serializers.Serializer):
+    scans = ScanEventSerializer(many=True, allow_empty=False, max_length=MAX_SCAN_BATCH)
@@ -1,15 +1,58 @@
 from django.db import transaction
+from django.utils import timezone
 
+from apps.common.exceptions import PreconditionFailed
 from apps.equipment.models import Equipment
+from apps.locations.models import Location
+from apps.transactions import events
 from apps.transactions.models import Transaction
+from apps.transactions.state_machine import action_for_status_change
 
+from . import counters, sync
 
-def update_equipment_with_transaction(serializer, user, image=None):
+# Observed fields a scan event may carry, as (event key, model attribute)
+SCAN_FIELDS = (
+    ('location', 'location_id'),
+    ('zone', 'zone'),
+    ('cabinet', 'cabinet'),
+    ('number', 'number'),
+)
+
+
+def logged_action(old_status, new_status, location_changed):
+    """
+    Returns the (Transaction.Action, reason) an equipment edit is logged as,
+    or (None, '') if the change is not tracked.
+    """
+    # Status based transitions, as declared in the transition table
+    if old_status != new_status:
+        action_type = action_for_status_change(old_status, new_status)
+        if action_type:
+            return action_type, f'Status changed from {old_status} to {new_status}'
+
+    # Location based transitions (Direct Move or Correction). Only if the
+    # status change is not already logged, to avoid double logging
+    if new_status == Equipment.Status.AVAILABLE and location_changed:
+        # Treat direct location change as immediate move confirmation
+        return Transaction.Action.MOVE_CONFIRM, 'Direct location update'
+
+    return None, ''
+
+
+def update_equipment_with_transaction(
+    serializer, user, image=None, expected_version=None
+):
     """
     Updates an equipment instance via its serializer and logs a transaction
     if status or location changes.
+
+    The write is a single conditional UPDATE on `version` (defaulting to the
+    version the instance was read at), so the old values compared below are
+    exactly the ones being replaced. Raises PreconditionFailed otherwise.
     """
     instance = serializer.instance
+    if expected_version is None:
+        expected_version = instance.version
 
     # Capture old state before saving
     old_status = instance.status
@@ -20,7 +63,11 @@ def update_equipment_with_transaction(serializer, user, image=None):
 
     with transaction.atomic():
         # Perform the actual update
-        updated_instance = serializer.save()
+        for attr, value in serializer.validated_data.items():
+            setattr(instance, attr, value)
+        if not instance.save_if_version(expected_version):
+            raise PreconditionFailed()
+        updated_instance = instance
 
         new_status = updated_instance.status
         new_location = updated_instance.location
@@ -28,34 +75,16 @@ def update_equipment_with_transaction(serializer, user, image=None):
         new_cabinet = updated_instance.cabinet
         new_number = updated_instance.number
 
-        action_type = None
-        reason = ''
-
-        # Status based transitions
         if old_status != new_status:
-            if new_status == Equipment.Status.IN_TRANSIT:
-                action_type = 'MOVE_START'
-                reason = f'Status changed from {old_status} to {new_status}'
-            elif (
-                old_status == Equipment.Status.IN_TRANSIT
-                and new_status == Equipment.Status.AVAILABLE
-            ):
-                action_type = 'MOVE_CONFIRM'
-                reason = f'Status changed from {old_status} to {new_status}'
-
-        # Location based transitions (Direct Move or Correction)
-        # Only log if action_type is not yet set (to avoid double logging if covered by status change)
-        if not action_type and new_status == Equipment.Status.AVAILABLE:
-            location_changed = (
-                (old_location != new_location)
-                or (old_zone != new_zone)
-                or (old_cabinet != new_cabinet)
-                or (old_number != new_number)
-            )
+            events.equipment_status_event(updated_instance)
 
-            if location_changed:
-                action_type = 'MOVE_CONFIRM'  # Treat direct location change as immediate move confirmation
-                reason = 'Direct location update'
+        location_changed = (
+            (old_location != new_location)
+            or (old_zone != new_zone)
+            or (old_cabinet != new_cabinet)
+            or (old_number != new_number)
+        )
+        action_type, reason = logged_action(old_status, new_status, location_changed)
 
         if action_type:
             # Create a transaction record with location snapshot
@@ -73,3 +102,100 @@ def update_equipment_with_transaction(serializer, user, image=None):
             )
 
     return updated_instance
+
+
+def apply_scan_events(scans, user):
+    """
+    Applies a batch of offline scans (dicts with `uuid`, `scanned_at`
+    and any of `location`, `zone`, `cabinet`, `number`).
+
+    Only the latest scan per equipment counts. Scans older than the item's
+    last update are skipped as stale, since someone changed it after the scan.
+    Everything else is corrected like update_equipment_with_transaction
+    would, but with one locking read, one bulk UPDATE and one bulk INSERT of
+    transactions for the whole batch.
+
+    Returns a report with the UUIDs in each outcome.
+    """
+    latest = {}
+    for scan in scans:
+        current = latest.get(scan['uuid'])
+        if current is None or scan['scanned_at'] > current['scanned_at']:
+            latest[scan['uuid']] = scan
+
+    report = {
+        'received': len(scans),
+        'applied': [],
+        'unchanged': [],
+        'stale': [],
+        'not_found': [],
+        'invalid_location': [],
+    }
+    location_ids = {
+        scan['location'] for scan in latest.values() if scan.get('location')
+    }
+
+    with transaction.atomic(), counters.batch(), sync.batch():
+        equipment = Equipment.objects.select_for_update().in_bulk(list(latest))
+        known_locations = (
+            set(Location.objects.in_bulk(location_ids)) if location_ids else set()
+        )
+        now = timezone.now()
+        changed = []
+        logs = []
+
+        for uuid, scan in latest.items():
+            item = equipment.get(uuid)
+            if item is None:
+                report['not_found'].append(uuid)
+                continue
+            if scan.get('location') and scan['location'] not in known_locations:
+                report['invalid_location'].append(uuid)
+                continue
+            if item.updated_at > scan['scanned_at']:
+                report['stale'].append(uuid)
+                continue
+
+            before = item.counter_key
+            location_changed = False
+            for key, attr in SCAN_FIELDS:
+                if key in scan and getattr(item, attr) != scan[key]:
+                    setattr(item, attr, scan[key])
+                    location_changed = True
+            if not location_changed:
+                report['unchanged'].append(uuid)
+                continue
+
+            item.version += 1
+            item.updated_at = now
+            changed.append(item)
+            counters.record_change(before, item.counter_key)
+            report['applied'].append(uuid)
+
+            action_type, _reason = logged_action(
+                item.status, item.status, location_changed
+            )
+            if action_type:
+                logs.append(
+                    Transaction(
+                        equipment=item,
+                        user=user,
+                        action=action_type,
+                        status=Transaction.Status.COMPLETED,
+                        location_id=item.location_id,
+                        zone=item.zone,
+                        cabinet=item.cabinet,
+                        number=item.number,
+                        reason=f'Location confirmed by scan at {scan["scanned_at"]:%Y-%m-%d %H:%M}',
+                    )
+                )
+
+        Equipment.objects.bulk_update(
+            changed,
+            ['location', 'zone', 'cabinet', 'number', 'version', 'updated_at'],
+            batch_size=500,
+        )
+        Transaction.objects.bulk_create(logs, batch_size=500)
+        sync.record(sync.EQUIPMENT, [item.pk for item in changed])
+
+    return report
@@ -0,0 +1,52 @@
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from apps.locations.models import Location
+
+from . import counters, sync
+from .models import Category, Equipment
+
+
+@receiver(post_delete, sender=Equipment)
+def remove_from_counters(sender, instance, **kwargs):  # noqa: ARG001
+    # Covers destroy, bulk_delete and admin deletes; wrap bulk deletes in
+    # counters.batch() to write one UPDATE per key
+    counters.record_change(instance.counter_key, None)
+    sync.record(sync.EQUIPMENT, [instance.pk], deleted=True)
+
+
+@receiver(pre_delete, sender=Category)
+def fold_category_counters(sender, instance, **kwargs):  # noqa: ARG001
+    counters.fold_into_null('category', instance.pk)
+    # on_delete=SET_NULL updates the equipment without saving it
+    sync.record(
+        sync.EQUIPMENT,
+        Equipment.objects.filter(category=instance).values_list('pk', flat=True),
+    )
+
+
+@receiver(pre_delete, sender=Location)
+def fold_location_counters(sender, instance, **kwargs):  # noqa: ARG001
+    counters.fold_into_null('location', instance.pk)
+    sync.record(
+        sync.EQUIPMENT,
+        Equipment.objects.filter(
+            Q(location=instance) | Q(target_location=instance)
+        ).values_list('pk', flat=True),
+    )
+    sync.record(sync.LOCATION, instance.children.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Location)
+def record_sync_change(sender, instance, **kwargs):  # noqa: ARG001
+    model = sync.CATEGORY if sender is Category else sync.LOCATION
+    sync.record(model, [instance.pk])
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Location)
+def record_sync_tombstone(sender, instance, **kwargs):  # noqa: ARG001
+    model = sync.CATEGORY if sender is Category else sync.LOCATION
+    sync.record(model, [instance.pk], deleted=True)
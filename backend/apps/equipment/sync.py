@@ -0,0 +1,106 @@
+"""
+Change log for the delta-sync API.
+
+Writes call record() inside their own database transaction; GET /sync/
+replays the log after a client's watermark and returns the current state of
+every object touched since, plus tombstones for deleted ones.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+_pending = ContextVar('sync_change_batch', default=None)
+
+EQUIPMENT = 'equipment'
+LOCATION = 'location'
+CATEGORY = 'category'
+
+
+def record(model, object_ids, deleted=False):
+    """
+    Appends one change per id in `object_ids` for `model` (EQUIPMENT,
+    LOCATION or CATEGORY).
+    """
+    from .models import SyncChange
+
+    rows = [
+        SyncChange(model=model, object_id=str(object_id), deleted=deleted)
+        for object_id in object_ids
+    ]
+    batch = _pending.get()
+    if batch is not None:
+        batch.extend(rows)
+    elif rows:
+        SyncChange.objects.bulk_create(rows)
+
+
+@contextmanager
+def batch():
+    """
+    Collects changes and inserts them with one bulk INSERT on exit, for bulk
+    operations. Must be used inside the same atomic block as the writes.
+    """
+    from .models import SyncChange
+
+    if _pending.get() is not None:
+        yield
+        return
+    rows = []
+    token = _pending.set(rows)
+    try:
+        yield
+    finally:
+        _pending.reset(token)
+    SyncChange.objects.bulk_create(rows, batch_size=1000)
+
+
+def changes_since(since, limit):
+    """
+    Returns (changes, watermark, has_more): the newest change per
+    (model, object_id) among up to `limit` log rows after `since`.
+
+    Rows younger than SYNC_SAFETY_LAG_SECONDS are held back: ids are assigned
+    at insert time, so a transaction still in flight may commit a lower id
+    than one that is already visible, and the watermark must not skip it.
+    """
+    from .models import SyncChange
+
+    cutoff = timezone.now() - timedelta(seconds=settings.SYNC_SAFETY_LAG_SECONDS)
+    rows = list(
+        SyncChange.objects.filter(id__gt=since)
+        .order_by('id')
+        .values_list('id', 'model', 'object_id', 'deleted', 'created_at')[: limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    for index, row in enumerate(rows):
+        if row[4] > cutoff:
+            # The rest is picked up by the client's next regular sync
+            rows = rows[:index]
+            has_more = False
+            break
+
+    changes = {}
+    for _id, model, object_id, deleted, _created_at in rows:
+        changes[(model, object_id)] = deleted
+    watermark = rows[-1][0] if rows else since
+    return changes, watermark, has_more
+
+
+def compact():
+    """
+    Deletes every log row superseded by a newer row for the same object.
+    Safe at any time: a client behind a deleted row still finds the newer one.
+    """
+    from .models import SyncChange
+
+    newer = SyncChange.objects.filter(
+        model=OuterRef('model'), object_id=OuterRef('object_id'), id__gt=OuterRef('id')
+    )
+    deleted, _ = SyncChange.objects.filter(Exists(newer)).delete()
+    return deleted
@@ -1,15 +1,37 @@
-from io import BytesIO
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import async_to_sync
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+import qrcode
 from PIL import Image
 from rest_framework import status
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 
+from apps.common import qr, uploads
+from apps.common.exceptions import PreconditionFailed
+from apps.locations.models import Location
 from apps.transactions.models import Transaction
+from apps.transactions.services import TransactionService
+from apps.transactions.state_machine import Phase, apply_transition
 
-from .models import Category, Equipment
+from . import codes, counters
+from .management.commands.benchmark_endpoints import compare
+from .models import Attachment, Category, Equipment, InventoryCounter, SyncChange
 from .serializers import EquipmentSerializer
 from .services import update_equipment_with_transaction
 
@@ -80,7 +102,32 @@ class EquipmentAPITests(TestCase):
         response = self.client.get(url)
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['equipment']['uuid'], str(self.equipment.uuid))
+        self.assertNotIn('equipment_detail', response.data['results'][0])
+
+    def test_equipment_history_pagination(self):
+        """測試歷史紀錄使用游標分頁且每頁查詢數固定"""
+        self.client.force_authenticate(user=self.user)
+        url = f'/api/v1/equipment/{self.equipment.uuid}/history/'
+        Transaction.objects.create(equipment=self.equipment, user=self.user, action='MOVE_START')
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+
+        Transaction.objects.bulk_create(
+            Transaction(equipment=self.equipment, user=self.user, admin_verifier=self.admin, action='MOVE_CONFIRM')
+            for _ in range(45)
+        )
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url, {'page_size': 20})
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(len(response.data['results']), 20)
+
+        seen = {row['id'] for row in response.data['results']}
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen.update(row['id'] for row in response.data['results'])
+        self.assertEqual(len(seen), 46)
 
     def test_bulk_delete_permission(self):
 # ... (keep existing tests) ...
@@ -135,3 +182,598 @@ class EquipmentAPITests(TestCase):
         with self.equipment.image.open() as img_file:
             uploaded_image = Image.open(img_file)
             self.assertEqual(uploaded_image.format, 'JPEG')
+
+
+class EquipmentConcurrencyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='occ_user', email='occ_user@example.com', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.equipment = Equipment.objects.create(name='Shared Scope', status=Equipment.Status.AVAILABLE)
+        self.url = f'/api/v1/equipment/{self.equipment.uuid}/'
+
+    def test_detail_exposes_version_as_etag(self):
+        """測試詳細資料回傳 ETag 版本"""
+        response = self.client.get(self.url)
+        self.assertEqual(response['ETag'], f'"{self.equipment.version}"')
+
+    def test_patch_with_matching_if_match(self):
+        """測試 If-Match 相符時更新成功並遞增版本"""
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.patch(self.url, {'name': 'Renamed'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.equipment.refresh_from_db()
+        self.assertEqual(self.equipment.name, 'Renamed')
+
+    def test_patch_with_stale_if_match_returns_412(self):
+        """測試 If-Match 過期時回傳 412 且不覆寫"""
+        etag = self.client.get(self.url)['ETag']
+        self.client.patch(self.url, {'name': 'First Editor'}, format='json', HTTP_IF_MATCH=etag)
+
+        response = self.client.patch(self.url, {'name': 'Second Editor'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.equipment.refresh_from_db()
+        self.assertEqual(self.equipment.name, 'First Editor')
+
+    def test_concurrent_write_between_read_and_save(self):
+        """測試讀取後被其他請求修改時，條件式更新失敗"""
+        serializer = EquipmentSerializer(self.equipment, data={'status': Equipment.Status.IN_TRANSIT}, partial=True)
+        self.assertTrue(serializer.is_valid())
+        Equipment.objects.get(pk=self.equipment.pk).save()
+
+        with self.assertRaises(PreconditionFailed):
+            update_equipment_with_transaction(serializer, self.user)
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_stale_instance_save_bumps_past_the_current_version(self):
+        """測試過期的實例儲存時不拋出例外、不重複使用版本號，且不加鎖"""
+        stale = Equipment.objects.get(pk=self.equipment.pk)
+        apply_transition(self.equipment.uuid, Transaction.Action.MOVE_START, Phase.DIRECT)
+
+        stale.name = 'Renamed'
+        with CaptureQueriesContext(connection) as ctx:
+            stale.save()
+        self.assertFalse(any('FOR UPDATE' in q['sql'] for q in ctx.captured_queries))
+        self.assertEqual(stale.version, 3)
+        self.equipment.refresh_from_db()
+        self.assertEqual((self.equipment.name, self.equipment.version), ('Renamed', 3))
+        self.assertEqual(counters.reconcile(fix=False), {})
+
+
+class InventoryCounterTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='stats_admin', email='stats_admin@example.com', password='password', role=User.Role.ADMIN)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+        self.category = Category.objects.create(name='Counters')
+        self.location = Location.objects.create(name='Shelf')
+
+    def _count(self, status_value, category=None, location=None):
+        key = (status_value, category.pk if category else None, location.pk if location else None)
+        return InventoryCounter.objects.filter(key=counters.key_string(key)).values_list('count', flat=True).first() or 0
+
+    def assertInSync(self):
+        self.assertEqual(counters.reconcile(fix=False), {})
+
+    def test_counters_follow_equipment_lifecycle(self):
+        """測試設備建立、借用、編輯與刪除時統計同步更新"""
+        eq = Equipment.objects.create(name='Counted', category=self.category, location=self.location)
+        self.assertEqual(self._count('AVAILABLE', self.category, self.location), 1)
+
+        TransactionService.create_borrow_request(self.admin, eq.uuid)
+        self.assertEqual(self._count('AVAILABLE', self.category, self.location), 0)
+        self.assertEqual(self._count('PENDING_BORROW', self.category, self.location), 1)
+
+        eq.refresh_from_db()
+        response = self.client.patch(f'/api/v1/equipment/{eq.uuid}/', {'location': None, 'status': 'MAINTENANCE'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._count('MAINTENANCE', self.category), 1)
+        self.assertInSync()
+
+        self.client.delete(f'/api/v1/equipment/{eq.uuid}/')
+        self.assertEqual(self._count('MAINTENANCE', self.category), 0)
+        self.assertInSync()
+
+    def test_bulk_delete_and_category_delete_keep_counters_in_sync(self):
+        """測試批量刪除與刪除類別後統計仍一致"""
+        items = [Equipment.objects.create(name=f'Item {i}', category=self.category, location=self.location) for i in range(4)]
+        self.client.post('/api/v1/equipment/bulk-delete/', {'uuids': [str(items[0].uuid), str(items[1].uuid)]}, format='json')
+        self.assertEqual(self._count('AVAILABLE', self.category, self.location), 2)
+
+        self.category.delete()
+        self.assertEqual(self._count('AVAILABLE', None, self.location), 2)
+        self.assertInSync()
+
+    def test_stats_endpoint_and_reconcile_command(self):
+        """測試統計端點與校正指令"""
+        Equipment.objects.create(name='A', category=self.category, location=self.location)
+        Equipment.objects.create(name='B', category=self.category, status=Equipment.Status.BORROWED)
+        # 直接以 bulk_create 寫入會繞過計數，由校正指令修正
+        Equipment.objects.bulk_create([Equipment(name='Drifted')])
+
+        out = StringIO()
+        call_command('reconcile_inventory_counters', stdout=out)
+        self.assertIn('Fixed 1 counters', out.getvalue())
+        self.assertInSync()
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/v1/stats/')
+        self.assertEqual(len(ctx), 1)
+        self.assertEqual(response.data['total'], 3)
+        self.assertEqual(response.data['by_status']['BORROWED'], 1)
+        category_stats = next(row for row in response.data['by_category'] if row['category'] == self.category.pk)
+        self.assertEqual(category_stats['total'], 2)
+
+
+@override_settings(SYNC_SAFETY_LAG_SECONDS=0)
+class EquipmentSyncTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='sync_admin', email='sync_admin@example.com', password='password', role=User.Role.ADMIN)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+        self.category = Category.objects.create(name='Sync Category')
+        self.location = Location.objects.create(name='Sync Shelf')
+        self.kept = Equipment.objects.create(name='Kept', category=self.category, location=self.location)
+        self.removed = Equipment.objects.create(name='Removed', category=self.category)
+
+    def _sync(self, since, **params):
+        response = self.client.get('/api/v1/sync/', {'since': since, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_initial_sync_then_deltas_and_tombstones(self):
+        """測試首次同步取得全部資料，之後只回傳變更與刪除標記"""
+        full = self._sync(0)
+        self.assertEqual({row['uuid'] for row in full['equipment']}, {str(self.kept.uuid), str(self.removed.uuid)})
+        self.assertEqual([row['uuid'] for row in full['locations']], [str(self.location.uuid)])
+        self.assertEqual([row['id'] for row in full['categories']], [self.category.id])
+        self.assertFalse(full['has_more'])
+
+        self.assertEqual(self._sync(full['watermark'])['equipment'], [])
+
+        TransactionService.create_borrow_request(self.admin, self.kept.uuid)
+        self.client.delete(f'/api/v1/equipment/{self.removed.uuid}/')
+        delta = self._sync(full['watermark'])
+        self.assertEqual([(row['uuid'], row['status']) for row in delta['equipment']], [(str(self.kept.uuid), 'PENDING_BORROW')])
+        self.assertEqual(delta['deleted']['equipment'], [str(self.removed.uuid)])
+
+        # 刪除類別會讓設備的類別變為空值，也必須同步
+        category_id = self.category.id
+        self.category.delete()
+        delta = self._sync(delta['watermark'])
+        self.assertEqual(delta['deleted']['categories'], [category_id])
+        self.assertEqual([row['category'] for row in delta['equipment']], [None])
+
+    def test_bulk_delete_paging_and_compaction(self):
+        """測試批量刪除標記、分頁與壓縮後重新同步結果一致"""
+        start = self._sync(0)['watermark']
+        items = [Equipment.objects.create(name=f'Bulk {i}') for i in range(3)]
+        self.client.post('/api/v1/equipment/bulk-delete/', {'uuids': [str(item.uuid) for item in items]}, format='json')
+
+        page = self._sync(start, limit=2)
+        self.assertTrue(page['has_more'])
+        seen_deleted = set(page['deleted']['equipment'])
+        while page['has_more']:
+            page = self._sync(page['watermark'], limit=2)
+            seen_deleted |= set(page['deleted']['equipment'])
+        self.assertEqual(seen_deleted, {str(item.uuid) for item in items})
+
+        before = self._sync(0, limit=1000)
+        call_command('compact_sync_log', stdout=StringIO())
+        after = self._sync(0, limit=1000)
+        self.assertEqual(SyncChange.objects.count(), len(after['equipment']) + len(after['locations']) + len(after['categories']) + 3)
+        self.assertEqual(after['equipment'], before['equipment'])
+        self.assertEqual(sorted(after['deleted']['equipment']), sorted(before['deleted']['equipment']))
+
+
+class ScanIngestionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='scanner', email='scanner@example.com', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.shelf = Location.objects.create(name='Shelf A')
+        self.bench = Location.objects.create(name='Bench B')
+        self.later = (timezone.now() + timedelta(minutes=5)).isoformat()
+
+    def _post(self, scans):
+        return self.client.post('/api/v1/equipment/scans/', {'scans': scans}, format='json')
+
+    def test_batch_applies_latest_scan_per_item(self):
+        """測試批次掃描去重、套用最新位置並記錄移動交易"""
+        moved = Equipment.objects.create(name='Moved', location=self.shelf, zone='A')
+        in_place = Equipment.objects.create(name='In Place', location=self.shelf, zone='A')
+        borrowed = Equipment.objects.create(name='Borrowed', status=Equipment.Status.BORROWED, location=self.shelf)
+        early = timezone.now().isoformat()
+        missing = '00000000-0000-0000-0000-000000000000'
+
+        response = self._post([
+            {'uuid': str(moved.uuid), 'scanned_at': early, 'location': str(self.shelf.uuid), 'zone': 'C'},
+            {'uuid': str(moved.uuid), 'scanned_at': self.later, 'location': str(self.bench.uuid), 'zone': 'B'},
+            {'uuid': str(in_place.uuid), 'scanned_at': self.later, 'location': str(self.shelf.uuid), 'zone': 'A'},
+            {'uuid': str(borrowed.uuid), 'scanned_at': self.later, 'location': str(self.bench.uuid)},
+            {'uuid': missing, 'scanned_at': self.later, 'location': str(self.bench.uuid)},
+        ])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['received'], 5)
+        self.assertEqual({str(u) for u in response.data['applied']}, {str(moved.uuid), str(borrowed.uuid)})
+        self.assertEqual(response.data['unchanged'], [in_place.uuid])
+        self.assertEqual([str(u) for u in response.data['not_found']], [missing])
+
+        moved.refresh_from_db()
+        self.assertEqual((moved.location, moved.zone, moved.version), (self.bench, 'B', 2))
+        # 與手動編輯相同：只有可用設備的位置變更會記錄 MOVE_CONFIRM
+        logs = Transaction.objects.filter(action=Transaction.Action.MOVE_CONFIRM)
+        self.assertEqual([(t.equipment_id, t.location_id) for t in logs], [(moved.uuid, self.bench.uuid)])
+        self.assertEqual(Equipment.objects.get(pk=borrowed.pk).location, self.bench)
+        self.assertEqual(counters.reconcile(fix=False), {})
+
+    def test_stale_scans_and_unknown_locations_are_skipped(self):
+        """測試掃描時間早於最後更新或位置不存在時不套用"""
+        item = Equipment.objects.create(name='Edited Later', location=self.shelf)
+        other = Equipment.objects.create(name='Bad Location', location=self.shelf)
+        response = self._post([
+            {'uuid': str(item.uuid), 'scanned_at': (timezone.now() - timedelta(hours=1)).isoformat(), 'location': str(self.bench.uuid)},
+            {'uuid': str(other.uuid), 'scanned_at': self.later, 'location': '11111111-1111-1111-1111-111111111111'},
+        ])
+        self.assertEqual(response.data['stale'], [item.uuid])
+        self.assertEqual(response.data['invalid_location'], [other.uuid])
+        self.assertEqual(Equipment.objects.filter(location=self.bench).count(), 0)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        """測試批次大小不影響查詢次數"""
+        def run(n):
+            items = [Equipment.objects.create(name=f'Scan {n}-{i}', location=self.shelf) for i in range(n)]
+            scans = [{'uuid': str(item.uuid), 'scanned_at': self.later, 'location': str(self.bench.uuid)} for item in items]
+            with CaptureQueriesContext(connection) as ctx:
+                response = self._post(scans)
+            self.assertEqual(len(response.data['applied']), n)
+            return len(ctx)
+
+        run(1)  # 第一次會建立新的統計列
+        self.assertEqual(run(2), run(40))
+
+
+class ScanResolutionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='scan_user', email='scan_user@example.com', password='password')
+        self.other = User.objects.create_user(username='scan_other', email='scan_other@example.com', password='password')
+        self.manager = User.objects.create_user(username='scan_manager', email='scan_manager@example.com', password='password', role=User.Role.MANAGER)
+        self.client = APIClient()
+        self.location = Location.objects.create(name='Lab', parent=Location.objects.create(name='Building'))
+        self.equipment = Equipment.objects.create(name='Scanned Scope', location=self.location)
+
+    def _scan(self, user):
+        self.client.force_authenticate(user=user)
+        response = self.client.get(f'/api/v1/equipment/{self.equipment.uuid}/scan/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_payload_and_actions_follow_state(self):
+        """測試掃描結果包含持有人、待審核交易與可執行動作"""
+        data = self._scan(self.user)
+        self.assertEqual(data['equipment']['location_details']['full_path'], 'Building > Lab')
+        self.assertIsNone(data['holder'])
+        self.assertIn('BORROW', data['actions'])
+
+        txn = TransactionService.create_borrow_request(self.user, self.equipment.uuid)
+        data = self._scan(self.manager)
+        self.assertEqual(data['pending']['id'], txn.id)
+        self.assertIn('APPROVE', data['actions'])
+        self.assertNotIn('BORROW', data['actions'])
+
+        TransactionService.approve_transaction(self.manager, txn.id)
+        data = self._scan(self.user)
+        self.assertEqual(data['holder']['user']['username'], 'scan_user')
+        self.assertIsNone(data['pending'])
+        self.assertIn('RETURN', data['actions'])
+        self.assertNotIn('RETURN', self._scan(self.other)['actions'])
+        self.assertIn('RETURN', self._scan(self.manager)['actions'])
+
+    def test_query_budget_and_cache(self):
+        """測試掃描查詢次數：未命中快取最多三次，命中只需一次"""
+        self.client.force_authenticate(user=self.user)
+        url = f'/api/v1/equipment/{self.equipment.uuid}/scan/'
+        with CaptureQueriesContext(connection) as miss:
+            self.client.get(url)
+        with CaptureQueriesContext(connection) as hit:
+            self.client.get(url)
+        self.assertLessEqual(len(miss), 3)
+        self.assertEqual(len(hit), 1)
+        self.assertEqual(self.client.get('/api/v1/equipment/not-a-uuid/scan/').status_code, status.HTTP_404_NOT_FOUND)
+
+
+class QRRenderingTests(TestCase):
+    DATA = 'http://localhost:5173/scan/8f14e45f-ceea-467f-a0e6-1e2b3c4d5e6f'
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='qr_user', email='qr_user@example.com', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.equipment = Equipment.objects.create(name='QR Item')
+
+    def _reference_pixels(self):
+        # qrcode 原本的 PIL 繪製方式
+        code = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4)
+        code.add_data(self.DATA)
+        code.make(fit=True)
+        return code.make_image().get_image().convert('1').tobytes()
+
+    def test_pillow_bitmap_matches_qrcode_image(self):
+        """測試 Pillow 點陣輸出與 qrcode 原生圖片逐像素相同"""
+        matrix = qr.module_matrix(self.DATA)
+        self.assertEqual(qr._bitmap_pillow(matrix, 10).tobytes(), self._reference_pixels())
+
+    def test_svg_merges_runs(self):
+        """測試 SVG 以連續深色模組合併為單一路徑段"""
+        matrix = [[False, True, True, False], [True, True, True, True], [False] * 4, [True, False, True, False]]
+        svg = qr.render_svg(matrix, size=40)
+        self.assertIn('d="M1 0h2v1h-2zM0 1h4v1h-4zM0 3h1v1h-1zM2 3h1v1h-1z"', svg)
+        self.assertIn('width="40"', svg)
+
+    def test_endpoint_formats_and_options(self):
+        """測試 QR 端點的格式、尺寸與邊框參數"""
+        url = f'/api/v1/equipment/{self.equipment.uuid}/qr/'
+        svg = self.client.get(url, {'format': 'svg', 'size': 300})
+        self.assertEqual(svg.status_code, status.HTTP_200_OK)
+        self.assertEqual(svg['Content-Type'], 'image/svg+xml')
+
+        png = self.client.get(url, {'format': 'png', 'size': 200, 'border': 0})
+        self.assertEqual(png.status_code, status.HTTP_200_OK)
+        image = Image.open(BytesIO(png.content))
+        self.assertEqual(image.mode, '1')
+        self.assertLessEqual(image.width, 200)
+        self.assertGreater(image.width, 100)
+
+        self.assertEqual(self.client.get(url, {'format': 'gif'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {'border': 99}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_short_code_payload(self):
+        """測試短碼可還原 UUID，舊 UUID 仍可解析，且 QR 版本降低"""
+        code = codes.short_code(self.equipment.uuid)
+        self.assertRegex(code, r'^[A-Z2-7]{26}$')
+        self.assertEqual(codes.parse_code(code), self.equipment.uuid)
+        self.assertEqual(codes.parse_code(code.lower()), self.equipment.uuid)
+        self.assertEqual(codes.parse_code(str(self.equipment.uuid)), self.equipment.uuid)
+        self.assertIsNone(codes.parse_code('NOT-A-CODE'))
+
+        short = len(qr.module_matrix(codes.scan_url(self.equipment.uuid), border=0))
+        legacy = len(qr.module_matrix(codes.legacy_scan_url(self.equipment.uuid), border=0))
+        self.assertLess(short, legacy)
+
+        png = self.client.get(f'/api/v1/equipment/{self.equipment.uuid}/qr/')
+        self.assertEqual(Image.open(BytesIO(png.content)).width, (short + 8) * 10)
+
+        response = self.client.get(f'/api/v1/equipment/{code}/scan/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['equipment']['uuid'], str(self.equipment.uuid))
+
+
+@override_settings(ROOT_URLCONF='config.urls_async')
+class AsyncReadViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='async_user', email='async_user@example.com', password='password')
+        self.headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        self.location = Location.objects.create(name='Rack', parent=Location.objects.create(name='Server Room'))
+        self.equipment = Equipment.objects.create(name='Async Switch', location=self.location, category=Category.objects.create(name='Network'))
+        self.url = f'/api/v1/equipment/{self.equipment.uuid}/'
+
+    def _get(self, path, **kwargs):
+        return async_to_sync(self.async_client.get)(path, headers=self.headers, **kwargs)
+
+    def test_detail_matches_wsgi_view(self):
+        """測試 ASGI 設備詳情與 DRF 版本輸出相同"""
+        response = self._get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], '"1"')
+        with override_settings(ROOT_URLCONF='config.urls'):
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=self.headers['Authorization'])
+            expected = client.get(self.url)
+        self.assertEqual(response.json(), expected.json())
+
+    def test_scan_and_qr(self):
+        """測試 ASGI 掃描查詢 (含短碼) 與 QR 圖片"""
+        response = self._get(f'/api/v1/equipment/{codes.short_code(self.equipment.uuid)}/scan/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['equipment']['location_details']['full_path'], 'Server Room > Rack')
+
+        png = self._get(f'{self.url}qr/')
+        self.assertEqual(png['Content-Type'], 'image/png')
+        svg = self._get(f'{self.url}qr/', data={'format': 'svg'})
+        self.assertEqual(svg['Content-Type'], 'image/svg+xml')
+        self.assertEqual(self._get(f'{self.url}qr/', data={'format': 'gif'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._get('/api/v1/equipment/00000000-0000-0000-0000-000000000000/').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_requires_authentication(self):
+        """測試未帶 token 或 token 無效時回傳 401"""
+        response = async_to_sync(self.async_client.get)(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn('Bearer', response['WWW-Authenticate'])
+        response = async_to_sync(self.async_client.get)(self.url, headers={'Authorization': 'Bearer invalid'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_writes_fall_back_to_viewset(self):
+        """測試非 GET 請求交由原本的 ViewSet 處理"""
+        response = async_to_sync(self.async_client.patch)(self.url, {'name': 'Renamed'}, content_type='application/json', headers=self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.equipment.refresh_from_db()
+        self.assertEqual((self.equipment.name, self.equipment.version), ('Renamed', 2))
+
+
+@override_settings(USE_S3=False)
+class DirectUploadTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_override = override_settings(MEDIA_ROOT=media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        self.user = User.objects.create_user(username='uploader', email='uploader@example.com', password='password')
+        self.admin = User.objects.create_user(username='upload_admin', email='upload_admin@example.com', password='password', role=User.Role.ADMIN)
+        self.equipment = Equipment.objects.create(name='Camera')
+        self.client = APIClient()
+        image_file = BytesIO()
+        Image.new('RGBA', (50, 50), (0, 255, 0)).save(image_file, 'PNG')
+        self.png = image_file.getvalue()
+
+    def _upload(self, user, target, content_type='image/png', filename='photo.png'):
+        self.client.force_authenticate(user=user)
+        response = self.client.post('/api/v1/uploads/', {'target': target, 'filename': filename, 'content_type': content_type, 'size': len(self.png)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        ticket = response.data
+        response = self.client.generic('PUT', ticket['url'], self.png, content_type=content_type)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return ticket
+
+    def test_equipment_image_is_attached_then_compressed(self):
+        """測試直接上傳的設備圖片於 finalize 時掛上，並於提交後排入壓縮"""
+        ticket = self._upload(self.user, 'equipment_image')
+        self.assertTrue(ticket['key'].startswith('equipment_images/photo_'))
+
+        url = f'/api/v1/equipment/{self.equipment.uuid}/image/'
+        with self.captureOnCommitCallbacks(execute=True) as callbacks, mock.patch.object(uploads, '_executor') as executor:
+            response = self.client.post(url, {'upload_token': ticket['upload_token']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], '"2"')
+        self.equipment.refresh_from_db()
+        self.assertEqual(self.equipment.image.name, ticket['key'])
+        self.assertEqual(len(callbacks), 1)
+
+        # Run the queued job inline
+        _, *args = executor.submit.call_args.args
+        uploads.process_upload(*args)
+        self.equipment.refresh_from_db()
+        self.assertTrue(self.equipment.image.name.endswith('.jpg'))
+        self.assertEqual(self.equipment.version, 3)
+        self.assertFalse(self.equipment.image.storage.exists(ticket['key']))
+
+    def test_upload_token_is_bound_to_user_and_target(self):
+        """測試上傳 token 只能由申請者用於指定的欄位"""
+        ticket = self._upload(self.user, 'equipment_image')
+        token = {'upload_token': ticket['upload_token']}
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post(f'/api/v1/equipment/{self.equipment.uuid}/image/', token, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        ticket = self._upload(self.user, 'attachment', content_type='application/pdf', filename='manual.pdf')
+        response = self.client.post(f'/api/v1/equipment/{self.equipment.uuid}/attachments/', {'upload_token': ticket['upload_token']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        ticket = self._upload(self.admin, 'attachment', content_type='application/pdf', filename='manual.pdf')
+        response = self.client.post(f'/api/v1/equipment/{self.equipment.uuid}/attachments/', {'upload_token': ticket['upload_token']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Attachment.objects.get().file.name, ticket['key'])
+
+    def test_local_upload_checks_token_type_and_reuse(self):
+        """測試本機上傳端點驗證 token、Content-Type 且不覆寫既有檔案"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/v1/uploads/', {'target': 'equipment_image', 'filename': 'notes.txt', 'content_type': 'text/plain', 'size': 10}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        ticket = self._upload(self.user, 'equipment_image')
+        self.assertEqual(self.client.generic('PUT', ticket['url'], self.png, content_type='image/png').status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.client.generic('PUT', ticket['url'], self.png, content_type='image/gif').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.generic('PUT', '/api/v1/uploads/local/?token=bad', self.png, content_type='image/png').status_code, status.HTTP_403_FORBIDDEN)
+
+
+    def test_key_extension_follows_content_type(self):
+        """測試物件 key 的副檔名取自驗證過的 Content-Type，而非用戶端檔名；圖片欄位只接受點陣圖"""
+        ticket = self._upload(self.admin, 'attachment', content_type='application/pdf', filename='page.html')
+        self.assertRegex(ticket['key'], r'^attachments/page_\w{12}\.pdf$')
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/v1/uploads/', {'target': 'equipment_image', 'filename': 'logo.svg', 'content_type': 'image/svg+xml', 'size': 10}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post('/api/v1/uploads/', {'target': 'equipment_image', 'filename': 'photo.html', 'content_type': 'Image/PNG; charset=binary', 'size': 10}, format='json')
+        self.assertRegex(response.data['key'], r'^equipment_images/photo_\w{12}\.png$')
+        self.assertEqual(response.data['headers'], {'Content-Type': 'image/png'})
+
+class GenerateTestDataTests(TestCase):
+    EXPECTED_STATUS = {
+        ('BORROW', 'COMPLETED'): 'BORROWED',
+        ('BORROW', 'REJECTED'): 'AVAILABLE',
+        ('BORROW', 'PENDING_APPROVAL'): 'PENDING_BORROW',
+        ('DISPATCH', 'COMPLETED'): 'DISPATCHED',
+        ('DISPATCH', 'REJECTED'): 'AVAILABLE',
+        ('DISPATCH', 'PENDING_APPROVAL'): 'PENDING_BORROW',
+        ('RETURN', 'COMPLETED'): 'AVAILABLE',
+        ('RETURN', 'REJECTED'): 'BORROWED',
+        ('RETURN', 'PENDING_APPROVAL'): 'PENDING_RETURN',
+        ('MOVE_START', 'COMPLETED'): 'IN_TRANSIT',
+        ('MOVE_CONFIRM', 'COMPLETED'): 'AVAILABLE',
+    }
+
+    def _generate(self, *args):
+        call_command('generate_test_data', '--equipment', '40', '--users', '6', '--managers', '2', '--end', '2026-01-01', *args, stdout=StringIO())
+        return list(Equipment.objects.order_by('name').values_list('uuid', 'name', 'status', 'version'))
+
+    def test_histories_match_equipment_status(self):
+        """測試產生的交易歷程最後狀態與設備狀態一致，庫存統計無誤差"""
+        self._generate('--seed', '7')
+        self.assertEqual(Equipment.objects.count(), 40)
+        self.assertGreater(Transaction.objects.count(), 100)
+        for item in Equipment.objects.all():
+            last = item.transactions.order_by('-created_at').first()
+            expected = self.EXPECTED_STATUS[(last.action, last.status)] if last else 'AVAILABLE'
+            self.assertEqual(item.status, expected)
+        self.assertEqual(counters.reconcile(fix=False), {})
+        self.assertEqual(SyncChange.objects.filter(model='equipment').count(), 40)
+
+    def test_same_seed_same_data(self):
+        """測試相同 seed 產生相同資料，--clear 只移除產生的資料"""
+        keep = Equipment.objects.create(name='Real item')
+        first = self._generate('--seed', '3')
+        second = self._generate('--seed', '3', '--clear')
+        self.assertEqual([row for row in first if row[0] != keep.uuid], [row for row in second if row[0] != keep.uuid])
+        self.assertTrue(Equipment.objects.filter(pk=keep.pk).exists())
+
+    def test_rerun_without_clear_is_refused(self):
+        """測試已有產生的資料時未加 --clear 會明確報錯而不寫入"""
+        first = self._generate('--seed', '3')
+        with self.assertRaisesMessage(CommandError, '--clear'):
+            self._generate('--seed', '4')
+        self.assertEqual(list(Equipment.objects.order_by('name').values_list('uuid', 'name', 'status', 'version')), first)
+
+
+class EndpointBenchmarkTests(TestCase):
+    def test_run_writes_results_and_passes_own_baseline(self):
+        """測試效能基準測試輸出各端點的百分位數與查詢數，並可與基準比較"""
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = Path(directory) / 'baseline.json'
+            options = ['--in-place', '--equipment', '150', '--transactions-per-item', '2', '--iterations', '2', '--warmup', '0', '--baseline', str(baseline)]
+            call_command('benchmark_endpoints', *options, '--update-baseline', stdout=StringIO())
+            results = json.loads(baseline.read_text())
+            self.assertEqual(results['meta']['dataset']['equipment'], 150)
+            for name in ('equipment_list_location_subtree', 'equipment_history', 'equipment_qr', 'borrow', 'approve_return', 'bulk_approve'):
+                endpoint = results['endpoints'][name]
+                self.assertEqual(endpoint['errors'], 0, name)
+                self.assertEqual(endpoint['samples'], 2)
+                self.assertGreater(endpoint['queries'], 0)
+                self.assertLessEqual(endpoint['p50_ms'], endpoint['p95_ms'])
+
+            out = StringIO()
+            call_command('benchmark_endpoints', *options, '--tolerance', '1000', stdout=out)
+            self.assertIn('No regressions', out.getvalue())
+
+            # 不同資料庫錄製的基準不可比較
+            results['meta']['database'] = 'otherdb'
+            baseline.write_text(json.dumps(results))
+            with self.assertRaisesMessage(CommandError, 'recorded on otherdb'):
+                call_command('benchmark_endpoints', *options, '--scenario', 'equipment_qr', stdout=StringIO())
+
+    def test_compare_flags_queries_and_latency(self):
+        """測試查詢數增加或延遲超過容許範圍時判定為退化"""
+        def result(queries, p50, p95, errors=0):
+            return {'endpoints': {'equipment_list': {'queries': queries, 'p50_ms': p50, 'p95_ms': p95, 'errors': errors}}}
+
+        baseline = result(5, 10.0, 20.0)
+        self.assertEqual(compare(baseline, result(5, 14.0, 29.0), 0.5, 2), [])
+        self.assertEqual(len(compare(baseline, result(6, 10.0, 20.0), 0.5, 2)), 1)
+        self.assertEqual(len(compare(baseline, result(5, 16.0, 31.0), 0.5, 2)), 2)
+        # Below the absolute floor, whatever the ratio
+        self.assertEqual(compare(result(1, 0.5, 1.0), result(1, 2.0, 2.5), 0.5, 2), [])
+        self.assertEqual(len(compare(baseline, result(5, 10.0, 20.0, errors=1), 0.5, 2)), 1)
@@ -1,12 +1,14 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import CategoryViewSet, EquipmentViewSet
+from .views import CategoryViewSet, EquipmentViewSet, InventoryStatsView, SyncView
 
 router = DefaultRouter()
 router.register(r'equipment', EquipmentViewSet)
 router.register(r'categories', CategoryViewSet)
 
 urlpatterns = [
+    path('stats/', InventoryStatsView.as_view(), name='inventory-stats'),
+    path('sync/', SyncView.as_view(), name='sync'),
     path('', include(router.urls)),
 ]
@@ -1,19 +1,35 @@
-from io import BytesIO
+from collections import defaultdict
 
-import qrcode
-from decouple import config
+from django.db import transaction
 from django.http import HttpResponse
-from rest_framework import filters, permissions, viewsets
+from rest_framework import filters, permissions, views, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
 
+from apps.common import qr, uploads
+from apps.common.exceptions import PreconditionFailed
+from apps.common.pagination import HistoryCursorPagination
 from apps.locations.models import Location
-from apps.transactions.serializers import TransactionSerializer
+from apps.locations.serializers import LocationSyncSerializer
+from apps.locations.services import get_descendant_ids, get_location_context
+from apps.transactions.models import TransactionLog
+from apps.transactions.serializers import TransactionHistorySerializer
 from apps.users.models import User
+from apps.users.permissions import IsManagerOrAdmin
 
-from .models import Category, Equipment
-from .serializers import CategorySerializer, EquipmentSerializer
-from .services import update_equipment_with_transaction
+from . import codes, counters, sync
+from .models import Attachment, Category, Equipment, InventoryCounter
+from .scan import resolve_scan
+from .serializers import (
+    AttachmentSerializer,
+    CategorySerializer,
+    EquipmentSerializer,
+    EquipmentSummarySerializer,
+    EquipmentSyncSerializer,
+    ScanBatchSerializer,
+)
+from .services import apply_scan_events, update_equipment_with_transaction
 
 
 class IsManagerOrReadOnly(permissions.BasePermission):
@@ -26,6 +42,59 @@ class IsManagerOrReadOnly(permissions.BasePermission):
         )
 
 
+def equipment_etag(version):
+    return f'"{version}"'
+
+
+def parse_if_match(header):
+    """
+    Returns the set of versions listed in an If-Match header, or None for a
+    missing header or `*` (no precondition).
+    """
+    if not header or header.strip() == '*':
+        return None
+    versions = set()
+    for tag in header.split(','):
+        tag = tag.strip().removeprefix('W/').strip('"')
+        if tag.isdigit():
+            versions.add(int(tag))
+    return versions
+
+
+def qr_options(params):
+    """
+    (format, size, border) from the QR endpoint's query parameters.
+    """
+    output = params.get('format', 'png')
+    try:
+        border = int(params.get('border', qr.DEFAULT_BORDER))
+        size = params.get('size')
+        size = int(size) if size else None
+    except ValueError:
+        raise ValidationError('size and border must be integers') from None
+    if output not in ('png', 'svg'):
+        raise ValidationError('format must be png or svg')
+    if not 0 <= border <= qr.MAX_BORDER:
+        raise ValidationError(f'border must be between 0 and {qr.MAX_BORDER}')
+    if size is not None and not 1 <= size <= qr.MAX_SIZE:
+        raise ValidationError(f'size must be between 1 and {qr.MAX_SIZE}')
+    return output, size, border
+
+
+def qr_response(equipment_uuid, output, size, border):
+    # Data to encode: short-code URL to the frontend scan page
+    matrix = qr.module_matrix(codes.scan_url(equipment_uuid), border=border)
+
+    if output == 'svg':
+        return HttpResponse(qr.render_svg(matrix, size), content_type='image/svg+xml')
+    scale = qr.scale_for_size(matrix, size) if size else qr.DEFAULT_BOX_SIZE
+    return HttpResponse(qr.render_png(matrix, scale), content_type='image/png')
+
+
+SYNC_PAGE_SIZE = 1000
+SYNC_MAX_PAGE_SIZE = 5000
+
+
 class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.all().order_by('id')
     serializer_class = CategorySerializer
@@ -43,19 +112,45 @@ class EquipmentViewSet(viewsets.ModelViewSet):
     ordering_fields = ['name', 'status', 'created_at']
     ordering = ['-created_at']
     lookup_field = 'uuid'
+    # Queries per request (apps.common.queries), independent of page size
+    query_budgets = {'list': 8, 'retrieve': 8, 'history': 6, 'qr': 3}
 
     def get_permissions(self):
-        if self.action in ['create', 'destroy', 'bulk_delete']:
+        if self.action in ['create', 'destroy', 'bulk_delete', 'attachments']:
             permission_classes = [IsManagerOrReadOnly]
         else:
             # Allow all authenticated users to view and update (move) equipment
             permission_classes = [permissions.IsAuthenticated]
         return [permission() for permission in permission_classes]
 
+    def perform_content_negotiation(self, request, force=False):
+        # On `qr`, ?format= picks the image type rather than a DRF renderer
+        return super().perform_content_negotiation(
+            request, force=force or self.action == 'qr'
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        response['ETag'] = equipment_etag(response.data['version'])
+        return response
+
+    def update(self, request, *args, **kwargs):
+        response = super().update(request, *args, **kwargs)
+        response['ETag'] = equipment_etag(response.data['version'])
+        return response
+
     def perform_update(self, serializer):
+        instance = serializer.instance
+        versions = parse_if_match(self.request.headers.get('If-Match'))
+        if versions is not None and instance.version not in versions:
+            raise PreconditionFailed()
+
         image = self.request.FILES.get('transaction_image')
         update_equipment_with_transaction(
-            serializer=serializer, user=self.request.user, image=image
+            serializer=serializer,
+            user=self.request.user,
+            image=image,
+            expected_version=instance.version,
         )
 
     def get_queryset(self):
@@ -81,50 +176,105 @@ class EquipmentViewSet(viewsets.ModelViewSet):
         if location:
             try:
                 target_loc = Location.objects.get(uuid=location)
-                descendants = [target_loc.uuid]
-                queue = [target_loc]
-                while queue:
-                    current = queue.pop(0)
-                    children = current.children.all()
-                    for child in children:
-                        descendants.append(child.uuid)
-                        queue.append(child)
+                descendants = get_descendant_ids(target_loc.uuid)
                 queryset = queryset.filter(location__uuid__in=descendants)
             except Location.DoesNotExist:
                 queryset = queryset.none()
         if target_location:
             queryset = queryset.filter(target_location__uuid=target_location)
 
+        if self.action in ('list', 'retrieve'):
+            queryset = EquipmentSerializer.setup_eager_loading(queryset)
         return queryset
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ('list', 'retrieve'):
+            # Location paths and children without walking the tree per row
+            context.update(get_location_context())
+        return context
+
     @action(detail=True, methods=['get'])
     def history(self, request, uuid=None):  # noqa: ARG002
         equipment = self.get_object()
-        transactions = equipment.transactions.all().order_by('-created_at')
-        serializer = TransactionSerializer(transactions, many=True)
-        return Response(serializer.data)
+        # Includes archived transactions (hot and archive tables via a view)
+        transactions = TransactionLog.objects.filter(
+            equipment=equipment
+        ).select_related('user', 'admin_verifier', 'location')
+        paginator = HistoryCursorPagination()
+        page = paginator.paginate_queryset(transactions, request, view=self)
+        context = {**self.get_serializer_context(), **get_location_context()}
+        return Response(
+            {
+                'equipment': EquipmentSummarySerializer(
+                    equipment, context=context
+                ).data,
+                'next': paginator.get_next_link(),
+                'previous': paginator.get_previous_link(),
+                'results': TransactionHistorySerializer(
+                    page, many=True, context=context
+                ).data,
+            }
+        )
+
+    @action(detail=True, methods=['get'])
+    def scan(self, request, uuid=None):
+        """
+        QR landing page data: equipment summary, current holder, pending
+        transaction and the actions the current user may take. Accepts the
+        short label code in place of the UUID.
+        """
+        payload = resolve_scan(uuid, request.user)
+        if payload is None:
+            raise NotFound()
+        return Response(payload)
 
     @action(detail=True, methods=['get'])
     def qr(self, request, uuid=None):  # noqa: ARG002
+        """
+        QR code for the scan page URL. `?format=png|svg` (default png),
+        `?size=` in pixels, `?border=` quiet zone in modules (default 4).
+        """
         equipment = self.get_object()
-        # Data to encode: URL to frontend scan page
-        frontend_url = config('FRONTEND_URL', default='http://localhost:5173')
-        data = f'{frontend_url}/scan/{equipment.uuid}'
-
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(data)
-        qr.make(fit=True)
+        return qr_response(equipment.uuid, *qr_options(request.query_params))
 
-        img = qr.make_image(fill_color='black', back_color='white')
-        buffer = BytesIO()
-        img.save(buffer, format='PNG')
+    @action(detail=True, methods=['post'])
+    def image(self, request, uuid=None):  # noqa: ARG002
+        """
+        Finalizes a direct upload (POST /uploads/, target `equipment_image`)
+        as the equipment image. Honors If-Match like a regular update.
+        """
+        equipment = self.get_object()
+        versions = parse_if_match(request.headers.get('If-Match'))
+        if versions is not None and equipment.version not in versions:
+            raise PreconditionFailed()
 
-        return HttpResponse(buffer.getvalue(), content_type='image/png')
+        equipment.image = uploads.claim_upload(
+            request.data.get('upload_token'), 'equipment_image', request.user
+        )
+        with transaction.atomic():
+            if not equipment.save_if_version(equipment.version):
+                raise PreconditionFailed()
+            uploads.enqueue_processing(equipment, 'image')
+        response = Response(self.get_serializer(equipment).data)
+        response['ETag'] = equipment_etag(equipment.version)
+        return response
+
+    @action(detail=True, methods=['post'])
+    def attachments(self, request, uuid=None):  # noqa: ARG002
+        """
+        Finalizes a direct upload (target `attachment`) as a new attachment.
+        """
+        equipment = self.get_object()
+        key = uploads.claim_upload(
+            request.data.get('upload_token'), 'attachment', request.user
+        )
+        with transaction.atomic():
+            attachment = Attachment.objects.create(equipment=equipment, file=key)
+            # Attachments are part of the equipment payload, so bump its
+            # version; if a concurrent write wins, that write already did
+            equipment.save_if_version(equipment.version)
+        return Response(AttachmentSerializer(attachment).data, status=201)
 
     @action(detail=False, methods=['post'], url_path='bulk-delete')
     def bulk_delete(self, request):
@@ -132,7 +282,118 @@ class EquipmentViewSet(viewsets.ModelViewSet):
         if not uuids:
             return Response({'detail': 'No UUIDs provided'}, status=400)
 
-        deleted_count, _ = Equipment.objects.filter(uuid__in=uuids).delete()
+        with transaction.atomic(), counters.batch(), sync.batch():
+            deleted_count, _ = Equipment.objects.filter(uuid__in=uuids).delete()
         return Response(
             {'detail': f'Successfully deleted {deleted_count} items'}, status=200
         )
+
+    @action(detail=False, methods=['post'], serializer_class=ScanBatchSerializer)
+    def scans(self, request):
+        """
+        Replays a batch of offline scans and applies the observed locations.
+        """
+        serializer = ScanBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        report = apply_scan_events(serializer.validated_data['scans'], request.user)
+        return Response(report)
+
+
+class InventoryStatsView(views.APIView):
+    """
+    Inventory totals per status, category and location, read from the
+    incrementally maintained InventoryCounter table in a single query.
+    """
+
+    permission_classes = [IsManagerOrAdmin]
+
+    def get(self, request):  # noqa: ARG002
+        by_status = defaultdict(int)
+        by_category = {}
+        by_location = {}
+        total = 0
+
+        rows = InventoryCounter.objects.filter(count__gt=0).select_related(
+            'category', 'location'
+        )
+        for row in rows:
+            total += row.count
+            by_status[row.status] += row.count
+            category = by_category.setdefault(
+                row.category_id,
+                {
+                    'category': row.category_id,
+                    'name': row.category.name if row.category else None,
+                    'total': 0,
+                    'by_status': defaultdict(int),
+                },
+            )
+            location = by_location.setdefault(
+                row.location_id,
+                {
+                    'location': row.location_id,
+                    'name': row.location.name if row.location else None,
+                    'total': 0,
+                    'by_status': defaultdict(int),
+                },
+            )
+            for bucket in (category, location):
+                bucket['total'] += row.count
+                bucket['by_status'][row.status] += row.count
+
+        return Response(
+            {
+                'total': total,
+                'by_status': by_status,
+                'by_category': list(by_category.values()),
+                'by_location': list(by_location.values()),
+            }
+        )
+
+
+class SyncView(views.APIView):
+    """
+    Delta sync for offline clients. `?since=<watermark>` returns equipment,
+    locations and categories changed after that watermark (0 = everything),
+    `deleted` tombstones, and the next watermark to send. Follow up while
+    `has_more` is true.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            since = max(int(request.query_params.get('since', 0)), 0)
+            limit = int(request.query_params.get('limit', SYNC_PAGE_SIZE))
+        except ValueError:
+            return Response({'detail': 'since and limit must be integers'}, status=400)
+        limit = min(max(limit, 1), SYNC_MAX_PAGE_SIZE)
+
+        changes, watermark, has_more = sync.changes_since(since, limit)
+        changed = defaultdict(list)
+        deleted = defaultdict(list)
+        for (model, object_id), is_deleted in changes.items():
+            (deleted if is_deleted else changed)[model].append(object_id)
+
+        # Objects deleted after their log row was read simply drop out here;
+        # their tombstone arrives with the next watermark
+        equipment = Equipment.objects.filter(pk__in=changed[sync.EQUIPMENT])
+        locations = Location.objects.filter(pk__in=changed[sync.LOCATION])
+        categories = Category.objects.filter(pk__in=changed[sync.CATEGORY])
+        context = {'request': request}
+        return Response(
+            {
+                'watermark': watermark,
+                'has_more': has_more,
+                'equipment': EquipmentSyncSerializer(
+                    equipment, many=True, context=context
+                ).data,
+                'locations': LocationSyncSerializer(locations, many=True).data,
+                'categories': CategorySerializer(categories, many=True).data,
+                'deleted': {
+                    'equipment': deleted[sync.EQUIPMENT],
+                    'locations': deleted[sync.LOCATION],
+                    'categories': [int(pk) for pk in deleted[sync.CATEGORY]],
+                },
+            }
+        )
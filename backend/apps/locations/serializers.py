@@ -22,8 +22,47 @@ class LocationSerializer(serializers.ModelSerializer):
         read_only_fields = ['uuid', 'created_at', 'updated_at']
 
     def get_full_path(self, obj):
+        paths = self.context.get('location_paths')
+        if paths is not None and obj.uuid in paths:
+            return paths[obj.uuid]
         return str(obj)
 
     def get_children(self, obj):
-        children = obj.children.all()
-        return LocationSerializer(children, many=True).data
+        # services.get_location_context() preloads the tree for list views
+        children_map = self.context.get('location_children')
+        if children_map is not None:
+            children = children_map.get(obj.uuid, [])
+        else:
+            children = obj.children.all()
+        return LocationSerializer(children, many=True, context=self.context).data
+
+
+class LocationSummarySerializer(serializers.ModelSerializer):
+    """
+    Location without the recursive `children` tree. Pass
+    services.get_location_context() in the context to avoid per-row parent
+    lookups.
+    """
+
+    full_path = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Location
+        fields = ['uuid', 'name', 'full_path']
+
+    def get_full_path(self, obj):
+        paths = self.context.get('location_paths')
+        if paths is not None and obj.uuid in paths:
+            return paths[obj.uuid]
+        return str(obj)
+
+
+class LocationSyncSerializer(serializers.ModelSerializer):
+    """
+    Location row for the delta-sync API; clients rebuild the tree from `parent`.
+    """
+
+    class Meta:
+        model = Location
+        fields = ['uuid', 'name', 'description', 'parent', 'updated_at']
+        read_only_fields = fields
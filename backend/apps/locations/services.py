@@ -0,0 +1,61 @@
+from collections import defaultdict
+
+from .models import Location
+
+
+def _location_context(locations):
+    by_pk = {location.uuid: location for location in locations}
+    children = defaultdict(list)
+    for location in locations:
+        if location.parent_id:
+            children[location.parent_id].append(location)
+
+    paths = {}
+
+    def resolve(location):
+        if location.uuid not in paths:
+            parent = by_pk.get(location.parent_id)
+            paths[location.uuid] = (
+                f'{resolve(parent)} > {location.name}' if parent else location.name
+            )
+        return paths[location.uuid]
+
+    for location in locations:
+        resolve(location)
+
+    return {'location_paths': paths, 'location_children': children}
+
+
+def get_location_context():
+    """
+    Loads the location table once and returns serializer context that lets
+    LocationSerializer and LocationSummarySerializer resolve `full_path` and
+    `children` without walking `parent` / `children` one query at a time.
+    """
+    return _location_context(list(Location.objects.all()))
+
+
+async def aget_location_context():
+    """
+    get_location_context() for async views.
+    """
+    return _location_context([location async for location in Location.objects.all()])
+
+
+def get_descendant_ids(root_id):
+    """
+    UUIDs of `root_id` and every location below it, from one query over the
+    (small) location table.
+    """
+    children = defaultdict(list)
+    for pk, parent_id in Location.objects.values_list('uuid', 'parent_id'):
+        children[parent_id].append(pk)
+
+    ids = [root_id]
+    seen = {root_id}
+    for pk in ids:
+        for child in children.get(pk, []):
+            if child not in seen:
+                seen.add(child)
+                ids.append(child)
+    return ids
@@ -2,6 +2,7 @@ from rest_framework import filters, permissions, viewsets
 
 from .models import Location
 from .serializers import LocationSerializer
+from .services import get_location_context
 
 
 class LocationViewSet(viewsets.ModelViewSet):
@@ -11,6 +12,8 @@ class LocationViewSet(viewsets.ModelViewSet):
     filter_backends = [filters.SearchFilter]
     search_fields = ['name', 'description']
     pagination_class = None
+    # Queries per request (apps.common.queries), independent of the tree size
+    query_budgets = {'list': 4, 'retrieve': 4}
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -21,3 +24,10 @@ class LocationViewSet(viewsets.ModelViewSet):
         elif parent_uuid:
             queryset = queryset.filter(parent__uuid=parent_uuid)
         return queryset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ('list', 'retrieve'):
+            # Nested `children` and `full_path` from one read of the tree
+            context.update(get_location_context())
+        return context
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Transaction
+from .models import ArchivedTransaction, BorrowReminder, Transaction
 
 
 @admin.register(Transaction)
@@ -17,3 +17,18 @@ class TransactionAdmin(admin.ModelAdmin):
     list_filter = ('status', 'action')
     search_fields = ('equipment__name', 'user__username')
     readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(ArchivedTransaction)
+class ArchivedTransactionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'action', 'status', 'equipment', 'user', 'created_at')
+    list_filter = ('status', 'action')
+    search_fields = ('equipment__name', 'user__username')
+    readonly_fields = ('archived_at',)
+
+
+@admin.register(BorrowReminder)
+class BorrowReminderAdmin(admin.ModelAdmin):
+    list_display = ('transaction', 'kind', 'due_date', 'sent_at')
+    list_filter = ('kind',)
+    raw_id_fields = ('transaction',)
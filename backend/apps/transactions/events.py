@@ -0,0 +1,129 @@
+"""
+Change events for the Server-Sent Events stream.
+
+publish() queues a StreamEvent insert for when the surrounding database
+transaction commits, so rolled-back changes never reach clients. Streams in
+the same process are woken immediately; streams in other workers pick the
+row up on their next poll.
+"""
+
+import json
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from apps.users.models import User
+
+from .models import StreamEvent
+
+_new_event = threading.Condition()
+
+TRANSACTION_CREATED = 'transaction.created'
+TRANSACTION_APPROVED = 'transaction.approved'
+TRANSACTION_REJECTED = 'transaction.rejected'
+EQUIPMENT_STATUS = 'equipment.status'
+
+
+def publish(kind, payload, user=None):
+    publish_many(kind, [payload], user=user)
+
+
+def publish_many(kind, payloads, user=None):
+    """One insert on commit for a batch of events of the same kind."""
+
+    def store():
+        StreamEvent.objects.bulk_create(
+            StreamEvent(kind=kind, payload=payload, user=user) for payload in payloads
+        )
+        with _new_event:
+            _new_event.notify_all()
+
+    transaction.on_commit(store)
+
+
+def transaction_event(kind, txn):
+    publish(
+        kind,
+        {
+            'id': txn.id,
+            'action': txn.action,
+            'status': txn.status,
+            'equipment': str(txn.equipment_id),
+            'user': txn.user_id,
+        },
+        user=txn.user,
+    )
+
+
+def _equipment_status(equipment):
+    return {
+        'uuid': str(equipment.uuid),
+        'status': equipment.status,
+        'version': equipment.version,
+    }
+
+
+def equipment_status_event(equipment):
+    publish(EQUIPMENT_STATUS, _equipment_status(equipment))
+
+
+def equipment_status_events(equipment_list):
+    publish_many(EQUIPMENT_STATUS, [_equipment_status(e) for e in equipment_list])
+
+
+def visible_events(user):
+    """
+    Managers see every event; other users see broadcasts and their own.
+    """
+    queryset = StreamEvent.objects.all()
+    if not (user.role in [User.Role.MANAGER, User.Role.ADMIN] or user.is_staff):
+        queryset = queryset.filter(Q(user__isnull=True) | Q(user=user))
+    return queryset
+
+
+def latest_event_id():
+    return StreamEvent.objects.aggregate(last=Max('id'))['last'] or 0
+
+
+def prune_events():
+    cutoff = timezone.now() - timedelta(seconds=settings.EVENT_STREAM_RETENTION_SECONDS)
+    StreamEvent.objects.filter(created_at__lt=cutoff).delete()
+
+
+def format_event(event):
+    data = json.dumps(event.payload, separators=(',', ':'))
+    return f'id: {event.id}\nevent: {event.kind}\ndata: {data}\n\n'
+
+
+def stream(user, last_id):
+    """
+    Yields SSE frames for events after `last_id`. The stream ends after
+    EVENT_STREAM_MAX_SECONDS so a connection never pins a worker for long;
+    EventSource reconnects with Last-Event-ID and resumes where it left off.
+    """
+    deadline = time.monotonic() + settings.EVENT_STREAM_MAX_SECONDS
+    poll = settings.EVENT_STREAM_POLL_SECONDS
+    idle = 0.0
+    yield f'retry: {settings.EVENT_STREAM_RETRY_MS}\n\n'
+    while True:
+        events = list(visible_events(user).filter(id__gt=last_id).order_by('id')[:100])
+        for event in events:
+            last_id = event.id
+            yield format_event(event)
+        if events:
+            idle = 0.0
+            continue
+        if time.monotonic() >= deadline:
+            return
+        if idle >= settings.EVENT_STREAM_KEEPALIVE_SECONDS:
+            # Comment line: keeps proxies from closing an idle connection
+            yield ': keepalive\n\n'
+            idle = 0.0
+        with _new_event:
+            _new_event.wait(timeout=poll)
+        idle += poll
@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.transactions.services import archivable_transactions, archive_transactions
+
+
+class Command(BaseCommand):
+    help = (
+        'Moves COMPLETED/REJECTED transactions older than the configured age '
+        'into the archive table'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.TRANSACTION_ARCHIVE_AFTER_DAYS,
+            help='Archive transactions created more than this many days ago',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.TRANSACTION_ARCHIVE_BATCH_SIZE,
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many rows would be archived',
+        )
+
+    def handle(self, *_args, **options):
+        older_than = timedelta(days=options['days'])
+        if options['dry_run']:
+            count = archivable_transactions(timezone.now() - older_than).count()
+            self.stdout.write(f'{count} transactions would be archived.')
+            return
+
+        moved = archive_transactions(
+            older_than=older_than, batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} transactions.'))
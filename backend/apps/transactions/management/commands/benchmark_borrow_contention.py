@@ -0,0 +1,131 @@
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, transaction
+from rest_framework.exceptions import ValidationError
+
+from apps.equipment.models import Equipment
+from apps.transactions.models import Transaction
+from apps.transactions.services import TransactionService
+
+User = get_user_model()
+
+BENCH_MARKER = {'benchmark': 'borrow_contention'}
+
+
+def locking_borrow(user, equipment_uuid):
+    """
+    The previous borrow path: pessimistic SELECT ... FOR UPDATE, then check and
+    write. Kept here only as the baseline for the comparison.
+    """
+    with transaction.atomic():
+        equipment = Equipment.objects.select_for_update().get(uuid=equipment_uuid)
+        if equipment.status != Equipment.Status.AVAILABLE:
+            raise ValidationError('Equipment is not available')
+        txn = Transaction.objects.create(
+            equipment=equipment,
+            user=user,
+            action=Transaction.Action.BORROW,
+            status=Transaction.Status.PENDING_APPROVAL,
+            location=equipment.location,
+            zone=equipment.zone,
+            cabinet=equipment.cabinet,
+            number=equipment.number,
+        )
+        equipment.status = Equipment.Status.PENDING_BORROW
+        equipment.save()
+        return txn
+
+
+def cas_borrow(user, equipment_uuid):
+    return TransactionService.create_borrow_request(
+        user=user, equipment_uuid=equipment_uuid
+    )
+
+
+STRATEGIES = {'lock': locking_borrow, 'cas': cas_borrow}
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks concurrent borrow attempts with row locks versus '
+        'conditional (compare-and-swap) updates. Use PostgreSQL; SQLite '
+        'serialises all writers.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--items', type=int, default=50)
+        parser.add_argument('--rounds', type=int, default=3)
+        parser.add_argument('--strategy', choices=[*STRATEGIES, 'both'], default='both')
+
+    def handle(self, *_args, **options):
+        strategies = (
+            list(STRATEGIES) if options['strategy'] == 'both' else [options['strategy']]
+        )
+        users = [
+            User.objects.get_or_create(
+                username=f'bench_borrower_{i}',
+                defaults={'email': f'bench_borrower_{i}@example.com'},
+            )[0]
+            for i in range(options['threads'])
+        ]
+
+        try:
+            for name in strategies:
+                totals = {'success': 0, 'conflict': 0, 'error': 0, 'seconds': 0.0}
+                for _ in range(options['rounds']):
+                    result = self._run_round(STRATEGIES[name], users, options['items'])
+                    for key, value in result.items():
+                        totals[key] += value
+                attempts = totals['success'] + totals['conflict'] + totals['error']
+                self.stdout.write(
+                    f'{name:>5}: {attempts / totals["seconds"]:8.1f} attempts/s, '
+                    f'{totals["success"] / totals["seconds"]:8.1f} borrows/s '
+                    f'(success={totals["success"]} conflict={totals["conflict"]} '
+                    f'error={totals["error"]})'
+                )
+        finally:
+            Equipment.objects.filter(rdf_metadata=BENCH_MARKER).delete()
+            User.objects.filter(username__startswith='bench_borrower_').delete()
+
+    def _run_round(self, borrow, users, item_count):
+        Equipment.objects.filter(rdf_metadata=BENCH_MARKER).delete()
+        items = Equipment.objects.bulk_create(
+            Equipment(name=f'Bench item {i}', rdf_metadata=BENCH_MARKER)
+            for i in range(item_count)
+        )
+        uuids = [item.uuid for item in items]
+        counts = {'success': 0, 'conflict': 0, 'error': 0}
+        lock = threading.Lock()
+        barrier = threading.Barrier(len(users))
+
+        def worker(user):
+            local = {'success': 0, 'conflict': 0, 'error': 0}
+            barrier.wait()
+            try:
+                # Every worker races for every item in the same order
+                for equipment_uuid in uuids:
+                    try:
+                        borrow(user, equipment_uuid)
+                        local['success'] += 1
+                    except ValidationError:
+                        local['conflict'] += 1
+                    except DatabaseError:
+                        local['error'] += 1
+            finally:
+                connection.close()
+            with lock:
+                for key, value in local.items():
+                    counts[key] += value
+
+        threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counts['seconds'] = time.perf_counter() - started
+        return counts
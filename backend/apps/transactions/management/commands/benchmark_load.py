@@ -0,0 +1,519 @@
+import asyncio
+import base64
+import json
+import random
+import statistics
+import time
+from collections import Counter
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.equipment import codes
+from apps.equipment.management.commands.benchmark_asgi import percentile
+
+# 400 responses that mean another request changed the state first (the
+# conditional update or approval lost a race), not a client bug
+CONFLICT_MESSAGES = (
+    'is not available',
+    'is not currently borrowed',
+    'is not pending approval',
+    'does not allow',
+)
+APPROVAL_EVENTS = {
+    'approve_borrow': 'approved_borrows',
+    'approve_return': 'approved_returns',
+}
+WRITE_OPERATIONS = {
+    'borrow',
+    'return_request',
+    'approve_borrow',
+    'approve_return',
+    'reject_borrow',
+    'bulk_approve',
+}
+
+
+class Connection:
+    """
+    Minimal HTTP/1.1 keep-alive client on asyncio streams, enough for the JSON
+    API: Content-Length or chunked bodies, one request at a time.
+    """
+
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.ssl = parts.scheme == 'https' or None
+        self.host_header = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.reader = self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def request(self, method, path, body=None, headers=None):
+        data = b'' if body is None else json.dumps(body).encode()
+        lines = [
+            f'{method} {self.prefix}{path} HTTP/1.1',
+            f'Host: {self.host_header}',
+            'Accept: application/json',
+            f'Content-Length: {len(data)}',
+        ]
+        if body is not None:
+            lines.append('Content-Type: application/json')
+        lines += [f'{name}: {value}' for name, value in (headers or {}).items()]
+        raw = ('\r\n'.join(lines) + '\r\n\r\n').encode() + data
+
+        while True:
+            reused = self.writer is not None
+            if not reused:
+                self.reader, self.writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port, ssl=self.ssl),
+                    self.timeout,
+                )
+            try:
+                self.writer.write(raw)
+                await self.writer.drain()
+                return await asyncio.wait_for(self._response(), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.close()
+                # The server closed an idle keep-alive connection before
+                # reading the request; send it again on a new one
+                if not reused:
+                    raise
+            except TimeoutError:
+                await self.close()
+                raise
+
+    async def _response(self):
+        head = await self.reader.readuntil(b'\r\n\r\n')
+        status_line, *header_lines = head.decode('latin-1').split('\r\n')
+        status = int(status_line.split()[1])
+        headers = {}
+        for line in header_lines:
+            if line:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = b''
+            while size := int((await self.reader.readuntil(b'\r\n')).strip(), 16):
+                body += await self.reader.readexactly(size)
+                await self.reader.readexactly(2)
+            await self.reader.readuntil(b'\r\n')
+        elif 'content-length' in headers:
+            body = await self.reader.readexactly(int(headers['content-length']))
+        else:
+            body = await self.reader.read()
+            headers['connection'] = 'close'
+        if headers.get('connection', '').lower() == 'close':
+            await self.close()
+        return status, body
+
+
+def token_expiry(token):
+    """`exp` of a JWT, read without verifying it (the server does that)."""
+    payload = token.split('.')[1]
+    payload += '=' * (-len(payload) % 4)
+    return json.loads(base64.urlsafe_b64decode(payload))['exp']
+
+
+class Stats:
+    def __init__(self):
+        # operation -> latencies, outcome counts, status codes
+        self.latencies = {}
+        self.outcomes = {}
+        self.statuses = {}
+        self.events = Counter()
+
+    def record(self, operation, seconds, outcome, status):
+        self.latencies.setdefault(operation, []).append(seconds)
+        self.outcomes.setdefault(operation, Counter())[outcome] += 1
+        self.statuses.setdefault(operation, Counter())[str(status)] += 1
+
+    def summary(self, seconds):
+        operations = {}
+        for operation, latencies in sorted(self.latencies.items()):
+            milliseconds = [value * 1000 for value in latencies]
+            outcomes = self.outcomes[operation]
+            operations[operation] = {
+                'requests': len(milliseconds),
+                'per_second': round(len(milliseconds) / seconds, 2),
+                'p50_ms': round(percentile(milliseconds, 0.5), 2),
+                'p95_ms': round(percentile(milliseconds, 0.95), 2),
+                'p99_ms': round(percentile(milliseconds, 0.99), 2),
+                'mean_ms': round(statistics.fmean(milliseconds), 2),
+                'errors': outcomes['error'],
+                'conflicts': outcomes['conflict'],
+                'statuses': dict(self.statuses[operation]),
+            }
+        requests = sum(op['requests'] for op in operations.values())
+        errors = sum(op['errors'] for op in operations.values())
+        # A bulk approval is one attempt per id, each of which can lose a race
+        writes = self.events['bulk_approve_ids'] + sum(
+            op['requests']
+            for name, op in operations.items()
+            if name in WRITE_OPERATIONS - {'bulk_approve'}
+        )
+        conflicts = self.events['bulk_approve_conflicts'] + sum(
+            op['conflicts'] for op in operations.values()
+        )
+        return {
+            'seconds': round(seconds, 2),
+            'requests': requests,
+            'per_second': round(requests / seconds, 2),
+            'error_rate': round(errors / requests, 4) if requests else 0,
+            'conflict_rate': round(conflicts / writes, 4) if writes else 0,
+            'events': dict(self.events),
+            'operations': operations,
+        }
+
+
+class Session:
+    """One logged-in client: its connection, tokens and refresh logic."""
+
+    def __init__(self, command, username, manager=False):
+        self.command = command
+        self.stats = command.stats
+        self.username = username
+        self.manager = manager
+        self.connection = Connection(command.base_url, command.timeout)
+        self.access = self.refresh = None
+        self.refresh_at = 0.0
+
+    async def call(self, operation, method, path, body=None):
+        """(status, parsed JSON or None); status is None if the request failed."""
+        if self.access is None:
+            await self.login()
+        elif time.time() >= self.refresh_at:
+            await self.refresh_token()
+        status, data = await self._timed(operation, method, path, body, auth=True)
+        if status == 401:
+            # Expired early or rejected: refresh once and retry
+            self.stats.events['unauthorized_retries'] += 1
+            await self.refresh_token()
+            status, data = await self._timed(operation, method, path, body, auth=True)
+        return status, data
+
+    async def login(self):
+        status, data = await self._timed(
+            'token',
+            'POST',
+            '/auth/token/',
+            {'username': self.username, 'password': self.command.password},
+        )
+        if status != 200:
+            raise CommandError(f'Login as {self.username} failed ({status})')
+        self._store(data)
+
+    async def refresh_token(self):
+        status, data = await self._timed(
+            'token_refresh', 'POST', '/auth/token/refresh/', {'refresh': self.refresh}
+        )
+        if status == 200:
+            self.stats.events['token_refreshes'] += 1
+            self._store(data)
+        else:
+            await self.login()
+
+    def _store(self, data):
+        self.access = data['access']
+        # Rotated refresh tokens come back with the access token
+        self.refresh = data.get('refresh', self.refresh)
+        expires = token_expiry(self.access) - self.command.refresh_margin
+        if self.command.refresh_after:
+            expires = min(expires, time.time() + self.command.refresh_after)
+        self.refresh_at = expires
+
+    async def _timed(self, operation, method, path, body=None, auth=False):
+        headers = {'Authorization': f'Bearer {self.access}'} if auth else None
+        started = time.perf_counter()
+        try:
+            status, raw = await self.connection.request(
+                method, self.command.api_prefix + path, body, headers
+            )
+        except (OSError, TimeoutError, asyncio.IncompleteReadError) as error:
+            self.stats.record(
+                operation,
+                time.perf_counter() - started,
+                'error',
+                type(error).__name__,
+            )
+            return None, None
+        seconds = time.perf_counter() - started
+        try:
+            data = json.loads(raw) if raw else None
+        except ValueError:
+            data = None
+        if status < 400:
+            outcome = 'ok'
+        elif status in (409, 412) or (
+            status == 400
+            and any(text in raw.decode(errors='replace') for text in CONFLICT_MESSAGES)
+        ):
+            outcome = 'conflict'
+        else:
+            outcome = 'error'
+        self.stats.record(operation, seconds, outcome, status)
+        return status, data
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test against a running server: simulated scanner users scan '
+        'equipment, borrow and return it while managers approve, with JWT '
+        'login and refresh. Reports throughput, error and lock-conflict rates '
+        'and latency percentiles per operation. Seed the server with '
+        'generate_test_data first; its users are the accounts used here.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--users', type=int, default=200, help='Scanner clients')
+        parser.add_argument('--managers', type=int, default=3)
+        parser.add_argument('--duration', type=float, default=60, help='Seconds')
+        parser.add_argument(
+            '--ramp-up', type=float, default=10, help='Seconds to start all clients'
+        )
+        parser.add_argument(
+            '--think-ms',
+            type=float,
+            default=1000,
+            help='Mean pause between a client’s actions (exponential)',
+        )
+        parser.add_argument(
+            '--borrow-share',
+            type=float,
+            default=0.3,
+            help='Chance that a scanned AVAILABLE item is borrowed',
+        )
+        parser.add_argument(
+            '--return-share',
+            type=float,
+            default=0.7,
+            help='Chance that a scanned item of one’s own is returned',
+        )
+        parser.add_argument(
+            '--bulk-share',
+            type=float,
+            default=0.2,
+            help='Chance that a manager bulk-approves the borrow queue',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--username-prefix', default='gen_user_')
+        parser.add_argument('--password', default='password')
+        parser.add_argument(
+            '--accounts',
+            type=int,
+            default=50,
+            help='generate_test_data --users; clients share these accounts',
+        )
+        parser.add_argument(
+            '--manager-accounts',
+            type=int,
+            default=5,
+            help='generate_test_data --managers (the first accounts)',
+        )
+        parser.add_argument(
+            '--refresh-margin',
+            type=float,
+            default=60,
+            help='Refresh the access token this many seconds before it expires',
+        )
+        parser.add_argument(
+            '--refresh-after',
+            type=float,
+            default=0,
+            help='Also refresh after this many seconds (exercises refresh)',
+        )
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--output', type=Path, help='Write the report as JSON')
+
+    def handle(self, *_args, **options):
+        if options['manager_accounts'] >= options['accounts']:
+            raise CommandError('--accounts must be larger than --manager-accounts')
+        self.base_url = options['url']
+        self.api_prefix = '/api/v1'
+        self.password = options['password']
+        self.timeout = options['timeout']
+        self.refresh_margin = options['refresh_margin']
+        self.refresh_after = options['refresh_after']
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.stats = Stats()
+
+        seconds = asyncio.run(self._run())
+        report = self.stats.summary(seconds)
+        self._report(report)
+        if options['output']:
+            options['output'].write_text(json.dumps(report, indent=2) + '\n')
+            self.stdout.write(f'Wrote {options["output"]}')
+
+    def _username(self, index):
+        return f'{self.options["username_prefix"]}{index:05d}'
+
+    async def _run(self):
+        options = self.options
+        managers = [
+            Session(self, self._username(i % options['manager_accounts']), True)
+            for i in range(options['managers'])
+        ]
+        user_accounts = range(options['manager_accounts'], options['accounts'])
+        users = [
+            Session(self, self._username(user_accounts[i % len(user_accounts)]))
+            for i in range(options['users'])
+        ]
+        catalog_session = managers[0] if managers else users[0]
+        self.catalog = await self._catalog(catalog_session)
+        if not self.catalog:
+            raise CommandError('The server has no equipment; run generate_test_data')
+        self.stdout.write(
+            f'{len(self.catalog)} equipment items, {len(users)} users, '
+            f'{len(managers)} managers, {options["duration"]:.0f}s'
+        )
+
+        started = time.perf_counter()
+        self.deadline = started + options['duration']
+        clients = [*managers, *users]
+        await asyncio.gather(
+            *(
+                self._client(
+                    session,
+                    random.Random(self.rng.random()),
+                    options['ramp_up'] * i / len(clients),
+                )
+                for i, session in enumerate(clients)
+            )
+        )
+        for session in clients:
+            await session.connection.close()
+        return time.perf_counter() - started
+
+    async def _catalog(self, session):
+        """Equipment UUIDs from the delta-sync API."""
+        uuids, since = [], 0
+        while True:
+            status, data = await session.call(
+                'sync', 'GET', f'/sync/?since={since}&limit=5000'
+            )
+            if status != 200:
+                raise CommandError(f'Could not read the equipment list ({status})')
+            uuids += [row['uuid'] for row in data['equipment']]
+            since = data['watermark']
+            if not data['has_more']:
+                return uuids
+
+    async def _client(self, session, rng, delay):
+        await asyncio.sleep(delay)
+        # Items this client asked to borrow or return and keeps checking on
+        watching = []
+        while time.perf_counter() < self.deadline:
+            await asyncio.sleep(rng.expovariate(1000 / self.options['think_ms']))
+            if time.perf_counter() >= self.deadline:
+                break
+            if session.manager:
+                await self._manager_step(session, rng)
+            else:
+                await self._user_step(session, rng, watching)
+
+    async def _user_step(self, session, rng, watching):
+        if rng.random() < 0.1:
+            await session.call(
+                'equipment_list',
+                'GET',
+                f'/equipment/?status=AVAILABLE&page={rng.randint(1, 5)}',
+            )
+            return
+
+        if watching and rng.random() < 0.5:
+            equipment_uuid = rng.choice(watching)
+        else:
+            equipment_uuid = rng.choice(self.catalog)
+        status, scan = await session.call(
+            'scan', 'GET', f'/equipment/{codes.short_code(equipment_uuid)}/scan/'
+        )
+        if status != 200:
+            return
+        body = {'equipment_uuid': equipment_uuid}
+        actions = scan['actions']
+        if 'RETURN' in actions and rng.random() < self.options['return_share']:
+            status, _ = await session.call(
+                'return_request', 'POST', '/transactions/return-request/', body
+            )
+        elif 'BORROW' in actions and rng.random() < self.options['borrow_share']:
+            status, _ = await session.call(
+                'borrow', 'POST', '/transactions/borrow/', body
+            )
+        else:
+            # Resolved, and not held by this client: nothing to wait for
+            if (
+                equipment_uuid in watching
+                and scan['pending'] is None
+                and 'RETURN' not in actions
+            ):
+                watching.remove(equipment_uuid)
+            return
+        if status == 201 and equipment_uuid not in watching:
+            watching.append(equipment_uuid)
+
+    async def _manager_step(self, session, rng):
+        status, page = await session.call(
+            'pending_list',
+            'GET',
+            '/transactions/?status=PENDING_APPROVAL&page_size=50',
+        )
+        if status != 200 or not page['results']:
+            return
+        pending = page['results']
+        borrows = [txn['id'] for txn in pending if txn['action'] == 'BORROW']
+        if borrows and rng.random() < self.options['bulk_share']:
+            status, result = await session.call(
+                'bulk_approve',
+                'POST',
+                '/transactions/bulk-approve/',
+                {'transaction_ids': borrows},
+            )
+            if status == 200:
+                events = self.stats.events
+                events['bulk_approve_ids'] += len(borrows)
+                events['bulk_approve_conflicts'] += sum(
+                    any(text in failure['error'] for text in CONFLICT_MESSAGES)
+                    for failure in result['failed']
+                )
+                events['approved_borrows'] += len(result['success'])
+            return
+
+        rng.shuffle(pending)
+        for txn in pending[:10]:
+            if txn['action'] == 'BORROW':
+                operation = 'reject_borrow' if rng.random() < 0.05 else 'approve_borrow'
+            elif txn['action'] == 'RETURN':
+                operation = 'approve_return'
+            else:
+                continue
+            path = f'/transactions/{txn["id"]}/{operation.replace("_", "-")}/'
+            status, _ = await session.call(operation, 'POST', path, {})
+            if status == 200 and operation in APPROVAL_EVENTS:
+                self.stats.events[APPROVAL_EVENTS[operation]] += 1
+            if time.perf_counter() >= self.deadline:
+                return
+
+    def _report(self, report):
+        self.stdout.write(
+            f'{report["requests"]} requests in {report["seconds"]}s: '
+            f'{report["per_second"]} req/s, error rate {report["error_rate"]:.2%}, '
+            f'conflict rate {report["conflict_rate"]:.2%}'
+        )
+        for name, op in report['operations'].items():
+            self.stdout.write(
+                f'{name:>16}: {op["requests"]:6d} req  {op["per_second"]:7.1f}/s  '
+                f'p50 {op["p50_ms"]:7.1f} ms  p95 {op["p95_ms"]:7.1f} ms  '
+                f'p99 {op["p99_ms"]:7.1f} ms  errors {op["errors"]}  '
+                f'conflicts {op["conflicts"]}'
+            )
+        self.stdout.write(f'events: {report["events"]}')
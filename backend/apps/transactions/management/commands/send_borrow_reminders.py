@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.transactions.reminders import pending_reminders, send_borrow_reminders
+
+
+class Command(BaseCommand):
+    help = (
+        'E-mails one digest per borrower for overdue and soon-due borrows. '
+        'Safe to run repeatedly (e.g. from cron): sent reminders are recorded'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--due-soon-hours',
+            type=int,
+            default=settings.BORROW_REMINDER_DUE_SOON_HOURS,
+            help='Also remind about borrows due within this many hours',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.BORROW_REMINDER_BATCH_SIZE,
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many reminders would be sent',
+        )
+
+    def handle(self, *_args, **options):
+        due_soon = timedelta(hours=options['due_soon_hours'])
+        if options['dry_run']:
+            count = pending_reminders(due_soon=due_soon).count()
+            self.stdout.write(f'{count} reminders would be sent.')
+            return
+
+        stats = send_borrow_reminders(
+            due_soon=due_soon, batch_size=options['batch_size']
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Sent {stats["reminders"]} reminders to {stats["users"]} users '
+                f'({stats["skipped"]} skipped: no e-mail address).'
+            )
+        )
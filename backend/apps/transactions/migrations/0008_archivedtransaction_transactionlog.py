@@ -0,0 +1,106 @@
+# Generated by Django 6.0 on 2026-10-19 17:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+LOG_COLUMNS = (
+    'id, equipment_id, user_id, admin_verifier_id, action, status, due_date, '
+    'reason, admin_note, location_id, zone, cabinet, number, image, '
+    'created_at, updated_at'
+)
+
+CREATE_LOG_VIEW = f"""
+CREATE VIEW transactions_transactionlog AS
+SELECT {LOG_COLUMNS}, FALSE AS archived FROM transactions_transaction
+UNION ALL
+SELECT {LOG_COLUMNS}, TRUE AS archived FROM transactions_archivedtransaction
+"""
+
+DROP_LOG_VIEW = 'DROP VIEW IF EXISTS transactions_transactionlog'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0014_equipment_version'),
+        ('locations', '0001_initial'),
+        ('transactions', '0007_transaction_admin_note'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionLog',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('action', models.CharField(choices=[('BORROW', 'Borrow'), ('RETURN', 'Return'), ('MAINTENANCE_IN', 'Maintenance In'), ('MAINTENANCE_OUT', 'Maintenance Out'), ('MOVE_START', 'Move Start'), ('MOVE_CONFIRM', 'Move Confirm'), ('DISPATCH', 'Dispatch')], max_length=20)),
+                ('status', models.CharField(choices=[('COMPLETED', 'Completed'), ('PENDING_APPROVAL', 'Pending Approval'), ('REJECTED', 'Rejected')], max_length=20)),
+                ('due_date', models.DateTimeField(null=True)),
+                ('reason', models.TextField(blank=True)),
+                ('admin_note', models.TextField(blank=True)),
+                ('zone', models.CharField(blank=True, max_length=50)),
+                ('cabinet', models.CharField(blank=True, max_length=50)),
+                ('number', models.CharField(blank=True, max_length=50)),
+                ('image', models.ImageField(null=True, upload_to='transaction_images/')),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived', models.BooleanField()),
+            ],
+            options={
+                'db_table': 'transactions_transactionlog',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedTransaction',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('action', models.CharField(choices=[('BORROW', 'Borrow'), ('RETURN', 'Return'), ('MAINTENANCE_IN', 'Maintenance In'), ('MAINTENANCE_OUT', 'Maintenance Out'), ('MOVE_START', 'Move Start'), ('MOVE_CONFIRM', 'Move Confirm'), ('DISPATCH', 'Dispatch')], max_length=20, verbose_name='Action')),
+                ('status', models.CharField(choices=[('COMPLETED', 'Completed'), ('PENDING_APPROVAL', 'Pending Approval'), ('REJECTED', 'Rejected')], max_length=20, verbose_name='Status')),
+                ('due_date', models.DateTimeField(blank=True, null=True, verbose_name='Due Date')),
+                ('reason', models.TextField(blank=True, verbose_name='Reason')),
+                ('admin_note', models.TextField(blank=True, verbose_name='Admin Note')),
+                ('zone', models.CharField(blank=True, max_length=50, verbose_name='區')),
+                ('cabinet', models.CharField(blank=True, max_length=50, verbose_name='櫃')),
+                ('number', models.CharField(blank=True, max_length=50, verbose_name='號')),
+                ('image', models.ImageField(blank=True, null=True, upload_to='transaction_images/', verbose_name='Transaction Image')),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['status', '-created_at'], name='transaction_status_4b1739_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['equipment', '-created_at'], name='transaction_equipme_c62714_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='admin_verifier',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Admin Verifier'),
+        ),
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='equipment',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_transactions', to='equipment.equipment', verbose_name='Equipment'),
+        ),
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='location',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='locations.location', verbose_name='Location'),
+        ),
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_transactions', to=settings.AUTH_USER_MODEL, verbose_name='Requester'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtransaction',
+            index=models.Index(fields=['equipment', '-created_at'], name='transaction_equipme_296499_idx'),
+        ),
+        migrations.RunSQL(CREATE_LOG_VIEW, DROP_LOG_VIEW),
+    ]
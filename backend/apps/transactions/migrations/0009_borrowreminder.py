@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-19 18:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0015_inventorycounter'),
+        ('locations', '0001_initial'),
+        ('transactions', '0008_archivedtransaction_transactionlog'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BorrowReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('DUE_SOON', 'Due Soon'), ('OVERDUE', 'Overdue')], max_length=20)),
+                ('due_date', models.DateTimeField()),
+                ('sent_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['action', 'status', 'due_date'], name='transaction_action_c11f2b_idx'),
+        ),
+        migrations.AddField(
+            model_name='borrowreminder',
+            name='transaction',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='transactions.transaction', verbose_name='Transaction'),
+        ),
+        migrations.AddConstraint(
+            model_name='borrowreminder',
+            constraint=models.UniqueConstraint(fields=('transaction', 'kind', 'due_date'), name='unique_borrow_reminder'),
+        ),
+    ]
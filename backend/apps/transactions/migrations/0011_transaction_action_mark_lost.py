@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0010_streamevent'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedtransaction',
+            name='action',
+            field=models.CharField(choices=[('BORROW', 'Borrow'), ('RETURN', 'Return'), ('MAINTENANCE_IN', 'Maintenance In'), ('MAINTENANCE_OUT', 'Maintenance Out'), ('MOVE_START', 'Move Start'), ('MOVE_CONFIRM', 'Move Confirm'), ('DISPATCH', 'Dispatch'), ('MARK_LOST', 'Mark Lost')], max_length=20, verbose_name='Action'),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='action',
+            field=models.CharField(choices=[('BORROW', 'Borrow'), ('RETURN', 'Return'), ('MAINTENANCE_IN', 'Maintenance In'), ('MAINTENANCE_OUT', 'Maintenance Out'), ('MOVE_START', 'Move Start'), ('MOVE_CONFIRM', 'Move Confirm'), ('DISPATCH', 'Dispatch'), ('MARK_LOST', 'Mark Lost')], max_length=20, verbose_name='Action'),
+        ),
+    ]
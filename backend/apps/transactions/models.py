@@ -14,6 +14,7 @@ class Transaction(models.Model):
         MOVE_START = 'MOVE_START', _('Move Start')
         MOVE_CONFIRM = 'MOVE_CONFIRM', _('Move Confirm')
         DISPATCH = 'DISPATCH', _('Dispatch')
+        MARK_LOST = 'MARK_LOST', _('Mark Lost')
 
     class Status(models.TextChoices):
         COMPLETED = 'COMPLETED', _('Completed')
@@ -73,22 +74,191 @@ class Transaction(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Pending-approval queue and the status filter of the list view
+            models.Index(fields=['status', '-created_at']),
+            # Per-equipment history, latest borrow and current possession
+            models.Index(fields=['equipment', '-created_at']),
+            # Range scan for overdue / soon-due borrows
+            models.Index(fields=['action', 'status', 'due_date']),
+        ]
+
     def __str__(self):
         return f'{self.action} - {self.equipment.name} by {self.user.username}'
 
     def save(self, *args, **kwargs):
-        # Compress image if it's new or changed
-        if self.image:
-            try:
-                this = Transaction.objects.get(pk=self.pk)
-                if this.image != self.image:
-                    compressed = compress_image(self.image)
-                    if compressed:
-                        self.image.save(compressed.name, compressed, save=False)
-            except Transaction.DoesNotExist:
-                # New instance
-                compressed = compress_image(self.image)
-                if compressed:
-                    self.image.save(compressed.name, compressed, save=False)
+        # Compress a file uploaded with this save (see Equipment)
+        if self.image and not self.image._committed:
+            compressed = compress_image(self.image)
+            if compressed:
+                self.image.save(compressed.name, compressed, save=False)
 
         super().save(*args, **kwargs)
+
+
+class BorrowReminder(models.Model):
+    """
+    A reminder that was e-mailed for a borrow. Unique per (transaction, kind,
+    due_date) so repeated scanner runs never send the same reminder twice,
+    while extending the due date makes the borrow eligible again.
+    """
+
+    class Kind(models.TextChoices):
+        DUE_SOON = 'DUE_SOON', _('Due Soon')
+        OVERDUE = 'OVERDUE', _('Overdue')
+
+    transaction = models.ForeignKey(
+        Transaction,
+        on_delete=models.CASCADE,
+        related_name='reminders',
+        verbose_name=_('Transaction'),
+    )
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    due_date = models.DateTimeField()
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['transaction', 'kind', 'due_date'],
+                name='unique_borrow_reminder',
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.kind} reminder for transaction {self.transaction_id}'
+
+
+class StreamEvent(models.Model):
+    """
+    Append-only feed behind the /events/ Server-Sent Events stream. Rows are
+    inserted after the originating write commits and read by id, so any
+    worker can serve any client. `user` limits visibility for regular users;
+    NULL means the event is visible to everyone.
+    """
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField()
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+',
+    )
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f'{self.kind} #{self.pk}'
+
+
+class ArchivedTransaction(models.Model):
+    """
+    Cold storage for COMPLETED/REJECTED transactions moved out of the hot
+    table by services.archive_transactions(). Rows keep their original id and
+    timestamps.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    equipment = models.ForeignKey(
+        'equipment.Equipment',
+        on_delete=models.CASCADE,
+        related_name='archived_transactions',
+        verbose_name=_('Equipment'),
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='archived_transactions',
+        verbose_name=_('Requester'),
+    )
+    admin_verifier = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name=_('Admin Verifier'),
+    )
+    action = models.CharField(
+        max_length=20, choices=Transaction.Action.choices, verbose_name=_('Action')
+    )
+    status = models.CharField(
+        max_length=20, choices=Transaction.Status.choices, verbose_name=_('Status')
+    )
+    due_date = models.DateTimeField(null=True, blank=True, verbose_name=_('Due Date'))
+    reason = models.TextField(blank=True, verbose_name=_('Reason'))
+    admin_note = models.TextField(blank=True, verbose_name=_('Admin Note'))
+    location = models.ForeignKey(
+        'locations.Location',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name=_('Location'),
+    )
+    zone = models.CharField(max_length=50, blank=True, verbose_name='區')
+    cabinet = models.CharField(max_length=50, blank=True, verbose_name='櫃')
+    number = models.CharField(max_length=50, blank=True, verbose_name='號')
+    image = models.ImageField(
+        upload_to='transaction_images/',
+        blank=True,
+        null=True,
+        verbose_name=_('Transaction Image'),
+    )
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['equipment', '-created_at'])]
+
+    def __str__(self):
+        return f'{self.action} - {self.equipment.name} by {self.user.username}'
+
+
+class TransactionLog(models.Model):
+    """
+    Read-only view over the hot and archived tables (UNION ALL, see migration
+    0008), used where both live and archived records must be listed.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    equipment = models.ForeignKey(
+        'equipment.Equipment', on_delete=models.DO_NOTHING, related_name='+'
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.DO_NOTHING, related_name='+'
+    )
+    admin_verifier = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        null=True,
+        related_name='+',
+    )
+    action = models.CharField(max_length=20, choices=Transaction.Action.choices)
+    status = models.CharField(max_length=20, choices=Transaction.Status.choices)
+    due_date = models.DateTimeField(null=True)
+    reason = models.TextField(blank=True)
+    admin_note = models.TextField(blank=True)
+    location = models.ForeignKey(
+        'locations.Location',
+        on_delete=models.DO_NOTHING,
+        null=True,
+        related_name='+',
+    )
+    zone = models.CharField(max_length=50, blank=True)
+    cabinet = models.CharField(max_length=50, blank=True)
+    number = models.CharField(max_length=50, blank=True)
+    image = models.ImageField(upload_to='transaction_images/', null=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived = models.BooleanField()
+
+    class Meta:
+        managed = False
+        db_table = 'transactions_transactionlog'
+
+    def __str__(self):
+        return f'{self.action} - {self.equipment.name} by {self.user.username}'
@@ -0,0 +1,150 @@
+"""
+Overdue / soon-due borrow reminders.
+
+The scanner walks the (action, status, due_date) index, skips borrows that
+already have a BorrowReminder for the same kind and due date, and sends one
+digest e-mail per borrower. Sent reminders are recorded so reruns only pick
+up what changed since the last run.
+"""
+
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Case, Exists, OuterRef, Subquery, Value, When
+from django.utils import timezone
+
+from apps.equipment.models import Equipment
+
+from .models import BorrowReminder, Transaction
+
+
+def open_borrows():
+    """
+    Completed borrows whose equipment is still out: the newest completed
+    borrow of an item that is BORROWED or PENDING_RETURN.
+    """
+    latest_borrow = (
+        Transaction.objects.filter(
+            equipment=OuterRef('equipment'),
+            action=Transaction.Action.BORROW,
+            status=Transaction.Status.COMPLETED,
+        )
+        .order_by('-created_at', '-id')
+        .values('pk')[:1]
+    )
+    return Transaction.objects.filter(
+        action=Transaction.Action.BORROW,
+        status=Transaction.Status.COMPLETED,
+        due_date__isnull=False,
+        equipment__status__in=[
+            Equipment.Status.BORROWED,
+            Equipment.Status.PENDING_RETURN,
+        ],
+        pk=Subquery(latest_borrow),
+    )
+
+
+def pending_reminders(now=None, due_soon=None):
+    """
+    Open borrows due before now + due_soon that have not been reminded about
+    for their current due date, annotated with `reminder_kind`.
+    """
+    now = now or timezone.now()
+    if due_soon is None:
+        due_soon = timedelta(hours=settings.BORROW_REMINDER_DUE_SOON_HOURS)
+    already_sent = BorrowReminder.objects.filter(
+        transaction=OuterRef('pk'),
+        kind=OuterRef('reminder_kind'),
+        due_date=OuterRef('due_date'),
+    )
+    return (
+        open_borrows()
+        .filter(due_date__lt=now + due_soon)
+        .annotate(
+            reminder_kind=Case(
+                When(due_date__lt=now, then=Value(BorrowReminder.Kind.OVERDUE)),
+                default=Value(BorrowReminder.Kind.DUE_SOON),
+            )
+        )
+        .exclude(Exists(already_sent))
+    )
+
+
+def _digest(user, borrows, now):
+    lines = [f'Hello {user.get_full_name() or user.username},', '']
+    sections = (
+        ('overdue', [t for t in borrows if t.due_date < now]),
+        ('due soon', [t for t in borrows if t.due_date >= now]),
+    )
+    for label, items in sections:
+        if not items:
+            continue
+        lines.append(f'The following items are {label}:')
+        lines += [
+            f'  - {t.equipment.name} (due {t.due_date:%Y-%m-%d %H:%M})' for t in items
+        ]
+        lines.append('')
+    lines.append('Please return them or contact an administrator.')
+    return EmailMessage(
+        subject=f'[QR-EMS] {len(borrows)} borrowed item(s) need attention',
+        body='\n'.join(lines),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[user.email],
+    )
+
+
+def send_borrow_reminders(now=None, due_soon=None, batch_size=None):
+    """
+    Sends one digest per borrower and records what was sent. Rows are read
+    in chunks ordered by borrower, and each chunk's messages go out over a
+    single mail connection. Returns {'users', 'reminders', 'skipped'}, where
+    skipped counts borrows of users without an e-mail address.
+    """
+    now = now or timezone.now()
+    batch_size = batch_size or settings.BORROW_REMINDER_BATCH_SIZE
+    rows = (
+        pending_reminders(now, due_soon)
+        .select_related('user', 'equipment')
+        .only(
+            'due_date',
+            'user',
+            'equipment',
+            'user__username',
+            'user__email',
+            'user__first_name',
+            'user__last_name',
+            'equipment__name',
+        )
+        .order_by('user_id', 'due_date', 'pk')
+        .iterator(chunk_size=batch_size)
+    )
+
+    stats = {'users': 0, 'reminders': 0, 'skipped': 0}
+    messages, records = [], []
+
+    def flush():
+        if messages:
+            get_connection().send_messages(messages)
+            # ignore_conflicts: an overlapping run may have recorded the same row
+            BorrowReminder.objects.bulk_create(records, ignore_conflicts=True)
+        messages.clear()
+        records.clear()
+
+    for user, group in groupby(rows, key=lambda t: t.user):
+        borrows = list(group)
+        if not user.email:
+            stats['skipped'] += len(borrows)
+            continue
+        messages.append(_digest(user, borrows, now))
+        records.extend(
+            BorrowReminder(transaction=t, kind=t.reminder_kind, due_date=t.due_date)
+            for t in borrows
+        )
+        stats['users'] += 1
+        stats['reminders'] += len(borrows)
+        if len(records) >= batch_size:
+            flush()
+    flush()
+    return stats
@@ -1,7 +1,7 @@
 from rest_framework import serializers
 
 from apps.equipment.serializers import EquipmentSerializer
-from apps.locations.serializers import LocationSerializer
+from apps.locations.serializers import LocationSerializer, LocationSummarySerializer
 from apps.users.serializers import UserSerializer
 
 from .models import Transaction
@@ -55,3 +55,19 @@ class TransactionSerializer(serializers.ModelSerializer):
         if request and hasattr(request, 'user'):
             validated_data['user'] = request.user
         return super().create(validated_data)
+
+
+class TransactionHistorySerializer(TransactionSerializer):
+    """
+    History row for a single equipment: the equipment itself is serialized
+    once by the caller, so it is omitted here.
+    """
+
+    location_details = LocationSummarySerializer(source='location', read_only=True)
+
+    class Meta(TransactionSerializer.Meta):
+        fields = [
+            field
+            for field in TransactionSerializer.Meta.fields
+            if field != 'equipment_detail'
+        ]
@@ -1,10 +1,40 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
 from rest_framework.exceptions import ValidationError
 
 from apps.equipment.models import Equipment
 from apps.users.models import User
 
-from .models import Transaction
+from . import events
+from .models import ArchivedTransaction, Transaction
+from .state_machine import Phase, apply_transition
+
+
+def _transition_or_raise(equipment_uuid, action, phase, message, **changes):
+    """
+    Applies the (action, phase) transition and returns the updated equipment.
+    Raises Equipment.DoesNotExist for unknown UUIDs, ValidationError when the
+    equipment is not in a valid source status and PreconditionFailed when
+    concurrent edits keep it from being updated.
+    """
+    equipment = apply_transition(equipment_uuid, action, phase, **changes)
+    if equipment is None:
+        raise ValidationError(message)
+    events.equipment_status_event(equipment)
+    return equipment
+
+
+def _location_snapshot(equipment):
+    return {
+        'location': equipment.location,
+        'zone': equipment.zone,
+        'cabinet': equipment.cabinet,
+        'number': equipment.number,
+    }
 
 
 class TransactionService:
@@ -19,10 +49,12 @@ class TransactionService:
             due_date = None
 
         with transaction.atomic():
-            equipment = Equipment.objects.select_for_update().get(uuid=equipment_uuid)
-
-            if equipment.status != Equipment.Status.AVAILABLE:
-                raise ValidationError('Equipment is not available')
+            equipment = _transition_or_raise(
+                equipment_uuid,
+                Transaction.Action.BORROW,
+                Phase.REQUEST,
+                'Equipment is not available',
+            )
 
             txn = Transaction.objects.create(
                 equipment=equipment,
@@ -32,14 +64,9 @@ class TransactionService:
                 due_date=due_date,
                 reason=reason,
                 image=image,
-                location=equipment.location,
-                zone=equipment.zone,
-                cabinet=equipment.cabinet,
-                number=equipment.number,
+                **_location_snapshot(equipment),
             )
-
-            equipment.status = Equipment.Status.PENDING_BORROW
-            equipment.save()
+            events.transaction_event(events.TRANSACTION_CREATED, txn)
             return txn
 
     @staticmethod
@@ -48,10 +75,12 @@ class TransactionService:
         Creates a dispatch (outbound) request.
         """
         with transaction.atomic():
-            equipment = Equipment.objects.select_for_update().get(uuid=equipment_uuid)
-
-            if equipment.status != Equipment.Status.AVAILABLE:
-                raise ValidationError('Equipment is not available for dispatch')
+            equipment = _transition_or_raise(
+                equipment_uuid,
+                Transaction.Action.DISPATCH,
+                Phase.REQUEST,
+                'Equipment is not available for dispatch',
+            )
 
             txn = Transaction.objects.create(
                 equipment=equipment,
@@ -60,15 +89,9 @@ class TransactionService:
                 status=Transaction.Status.PENDING_APPROVAL,
                 reason=reason,
                 image=image,
-                location=equipment.location,
-                zone=equipment.zone,
-                cabinet=equipment.cabinet,
-                number=equipment.number,
+                **_location_snapshot(equipment),
             )
-
-            # Mark as pending borrow/dispatch
-            equipment.status = Equipment.Status.PENDING_BORROW
-            equipment.save()
+            events.transaction_event(events.TRANSACTION_CREATED, txn)
             return txn
 
     @staticmethod
@@ -78,15 +101,14 @@ class TransactionService:
         Validates if the user is the original borrower or an admin.
         """
         with transaction.atomic():
-            equipment = Equipment.objects.select_for_update().get(uuid=equipment_uuid)
-
-            if equipment.status != Equipment.Status.BORROWED:
-                raise ValidationError('Equipment is not currently borrowed')
-
-            # Permission check logic usually belongs to View or Permission class,
-            # but business rule validation (is this the borrower?) can be here.
-            # However, for Service layer, we often assume 'user' passed here is authorized to TRY.
-            # We will strictly check logic consistency.
+            # Claim the BORROWED -> PENDING_RETURN transition first; if the
+            # borrower check fails below, the atomic block rolls it back.
+            equipment = _transition_or_raise(
+                equipment_uuid,
+                Transaction.Action.RETURN,
+                Phase.REQUEST,
+                'Equipment is not currently borrowed',
+            )
 
             latest_borrow = (
                 equipment.transactions.filter(
@@ -102,7 +124,7 @@ class TransactionService:
             )
 
             if latest_borrow:
-                if latest_borrow.user != user and not is_privileged:
+                if latest_borrow.user_id != user.pk and not is_privileged:
                     raise ValidationError(
                         'You can only return equipment that you have personally borrowed.'
                     )
@@ -117,16 +139,34 @@ class TransactionService:
                 user=user,  # The returner
                 action=Transaction.Action.RETURN,
                 status=Transaction.Status.PENDING_APPROVAL,
-                location=equipment.location,
-                zone=equipment.zone,
-                cabinet=equipment.cabinet,
-                number=equipment.number,
+                **_location_snapshot(equipment),
             )
-
-            equipment.status = Equipment.Status.PENDING_RETURN
-            equipment.save()
+            events.transaction_event(events.TRANSACTION_CREATED, txn)
             return txn
 
+    @staticmethod
+    def _resolve(txn, admin_user, admin_note, new_status):
+        """
+        Moves a pending transaction to new_status with a conditional UPDATE so
+        that two managers resolving the same request cannot both succeed.
+        """
+        now = timezone.now()
+        updated = Transaction.objects.filter(
+            pk=txn.pk, status=Transaction.Status.PENDING_APPROVAL
+        ).update(
+            status=new_status,
+            admin_verifier=admin_user,
+            admin_note=admin_note,
+            updated_at=now,
+        )
+        if not updated:
+            raise ValidationError(f'Transaction {txn.id} is not pending approval')
+
+        txn.status = new_status
+        txn.admin_verifier = admin_user
+        txn.admin_note = admin_note
+        txn.updated_at = now
+
     @staticmethod
     def approve_transaction(
         admin_user, transaction_id, admin_note='', new_location_data=None
@@ -136,78 +176,129 @@ class TransactionService:
         Handles state transitions and location updates.
         """
         with transaction.atomic():
-            txn = Transaction.objects.select_for_update().get(pk=transaction_id)
-            equipment = Equipment.objects.select_for_update().get(
-                uuid=txn.equipment.uuid
+            txn = Transaction.objects.get(pk=transaction_id)
+            TransactionService._resolve(
+                txn, admin_user, admin_note, Transaction.Status.COMPLETED
             )
 
-            if txn.status != Transaction.Status.PENDING_APPROVAL:
-                raise ValidationError(f'Transaction {txn.id} is not pending approval')
-
-            txn.status = Transaction.Status.COMPLETED
-            txn.admin_verifier = admin_user
-            txn.admin_note = admin_note
-
-            if txn.action == Transaction.Action.BORROW:
-                equipment.status = Equipment.Status.BORROWED
-
-            elif txn.action == Transaction.Action.DISPATCH:
-                equipment.status = Equipment.Status.DISPATCHED
+            changes = {}
+            if txn.action == Transaction.Action.RETURN and new_location_data:
+                from apps.locations.models import Location
 
-            elif txn.action == Transaction.Action.RETURN:
-                equipment.status = Equipment.Status.AVAILABLE
+                loc_id = new_location_data.get('location')
+                if loc_id:
+                    changes['location'] = Location.objects.get(uuid=loc_id)
+                for field in ('zone', 'cabinet', 'number'):
+                    if field in new_location_data:
+                        changes[field] = new_location_data[field]
 
-                # Handle Return Location Update
-                if new_location_data:
-                    from apps.locations.models import Location
-
-                    loc_id = new_location_data.get('location')
-                    if loc_id:
-                        equipment.location = Location.objects.get(uuid=loc_id)
-
-                    if 'zone' in new_location_data:
-                        equipment.zone = new_location_data['zone']
-                    if 'cabinet' in new_location_data:
-                        equipment.cabinet = new_location_data['cabinet']
-                    if 'number' in new_location_data:
-                        equipment.number = new_location_data['number']
+            equipment = apply_transition(
+                txn.equipment_id, txn.action, Phase.APPROVE, **changes
+            )
+            if equipment is None:
+                # Rolls back the resolve above, so the request stays rejectable
+                status = Equipment.objects.values_list('status', flat=True).get(
+                    pk=txn.equipment_id
+                )
+                raise ValidationError(
+                    f'Equipment is {status}, which does not allow approving '
+                    f'transaction {txn.id}; reject it instead'
+                )
+            events.equipment_status_event(equipment)
 
+            if txn.action == Transaction.Action.RETURN:
                 # Snapshot the FINAL return location
-                txn.location = equipment.location
-                txn.zone = equipment.zone
-                txn.cabinet = equipment.cabinet
-                txn.number = equipment.number
+                snapshot = _location_snapshot(equipment)
+                Transaction.objects.filter(pk=txn.pk).update(**snapshot)
+                for field, value in snapshot.items():
+                    setattr(txn, field, value)
 
-            txn.save()
-            equipment.save()
+            txn.equipment = equipment
+            events.transaction_event(events.TRANSACTION_APPROVED, txn)
             return txn
 
     @staticmethod
     def reject_transaction(admin_user, transaction_id, rejection_reason='Rejected'):
         """
-        Rejects a transaction and reverts equipment status.
+        Rejects a transaction and reverts equipment status. A pending request
+        can always be rejected: if the equipment has moved on meanwhile (an
+        edit, or an audit marking it LOST), its status is left as it is.
         """
         with transaction.atomic():
-            txn = Transaction.objects.select_for_update().get(pk=transaction_id)
-            equipment = Equipment.objects.select_for_update().get(
-                uuid=txn.equipment.uuid
+            txn = Transaction.objects.get(pk=transaction_id)
+            TransactionService._resolve(
+                txn, admin_user, rejection_reason, Transaction.Status.REJECTED
             )
 
-            if txn.status != Transaction.Status.PENDING_APPROVAL:
-                raise ValidationError(f'Transaction {txn.id} is not pending approval')
-
-            txn.status = Transaction.Status.REJECTED
-            txn.admin_verifier = admin_user
-            txn.admin_note = rejection_reason
-            txn.save()
+            equipment = apply_transition(txn.equipment_id, txn.action, Phase.REJECT)
+            if equipment is None:
+                equipment = Equipment.objects.get(pk=txn.equipment_id)
+            else:
+                events.equipment_status_event(equipment)
+            txn.equipment = equipment
+            events.transaction_event(events.TRANSACTION_REJECTED, txn)
+            return txn
 
-            # Revert logic
-            if txn.action in [Transaction.Action.BORROW, Transaction.Action.DISPATCH]:
-                # Revert to AVAILABLE
-                equipment.status = Equipment.Status.AVAILABLE
-            elif txn.action == Transaction.Action.RETURN:
-                # Revert to BORROWED
-                equipment.status = Equipment.Status.BORROWED
 
-            equipment.save()
-            return txn
+def _latest_per_equipment(queryset):
+    """
+    Ids of the newest row of `queryset` for every equipment item.
+    """
+    latest = queryset.filter(equipment=OuterRef('pk')).order_by('-created_at', '-id')
+    # NULLs would turn NOT IN (...) into "unknown" for every row
+    return (
+        Equipment.objects.annotate(latest_id=Subquery(latest.values('pk')[:1]))
+        .filter(latest_id__isnull=False)
+        .values('latest_id')
+    )
+
+
+def archivable_transactions(cutoff):
+    """
+    Resolved transactions created before `cutoff`, excluding the rows the hot
+    paths still read: each equipment's newest transaction (current possession)
+    and newest completed borrow (return permission check).
+    """
+    completed_borrows = Transaction.objects.filter(
+        action=Transaction.Action.BORROW, status=Transaction.Status.COMPLETED
+    )
+    return (
+        Transaction.objects.filter(
+            status__in=[Transaction.Status.COMPLETED, Transaction.Status.REJECTED],
+            created_at__lt=cutoff,
+        )
+        .exclude(pk__in=_latest_per_equipment(Transaction.objects.all()))
+        .exclude(pk__in=_latest_per_equipment(completed_borrows))
+    )
+
+
+def archive_transactions(older_than=None, batch_size=None):
+    """
+    Moves archivable transactions into ArchivedTransaction in batches, each in
+    its own database transaction. Returns the number of rows moved.
+    """
+    if older_than is None:
+        older_than = timedelta(days=settings.TRANSACTION_ARCHIVE_AFTER_DAYS)
+    batch_size = batch_size or settings.TRANSACTION_ARCHIVE_BATCH_SIZE
+    cutoff = timezone.now() - older_than
+    columns = [
+        field.attname
+        for field in ArchivedTransaction._meta.concrete_fields
+        if field.name != 'archived_at'
+    ]
+
+    moved = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                archivable_transactions(cutoff)
+                .order_by('pk')
+                .values(*columns)[:batch_size]
+            )
+            if not rows:
+                return moved
+            ArchivedTransaction.objects.bulk_create(
+                ArchivedTransaction(**row) for row in rows
+            )
+            Transaction.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+        moved += len(rows)
@@ -0,0 +1,126 @@
+from dataclasses import dataclass
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from apps.common.exceptions import PreconditionFailed
+from apps.equipment import counters, sync
+from apps.equipment.models import Equipment
+
+from .models import Transaction
+
+# Retries when an unrelated edit bumps the version between read and update
+MAX_ATTEMPTS = 3
+
+Status = Equipment.Status
+Action = Transaction.Action
+
+
+class Phase:
+    """
+    Lifecycle step of a transaction that moves the equipment status.
+    """
+
+    REQUEST = 'REQUEST'
+    APPROVE = 'APPROVE'
+    REJECT = 'REJECT'
+    DIRECT = 'DIRECT'  # Completed immediately, e.g. edits through EquipmentViewSet
+
+
+@dataclass(frozen=True)
+class Transition:
+    sources: frozenset
+    target: str
+
+
+def _t(sources, target):
+    # Plain strings, so membership tests against raw column values are exact
+    return Transition(frozenset(str(s) for s in sources), str(target))
+
+
+# Equipment.Status x Transaction.Action: the only status changes the service
+# layer performs. Each entry is executed as a compare-and-swap UPDATE.
+TRANSITIONS = {
+    (Action.BORROW, Phase.REQUEST): _t([Status.AVAILABLE], Status.PENDING_BORROW),
+    (Action.BORROW, Phase.APPROVE): _t([Status.PENDING_BORROW], Status.BORROWED),
+    (Action.BORROW, Phase.REJECT): _t([Status.PENDING_BORROW], Status.AVAILABLE),
+    (Action.DISPATCH, Phase.REQUEST): _t([Status.AVAILABLE], Status.PENDING_BORROW),
+    (Action.DISPATCH, Phase.APPROVE): _t([Status.PENDING_BORROW], Status.DISPATCHED),
+    (Action.DISPATCH, Phase.REJECT): _t([Status.PENDING_BORROW], Status.AVAILABLE),
+    (Action.RETURN, Phase.REQUEST): _t([Status.BORROWED], Status.PENDING_RETURN),
+    (Action.RETURN, Phase.APPROVE): _t([Status.PENDING_RETURN], Status.AVAILABLE),
+    (Action.RETURN, Phase.REJECT): _t([Status.PENDING_RETURN], Status.BORROWED),
+    (Action.MOVE_START, Phase.DIRECT): _t(
+        [s for s in Status.values if s != Status.IN_TRANSIT], Status.IN_TRANSIT
+    ),
+    (Action.MOVE_CONFIRM, Phase.DIRECT): _t([Status.IN_TRANSIT], Status.AVAILABLE),
+}
+
+
+def get_transition(action, phase):
+    try:
+        return TRANSITIONS[(action, phase)]
+    except KeyError:
+        raise ValidationError(f'No transition defined for {action} ({phase})') from None
+
+
+def action_for_status_change(old_status, new_status):
+    """
+    Returns the Transaction.Action whose DIRECT transition covers
+    old_status -> new_status, or None if the change is not a tracked move.
+    """
+    for (action, phase), transition in TRANSITIONS.items():
+        if (
+            phase == Phase.DIRECT
+            and transition.target == new_status
+            and old_status in transition.sources
+        ):
+            return action
+    return None
+
+
+def apply_transition(equipment_uuid, action, phase, **changes):
+    """
+    Moves the equipment along the transition for (action, phase) with a
+    conditional UPDATE ... WHERE status IN (<sources>) AND version = <read>.
+
+    Extra field values in `changes` are written in the same statement.
+    Returns the updated equipment, or None if its status is not a valid
+    source (e.g. another request won the race). Raises Equipment.DoesNotExist
+    for unknown UUIDs and PreconditionFailed if unrelated edits keep changing
+    the version for MAX_ATTEMPTS reads.
+    """
+    transition = get_transition(action, phase)
+    for _ in range(MAX_ATTEMPTS):
+        equipment = Equipment.objects.get(uuid=equipment_uuid)
+        if equipment.status not in transition.sources:
+            return None
+
+        now = timezone.now()
+        with transaction.atomic():
+            updated = Equipment.objects.filter(
+                uuid=equipment_uuid,
+                status__in=transition.sources,
+                version=equipment.version,
+            ).update(
+                status=transition.target,
+                version=F('version') + 1,
+                updated_at=now,
+                **changes,
+            )
+            if not updated:
+                # Some other field changed in between; re-read and retry
+                continue
+
+            before = equipment.counter_key
+            equipment.status = transition.target
+            equipment.version += 1
+            equipment.updated_at = now
+            for field, value in changes.items():
+                setattr(equipment, field, value)
+            counters.record_change(before, equipment.counter_key)
+            sync.record(sync.EQUIPMENT, [equipment.pk])
+        return equipment
+    raise PreconditionFailed()
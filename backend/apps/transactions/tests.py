@@ -1,12 +1,32 @@
+import json
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test import LiveServerTestCase, TestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 
+from apps.common import queries
+from apps.common.exceptions import PreconditionFailed
 from apps.equipment.models import Category, Equipment
 from apps.locations.models import Location
 
-from .models import Transaction
+from .models import ArchivedTransaction, BorrowReminder, StreamEvent, Transaction
+from .reminders import send_borrow_reminders
+from .services import TransactionService, archive_transactions
+from .state_machine import Phase, action_for_status_change, apply_transition
 
 User = get_user_model()
 
@@ -185,3 +205,338 @@ class TransactionAPITests(TestCase):
         
         response = self.client.post(url, format='json')
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class TransactionStateMachineTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='sm_admin', email='sm_admin@test.com', password='password', role=User.Role.ADMIN)
+        self.user = User.objects.create_user(username='sm_user', email='sm_user@test.com', password='password')
+        self.equipment = Equipment.objects.create(name='Multimeter', status=Equipment.Status.AVAILABLE)
+
+    def test_transition_table_drives_edit_actions(self):
+        """測試狀態變更對應的動作由轉換表決定"""
+        self.assertEqual(action_for_status_change(Equipment.Status.AVAILABLE, Equipment.Status.IN_TRANSIT), Transaction.Action.MOVE_START)
+        self.assertEqual(action_for_status_change(Equipment.Status.IN_TRANSIT, Equipment.Status.AVAILABLE), Transaction.Action.MOVE_CONFIRM)
+        self.assertIsNone(action_for_status_change(Equipment.Status.AVAILABLE, Equipment.Status.LOST))
+
+    def test_conditional_update_rejects_stale_status(self):
+        """測試條件式更新在狀態不符時失敗且不寫入"""
+        self.assertIsNotNone(apply_transition(self.equipment.uuid, Transaction.Action.BORROW, Phase.REQUEST))
+        self.assertIsNone(apply_transition(self.equipment.uuid, Transaction.Action.BORROW, Phase.REQUEST))
+        self.equipment.refresh_from_db()
+        self.assertEqual(self.equipment.status, Equipment.Status.PENDING_BORROW)
+
+    def test_lost_version_race_is_a_conflict_not_invalid_status(self):
+        """測試無關的修改持續搶先更新版本時回報衝突，而非狀態不符"""
+        get = Equipment.objects.get
+
+        def read_then_concurrent_edit(**kwargs):
+            equipment = get(**kwargs)
+            Equipment.objects.filter(pk=equipment.pk).update(version=F('version') + 1, name='Renamed')
+            return equipment
+
+        with mock.patch.object(Equipment.objects, 'get', side_effect=read_then_concurrent_edit), self.assertRaises(PreconditionFailed):
+            TransactionService.create_borrow_request(self.user, self.equipment.uuid)
+        self.equipment.refresh_from_db()
+        self.assertEqual(self.equipment.status, Equipment.Status.AVAILABLE)
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_second_borrow_request_fails(self):
+        """測試同一設備第二次借用申請失敗"""
+        TransactionService.create_borrow_request(self.user, self.equipment.uuid)
+        with self.assertRaises(ValidationError):
+            TransactionService.create_borrow_request(self.admin, self.equipment.uuid)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_approve_rolls_back_when_equipment_status_changed(self):
+        """測試設備狀態已被改動時核准失敗並回滾"""
+        txn = TransactionService.create_borrow_request(self.user, self.equipment.uuid)
+        Equipment.objects.filter(pk=self.equipment.pk).update(status=Equipment.Status.MAINTENANCE)
+
+        with self.assertRaises(ValidationError):
+            TransactionService.approve_transaction(self.admin, txn.id)
+
+        txn.refresh_from_db()
+        self.assertEqual(txn.status, Transaction.Status.PENDING_APPROVAL)
+
+    def test_pending_request_stays_rejectable_after_equipment_moves_on(self):
+        """測試申請待審期間設備被改為遺失時，核准失敗但仍可拒絕結案"""
+        txn = TransactionService.create_borrow_request(self.user, self.equipment.uuid)
+        client = APIClient()
+        client.force_authenticate(user=self.admin)
+        response = client.patch(f'/api/v1/equipment/{self.equipment.uuid}/', {'status': Equipment.Status.LOST}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertRaisesMessage(ValidationError, 'Equipment is LOST'):
+            TransactionService.approve_transaction(self.admin, txn.id)
+        txn.refresh_from_db()
+        self.assertEqual(txn.status, Transaction.Status.PENDING_APPROVAL)
+
+        TransactionService.reject_transaction(self.admin, txn.id, 'Lost meanwhile')
+        txn.refresh_from_db()
+        self.assertEqual((txn.status, txn.admin_note), (Transaction.Status.REJECTED, 'Lost meanwhile'))
+        self.equipment.refresh_from_db()
+        self.assertEqual(self.equipment.status, Equipment.Status.LOST)
+
+    def test_transaction_cannot_be_resolved_twice(self):
+        """測試同一申請不可重複審核"""
+        txn = TransactionService.create_borrow_request(self.user, self.equipment.uuid)
+        TransactionService.approve_transaction(self.admin, txn.id)
+        with self.assertRaises(ValidationError):
+            TransactionService.reject_transaction(self.admin, txn.id)
+        self.equipment.refresh_from_db()
+        self.assertEqual(self.equipment.status, Equipment.Status.BORROWED)
+
+
+class TransactionListQueryBudgetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(username='qb_admin', email='qb_admin@test.com', password='password', role=User.Role.ADMIN)
+        self.users = [
+            User.objects.create_user(username=f'qb_user{i}', email=f'qb_user{i}@test.com', password='password')
+            for i in range(5)
+        ]
+        root = Location.objects.create(name='Campus')
+        building = Location.objects.create(name='Building', parent=root)
+        self.locations = [Location.objects.create(name=f'Room {i}', parent=building) for i in range(3)]
+        category = Category.objects.create(name='Scopes')
+        self.equipment = [
+            Equipment.objects.create(name=f'Scope {i}', category=category, location=self.locations[i % 3], target_location=root)
+            for i in range(20)
+        ]
+        self.client.force_authenticate(user=self.admin)
+
+    def _add_transactions(self, count):
+        Transaction.objects.bulk_create(
+            Transaction(
+                equipment=self.equipment[i % len(self.equipment)],
+                user=self.users[i % len(self.users)],
+                admin_verifier=self.admin,
+                action=Transaction.Action.BORROW,
+                status=Transaction.Status.COMPLETED,
+                location=self.locations[i % 3],
+            )
+            for i in range(count)
+        )
+
+    def _list_query_count(self, page_size):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/v1/transactions/', {'page_size': page_size})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), page_size)
+        return len(ctx)
+
+    def test_list_query_count_is_independent_of_page_size(self):
+        """測試交易列表查詢數不隨頁面大小增加"""
+        self._add_transactions(1000)
+        counts = {size: self._list_query_count(size) for size in (10, 100, 1000)}
+        self.assertEqual(counts[10], counts[100])
+        self.assertEqual(counts[10], counts[1000])
+        self.assertLessEqual(counts[10], 6)
+
+    def test_list_reports_current_possession(self):
+        """測試預先載入的最新交易仍正確回傳持有者"""
+        self._add_transactions(1)
+        response = self.client.get('/api/v1/transactions/')
+        row = response.data['results'][0]
+        self.assertEqual(row['equipment_detail']['current_possession']['username'], self.users[0].username)
+        self.assertEqual(row['location_details']['full_path'], 'Campus > Building > Room 0')
+
+
+class TransactionArchiveTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(username='ar_admin', email='ar_admin@test.com', password='password', role=User.Role.ADMIN)
+        self.user = User.objects.create_user(username='ar_user', email='ar_user@test.com', password='password')
+        self.equipment = Equipment.objects.create(name='Archived Scope', status=Equipment.Status.BORROWED)
+
+    def _create(self, action, txn_status, days_ago):
+        txn = Transaction.objects.create(equipment=self.equipment, user=self.user, action=action, status=txn_status)
+        Transaction.objects.filter(pk=txn.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        return txn
+
+    def test_archive_moves_old_resolved_transactions(self):
+        """測試封存舊交易並保留仍需使用的最新借用紀錄"""
+        old_move = self._create(Transaction.Action.MOVE_CONFIRM, Transaction.Status.COMPLETED, 800)
+        old_reject = self._create(Transaction.Action.BORROW, Transaction.Status.REJECTED, 700)
+        active_borrow = self._create(Transaction.Action.BORROW, Transaction.Status.COMPLETED, 600)
+        pending = self._create(Transaction.Action.RETURN, Transaction.Status.PENDING_APPROVAL, 500)
+
+        moved = archive_transactions(older_than=timedelta(days=365), batch_size=1)
+
+        self.assertEqual(moved, 2)
+        self.assertEqual(set(ArchivedTransaction.objects.values_list('id', flat=True)), {old_move.id, old_reject.id})
+        self.assertEqual(set(Transaction.objects.values_list('id', flat=True)), {active_borrow.id, pending.id})
+
+        # 歸還檢查仍可找到最新借用紀錄
+        Equipment.objects.filter(pk=self.equipment.pk).update(status=Equipment.Status.PENDING_RETURN)
+        TransactionService.reject_transaction(self.admin, pending.id)
+        txn = TransactionService.create_return_request(self.user, self.equipment.uuid)
+        self.assertEqual(txn.status, Transaction.Status.PENDING_APPROVAL)
+
+    def test_archived_transactions_remain_visible(self):
+        """測試封存後歷史紀錄與列表仍可查詢"""
+        old_move = self._create(Transaction.Action.MOVE_CONFIRM, Transaction.Status.COMPLETED, 800)
+        self._create(Transaction.Action.BORROW, Transaction.Status.COMPLETED, 10)
+        call_command('archive_transactions', days=365, stdout=StringIO())
+        self.assertTrue(ArchivedTransaction.objects.filter(pk=old_move.pk).exists())
+
+        self.client.force_authenticate(user=self.admin)
+        history = self.client.get(f'/api/v1/equipment/{self.equipment.uuid}/history/')
+        self.assertEqual(len(history.data['results']), 2)
+
+        listing = self.client.get('/api/v1/transactions/', {'status': 'COMPLETED'})
+        self.assertIn(old_move.id, [row['id'] for row in listing.data['results']])
+
+        detail = self.client.get(f'/api/v1/transactions/{old_move.id}/')
+        self.assertEqual(detail.status_code, status.HTTP_200_OK)
+
+
+class BorrowReminderTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='rm_user', email='rm_user@test.com', password='password')
+        self.other = User.objects.create_user(username='rm_other', email='rm_other@test.com', password='password')
+        self.now = timezone.now()
+
+    def _borrow(self, user, name, due_in, equipment_status=Equipment.Status.BORROWED):
+        equipment = Equipment.objects.create(name=name, status=equipment_status)
+        return Transaction.objects.create(
+            equipment=equipment,
+            user=user,
+            action=Transaction.Action.BORROW,
+            status=Transaction.Status.COMPLETED,
+            due_date=self.now + due_in,
+        )
+
+    def test_one_digest_per_user_and_idempotent_reruns(self):
+        """測試每位使用者只收到一封摘要信，重複執行不會重寄"""
+        overdue = self._borrow(self.user, 'Overdue Drill', timedelta(days=-2))
+        due_soon = self._borrow(self.user, 'Soon Saw', timedelta(hours=3))
+        self._borrow(self.user, 'Later Ladder', timedelta(days=7))
+        self._borrow(self.user, 'Returned Rope', timedelta(days=-5), Equipment.Status.AVAILABLE)
+        self._borrow(self.other, 'Other Oscilloscope', timedelta(days=-1))
+
+        stats = send_borrow_reminders(now=self.now, due_soon=timedelta(hours=24))
+
+        self.assertEqual(stats, {'users': 2, 'reminders': 3, 'skipped': 0})
+        self.assertEqual(len(mail.outbox), 2)
+        digest = next(m for m in mail.outbox if m.to == ['rm_user@test.com'])
+        self.assertIn('Overdue Drill', digest.body)
+        self.assertIn('Soon Saw', digest.body)
+        self.assertNotIn('Later Ladder', digest.body)
+        self.assertNotIn('Returned Rope', digest.body)
+        self.assertEqual(
+            dict(BorrowReminder.objects.filter(transaction__user=self.user).values_list('transaction_id', 'kind')),
+            {overdue.id: BorrowReminder.Kind.OVERDUE, due_soon.id: BorrowReminder.Kind.DUE_SOON},
+        )
+
+        # 再次執行不寄送任何信件
+        self.assertEqual(send_borrow_reminders(now=self.now)['reminders'], 0)
+        self.assertEqual(len(mail.outbox), 2)
+
+        # 即將到期的借用逾期後再提醒一次
+        later = self.now + timedelta(hours=4)
+        self.assertEqual(send_borrow_reminders(now=later, due_soon=timedelta(0))['reminders'], 1)
+        self.assertIn('overdue', mail.outbox[-1].body)
+
+    def test_extended_due_date_is_reminded_again(self):
+        """測試延長到期日後可再次提醒"""
+        borrow = self._borrow(self.user, 'Extended Tripod', timedelta(days=-1))
+        send_borrow_reminders(now=self.now)
+        Transaction.objects.filter(pk=borrow.pk).update(due_date=self.now + timedelta(hours=1))
+
+        call_command('send_borrow_reminders', stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(BorrowReminder.objects.filter(transaction=borrow).count(), 2)
+
+
+@override_settings(EVENT_STREAM_MAX_SECONDS=0)
+class EventStreamTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.manager = User.objects.create_user(username='ev_manager', email='ev_manager@test.com', password='password', role=User.Role.MANAGER)
+        self.user = User.objects.create_user(username='ev_user', email='ev_user@test.com', password='password')
+        self.other = User.objects.create_user(username='ev_other', email='ev_other@test.com', password='password')
+        self.equipment = Equipment.objects.create(name='Streamed Camera', status=Equipment.Status.AVAILABLE)
+
+    def _read(self, user, **params):
+        self.client.force_authenticate(user=user)
+        response = self.client.get('/api/v1/events/', params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return b''.join(response.streaming_content).decode()
+
+    def test_service_calls_publish_events_after_commit(self):
+        """測試借用與核准流程會在提交後發佈事件"""
+        with self.captureOnCommitCallbacks(execute=True):
+            txn = TransactionService.create_borrow_request(self.user, self.equipment.uuid)
+        with self.captureOnCommitCallbacks(execute=True):
+            TransactionService.approve_transaction(self.manager, txn.id)
+
+        self.assertEqual(
+            list(StreamEvent.objects.order_by('id').values_list('kind', flat=True)),
+            ['equipment.status', 'transaction.created', 'equipment.status', 'transaction.approved'],
+        )
+        body = self._read(self.manager, last_event_id=0)
+        self.assertIn('event: transaction.approved', body)
+        self.assertIn('"status":"BORROWED"', body)
+
+        # 失敗的請求會回滾，不發佈任何事件
+        with self.captureOnCommitCallbacks(execute=True), self.assertRaises(ValidationError):
+            TransactionService.create_borrow_request(self.other, self.equipment.uuid)
+        self.assertEqual(StreamEvent.objects.count(), 4)
+
+    def test_stream_filters_events_per_user_and_resumes(self):
+        """測試一般使用者只收到自己的交易事件，並可從 Last-Event-ID 續傳"""
+        with self.captureOnCommitCallbacks(execute=True):
+            mine = TransactionService.create_borrow_request(self.user, self.equipment.uuid)
+        other_equipment = Equipment.objects.create(name='Other Camera', status=Equipment.Status.AVAILABLE)
+        with self.captureOnCommitCallbacks(execute=True):
+            theirs = TransactionService.create_borrow_request(self.other, other_equipment.uuid)
+
+        body = self._read(self.user, last_event_id=0)
+        self.assertIn(f'"id":{mine.id}', body)
+        self.assertNotIn(f'"id":{theirs.id}', body)
+        self.assertIn(str(other_equipment.uuid), body)
+
+        last_id = StreamEvent.objects.latest('id').id
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.get('/api/v1/events/', HTTP_LAST_EVENT_ID=str(last_id))
+        self.assertNotIn('event:', b''.join(response.streaming_content).decode())
+
+    def test_stream_accepts_token_query_parameter(self):
+        """測試 EventSource 可透過 access_token 參數驗證"""
+        token = str(AccessToken.for_user(self.user))
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get('/api/v1/events/').status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.get('/api/v1/events/', {'access_token': token}, HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+# 記憶體 SQLite 的 live server 各執行緒共用同一連線，查詢檢查會把並行請求的查詢算在一起
+@tag('slow')
+@override_settings(SYNC_SAFETY_LAG_SECONDS=0, QUERY_INSPECTOR=queries.OFF)
+class LoadTestHarnessTests(LiveServerTestCase):
+    def test_workflow_against_live_server(self):
+        """測試負載測試腳本對實際伺服器執行掃描、借用、核准與歸還並更新 token"""
+        call_command('generate_test_data', '--equipment', '30', '--users', '6', '--managers', '2', '--transactions-per-item', '1', stdout=StringIO())
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / 'load.json'
+            call_command(
+                'benchmark_load', '--url', self.live_server_url, '--users', '4', '--managers', '1',
+                '--accounts', '6', '--manager-accounts', '2', '--duration', '4', '--ramp-up', '0.5',
+                '--think-ms', '20', '--borrow-share', '1', '--return-share', '1', '--refresh-after', '1',
+                '--output', str(output), stdout=StringIO(),
+            )
+            report = json.loads(output.read_text())
+        operations = report['operations']
+        self.assertGreater(report['requests'], 20)
+        self.assertEqual(operations['token']['requests'], 5)
+        self.assertGreater(report['events']['token_refreshes'], 0)
+        self.assertEqual(operations['scan']['errors'], 0)
+        self.assertGreater(operations['borrow']['requests'], 0)
+        self.assertIn('pending_list', operations)
+        for name in ('p50_ms', 'p95_ms', 'p99_ms'):
+            self.assertIn(name, operations['scan'])
+        self.assertLessEqual(report['conflict_rate'], 1)
@@ -1,11 +1,12 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import TransactionViewSet
+from .views import EventStreamView, TransactionViewSet
 
 router = DefaultRouter()
 router.register(r'transactions', TransactionViewSet)
 
 urlpatterns = [
+    path('events/', EventStreamView.as_view(), name='event-stream'),
     path('', include(router.urls)),
 ]
@@ -1,26 +1,61 @@
+import json
+
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
+from apps.common import uploads
+from apps.common.pagination import LargePageNumberPagination
 from apps.equipment.models import Equipment
+from apps.equipment.serializers import EquipmentSerializer
+from apps.locations.services import get_location_context
+from apps.users.authentication import QueryParamJWTAuthentication
 from apps.users.permissions import IsManagerOrAdmin
 
-from .models import Transaction
+from . import events
+from .models import Transaction, TransactionLog
 from .serializers import TransactionSerializer
 from .services import TransactionService
 
 
+def transaction_data(txn):
+    # Location paths from one read of the tree instead of walking each parent
+    return TransactionSerializer(txn, context=get_location_context()).data
+
+
 class TransactionViewSet(viewsets.ModelViewSet):
     queryset = Transaction.objects.all()
     serializer_class = TransactionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = LargePageNumberPagination
+    # Queries per request (apps.common.queries), independent of page size.
+    # bulk_approve runs the single-approval path once per id.
+    query_budgets = {'list': 8, 'retrieve': 8, 'bulk_approve': None}
 
     def get_queryset(self):
-        queryset = Transaction.objects.all().order_by('-created_at')
         status_param = self.request.query_params.get('status')
         action_param = self.request.query_params.get('action')
 
+        queryset = Transaction.objects.all().order_by('-created_at')
+        if self.action in ('list', 'retrieve'):
+            # Reads include archived rows, except the approval queue: pending
+            # transactions are never archived, so the hot table is exact there
+            if status_param != Transaction.Status.PENDING_APPROVAL:
+                queryset = TransactionLog.objects.all().order_by('-created_at')
+            # Everything TransactionSerializer (and its nested EquipmentSerializer)
+            # reads, so a page costs the same number of queries at any size
+            queryset = EquipmentSerializer.setup_eager_loading(
+                queryset.select_related(
+                    'user', 'admin_verifier', 'location', 'equipment'
+                ),
+                prefix='equipment__',
+            )
+
         if status_param:
             queryset = queryset.filter(status=status_param)
         if action_param:
@@ -28,6 +63,12 @@ class TransactionViewSet(viewsets.ModelViewSet):
 
         return queryset
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ('list', 'retrieve'):
+            context.update(get_location_context())
+        return context
+
     @action(detail=False, methods=['post'])
     def borrow(self, request):
         equipment_uuid = request.data.get('equipment_uuid')
@@ -43,9 +84,7 @@ class TransactionViewSet(viewsets.ModelViewSet):
                 reason=request.data.get('reason', ''),
                 image=request.data.get('image'),
             )
-            return Response(
-                TransactionSerializer(txn).data, status=status.HTTP_201_CREATED
-            )
+            return Response(transaction_data(txn), status=status.HTTP_201_CREATED)
         except Equipment.DoesNotExist:
             raise ValidationError('Equipment not found') from None
 
@@ -65,7 +104,7 @@ class TransactionViewSet(viewsets.ModelViewSet):
             transaction_id=pk,
             admin_note=request.data.get('admin_note', ''),
         )
-        return Response(TransactionSerializer(updated_txn).data)
+        return Response(transaction_data(updated_txn))
 
     @action(
         detail=True,
@@ -83,7 +122,7 @@ class TransactionViewSet(viewsets.ModelViewSet):
             transaction_id=pk,
             rejection_reason=request.data.get('rejection_reason', 'Rejected'),
         )
-        return Response(TransactionSerializer(updated_txn).data)
+        return Response(transaction_data(updated_txn))
 
     @action(detail=False, methods=['post'], url_path='dispatch')
     def dispatch_item(self, request):
@@ -99,9 +138,7 @@ class TransactionViewSet(viewsets.ModelViewSet):
                 reason=request.data.get('reason', ''),
                 image=request.data.get('image'),
             )
-            return Response(
-                TransactionSerializer(txn).data, status=status.HTTP_201_CREATED
-            )
+            return Response(transaction_data(txn), status=status.HTTP_201_CREATED)
         except Equipment.DoesNotExist:
             raise ValidationError('Equipment not found') from None
 
@@ -121,7 +158,7 @@ class TransactionViewSet(viewsets.ModelViewSet):
             transaction_id=pk,
             admin_note=request.data.get('admin_note', ''),
         )
-        return Response(TransactionSerializer(updated_txn).data)
+        return Response(transaction_data(updated_txn))
 
     @action(
         detail=True,
@@ -139,7 +176,7 @@ class TransactionViewSet(viewsets.ModelViewSet):
             transaction_id=pk,
             rejection_reason=request.data.get('rejection_reason', 'Rejected'),
         )
-        return Response(TransactionSerializer(updated_txn).data)
+        return Response(transaction_data(updated_txn))
 
     @action(detail=False, methods=['post'], url_path='return-request')
     def return_request(self, request):
@@ -152,12 +189,30 @@ class TransactionViewSet(viewsets.ModelViewSet):
             txn = TransactionService.create_return_request(
                 user=request.user, equipment_uuid=equipment_uuid
             )
-            return Response(
-                TransactionSerializer(txn).data, status=status.HTTP_201_CREATED
-            )
+            return Response(transaction_data(txn), status=status.HTTP_201_CREATED)
         except Equipment.DoesNotExist:
             raise ValidationError('Equipment not found') from None
 
+    @action(detail=True, methods=['post'])
+    def image(self, request, pk=None):  # noqa: ARG002
+        """
+        Finalizes a direct upload (POST /uploads/, target `transaction_image`)
+        as the photo of the requester's own transaction.
+        """
+        txn = self.get_object()
+        if txn.user_id != request.user.pk and not IsManagerOrAdmin().has_permission(
+            request, self
+        ):
+            raise PermissionDenied()
+
+        txn.image = uploads.claim_upload(
+            request.data.get('upload_token'), 'transaction_image', request.user
+        )
+        with transaction.atomic():
+            txn.save(update_fields=['image', 'updated_at'])
+            uploads.enqueue_processing(txn, 'image')
+        return Response(transaction_data(txn))
+
     @action(
         detail=True,
         methods=['post'],
@@ -181,7 +236,7 @@ class TransactionViewSet(viewsets.ModelViewSet):
             transaction_id=pk,
             new_location_data=new_location_data,
         )
-        return Response(TransactionSerializer(updated_txn).data)
+        return Response(transaction_data(updated_txn))
 
     @action(
         detail=True,
@@ -195,7 +250,7 @@ class TransactionViewSet(viewsets.ModelViewSet):
             transaction_id=pk,
             rejection_reason=request.data.get('rejection_reason', 'Rejected'),
         )
-        return Response(TransactionSerializer(updated_txn).data)
+        return Response(transaction_data(updated_txn))
 
     @action(
         detail=False,
@@ -224,3 +279,43 @@ class TransactionViewSet(viewsets.ModelViewSet):
                 results['failed'].append({'id': txn_id, 'error': str(e)})
 
         return Response(results)
+
+
+class EventStreamRenderer(BaseRenderer):
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):  # noqa: ARG002
+        # Only reached for error responses; the stream itself bypasses renderers
+        return f'event: error\ndata: {json.dumps(data)}\n\n'.encode()
+
+
+class EventStreamView(APIView):
+    """
+    Server-Sent Events feed of transaction and equipment status changes.
+
+    Resumes after the `Last-Event-ID` header (or `?last_event_id=`); without
+    one, only events published after connecting are sent.
+    """
+
+    authentication_classes = [QueryParamJWTAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+
+    def get(self, request):
+        last_id = request.headers.get('Last-Event-ID') or request.query_params.get(
+            'last_event_id'
+        )
+        try:
+            last_id = int(last_id)
+        except (TypeError, ValueError):
+            last_id = events.latest_event_id()
+        events.prune_events()
+
+        response = StreamingHttpResponse(
+            events.stream(request.user, last_id), content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Disable proxy buffering (nginx) so events are delivered immediately
+        response['X-Accel-Buffering'] = 'no'
+        return response
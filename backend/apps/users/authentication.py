@@ -0,0 +1,141 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+# What authentication, the permission classes and UserSerializer read. The
+# password hash stays out of the cache (only its md5, which the revoke check
+# compares against the token claim); other fields load lazily when accessed.
+CACHED_FIELDS = (
+    'id',
+    'username',
+    'email',
+    'first_name',
+    'last_name',
+    'avatar_url',
+    'role',
+    'is_active',
+    'is_staff',
+    'is_superuser',
+)
+
+
+def user_cache_key(user_id):
+    return f'auth_user:{user_id}'
+
+
+def invalidate_user(user_id):
+    cache.delete(user_cache_key(user_id))
+
+
+def _cache_entry(user):
+    entry = {field: getattr(user, field) for field in CACHED_FIELDS}
+    entry['password_md5'] = get_md5_hash_password(user.password)
+    return entry
+
+
+def _user_from_entry(model, entry):
+    # As if loaded with .only(*CACHED_FIELDS): the rest are deferred
+    names = [f.attname for f in model._meta.concrete_fields if f.attname in entry]
+    return model.from_db(
+        router.db_for_read(model), names, [entry[name] for name in names]
+    )
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that keeps the token's user in the cache for
+    AUTH_USER_CACHE_TIMEOUT seconds instead of loading it on every request.
+    Only CACHED_FIELDS are stored, never the password hash. Saving or
+    deleting a user drops the entry (see signals.py); with the default
+    per-process LocMemCache other workers catch up within the timeout, with
+    a shared cache immediately.
+    """
+
+    def check_user(self, user, validated_token, password_md5):
+        # The same checks JWTAuthentication runs on a freshly loaded user
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        if (
+            api_settings.CHECK_REVOKE_TOKEN
+            and validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != password_md5
+        ):
+            raise AuthenticationFailed(
+                "The user's password has been changed.", code='password_changed'
+            )
+
+    def _cached_user(self, entry, validated_token):
+        user = _user_from_entry(self.user_model, entry)
+        self.check_user(user, validated_token, entry['password_md5'])
+        return user
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+
+        key = user_cache_key(user_id)
+        entry = cache.get(key)
+        if entry is None:
+            user = super().get_user(validated_token)
+            cache.set(key, _cache_entry(user), settings.AUTH_USER_CACHE_TIMEOUT)
+            return user
+        return self._cached_user(entry, validated_token)
+
+    async def aget_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        key = user_cache_key(user_id)
+        entry = await cache.aget(key)
+        if entry is None:
+            try:
+                user = await self.user_model.objects.aget(
+                    **{api_settings.USER_ID_FIELD: user_id}
+                )
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(
+                    'User not found', code='user_not_found'
+                ) from e
+            entry = _cache_entry(user)
+            self.check_user(user, validated_token, entry['password_md5'])
+            await cache.aset(key, entry, settings.AUTH_USER_CACHE_TIMEOUT)
+            return user
+        return self._cached_user(entry, validated_token)
+
+    async def aauthenticate(self, request):
+        """
+        authenticate() for plain async Django views (a Django HttpRequest,
+        not a DRF Request). Token parsing involves no I/O; only the user
+        lookup is awaited.
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+
+class QueryParamJWTAuthentication(CachedJWTAuthentication):
+    """
+    Accepts the access token from `?access_token=` when no Authorization
+    header is sent. Only for endpoints consumed by the browser EventSource
+    API, which cannot set request headers; keep access tokens short-lived
+    since query strings can end up in proxy logs.
+    """
+
+    def authenticate(self, request):
+        if self.get_header(request) is not None:
+            return super().authenticate(request)
+        raw_token = request.query_params.get('access_token')
+        if not raw_token:
+            return None
+        validated_token = self.get_validated_token(raw_token.encode())
+        return self.get_user(validated_token), validated_token
@@ -0,0 +1,142 @@
+"""
+Google ID-token verification with a cached certificate set.
+
+google.oauth2.id_token.verify_oauth2_token downloads Google's signing
+certificates on every call. Here they are kept per process for as long as
+the response's Cache-Control max-age allows, refreshed in a background
+thread shortly before that, and re-fetched at once when a token names a key
+id the cached set does not have yet (key rotation).
+
+GOOGLE_CERTS_URL may also be a local file path holding the same
+``{"key id": "PEM certificate"}`` JSON, for tests and offline setups.
+"""
+
+import base64
+import json
+import re
+import threading
+import time
+from pathlib import Path
+
+import requests
+from django.conf import settings
+from google.auth import jwt
+
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+MAX_AGE_PATTERN = re.compile(r'max-age=(\d+)')
+
+# Refresh in the background once less than this share of max-age is left
+REFRESH_MARGIN = 0.1
+# Unknown key ids trigger at most one fetch per this many seconds
+MIN_FETCH_INTERVAL = 30
+
+
+class CertificateStore:
+    def __init__(self, url):
+        self.url = url
+        self.certs = {}
+        self.expires_at = 0.0
+        self.refresh_at = 0.0
+        self.fetched_at = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def _download(self):
+        if not self.url.startswith(('http://', 'https://')):
+            certs = json.loads(Path(self.url).read_text())
+            return certs, settings.GOOGLE_CERTS_DEFAULT_MAX_AGE
+        response = requests.get(self.url, timeout=settings.GOOGLE_CERTS_TIMEOUT)
+        response.raise_for_status()
+        match = MAX_AGE_PATTERN.search(response.headers.get('Cache-Control', ''))
+        max_age = (
+            int(match.group(1)) if match else settings.GOOGLE_CERTS_DEFAULT_MAX_AGE
+        )
+        return response.json(), max_age
+
+    def fetch(self):
+        certs, max_age = self._download()
+        now = time.monotonic()
+        with self._lock:
+            self.certs = certs
+            self.fetched_at = now
+            self.expires_at = now + max_age
+            self.refresh_at = self.expires_at - max_age * REFRESH_MARGIN
+        return certs
+
+    def _refresh_in_background(self):
+        def run():
+            try:
+                self.fetch()
+            except (requests.RequestException, ValueError, OSError):
+                # Keep serving the current set; the next expiry retries
+                pass
+            finally:
+                self._refreshing = False
+
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=run, daemon=True).start()
+
+    def get(self, key_id=None):
+        now = time.monotonic()
+        if now >= self.expires_at:
+            return self.fetch()
+        if now >= self.refresh_at:
+            self._refresh_in_background()
+        if (
+            key_id is not None
+            and key_id not in self.certs
+            and now - self.fetched_at >= MIN_FETCH_INTERVAL
+        ):
+            return self.fetch()
+        return self.certs
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def certificate_store():
+    url = settings.GOOGLE_CERTS_URL
+    with _stores_lock:
+        if url not in _stores:
+            _stores[url] = CertificateStore(url)
+        return _stores[url]
+
+
+def _key_id(token):
+    header = token.split('.', 1)[0]
+    try:
+        data = base64.urlsafe_b64decode(header + '=' * (-len(header) % 4))
+        return json.loads(data).get('kid')
+    except ValueError as e:
+        raise ValueError('Malformed token header') from e
+
+
+def verify_id_token(token):
+    """
+    Decoded claims of a Google ID token issued for one of GOOGLE_CLIENT_IDS.
+    Raises ValueError if the token is invalid, expired, for another audience
+    or from another issuer, or if no client id is configured.
+    """
+    audience = settings.GOOGLE_CLIENT_IDS
+    if not audience:
+        raise ValueError('GOOGLE_CLIENT_IDS is not configured')
+    if isinstance(token, bytes):
+        token = token.decode()
+
+    try:
+        certs = certificate_store().get(_key_id(token))
+    except (requests.RequestException, OSError) as e:
+        raise ValueError(f'Could not load Google certificates: {e}') from e
+    claims = jwt.decode(
+        token,
+        certs=certs,
+        audience=audience,
+        clock_skew_in_seconds=settings.GOOGLE_CLOCK_SKEW_SECONDS,
+    )
+    if claims.get('iss') not in GOOGLE_ISSUERS:
+        raise ValueError(f'Wrong issuer: {claims.get("iss")}')
+    return claims
@@ -1,8 +1,26 @@
+import json
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest import mock
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
 from django.contrib.auth import get_user_model
-from django.db import IntegrityError
-from django.test import TestCase
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.test import RequestFactory, TestCase, override_settings
+from google.auth import crypt, jwt
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import google
+from .authentication import CachedJWTAuthentication, user_cache_key
 
 User = get_user_model()
 
@@ -69,3 +87,129 @@ class UserAPITests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.user.refresh_from_db()
         self.assertEqual(self.user.role, 'ADMIN')
+
+
+class CachedAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user(username='auth_admin', email='auth_admin@test.com', password='password', role=User.Role.ADMIN)
+        self.user = User.objects.create_user(username='auth_user', email='auth_user@test.com', password='password')
+        self.client = APIClient()
+        self.admin_client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.admin_client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.admin)}')
+
+    def _me(self):
+        return self.client.get('/api/v1/users/me/')
+
+    def test_cached_user_saves_a_query(self):
+        """測試快取命中時不再查詢使用者"""
+        with CaptureQueriesContext(connection) as first:
+            self.assertEqual(self._me().status_code, status.HTTP_200_OK)
+        with CaptureQueriesContext(connection) as second:
+            self.assertEqual(self._me().status_code, status.HTTP_200_OK)
+        self.assertEqual(len(first), 1)
+        self.assertEqual(len(second), 0)
+
+    def test_role_change_and_deactivation_invalidate(self):
+        """測試修改角色或停用帳號後快取立即失效"""
+        self.assertEqual(self._me().data['role'], User.Role.USER)
+
+        response = self.admin_client.patch(f'/api/v1/users/{self.user.id}/', {'role': User.Role.MANAGER}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._me().data['role'], User.Role.MANAGER)
+
+        self.user.refresh_from_db()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self._me().status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_hash_is_not_cached(self):
+        """測試快取只存認證所需欄位，不含密碼雜湊"""
+        self.assertEqual(self._me().status_code, status.HTTP_200_OK)
+        entry = cache.get(user_cache_key(self.user.id))
+        self.assertNotIn('password', entry)
+        self.assertNotIn(self.user.password, entry.values())
+        self.assertEqual(entry['role'], User.Role.USER)
+
+        user, _token = CachedJWTAuthentication().authenticate(RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}'))
+        self.assertEqual((user.pk, user.role), (self.user.pk, User.Role.USER))
+        self.assertIn('password', user.get_deferred_fields())
+
+
+def _signing_key(key_id):
+    """本機替代 Google 憑證：自簽 RSA 憑證與對應的簽章器"""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, key_id)])
+    now = datetime.now(timezone.utc)
+    cert = (
+        x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+        .serial_number(x509.random_serial_number()).not_valid_before(now).not_valid_after(now + timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    return crypt.RSASigner.from_string(pem, key_id=key_id), cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+class GoogleLoginTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.signer, cert = _signing_key('test-key')
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.certs_path = str(Path(cls.tmp.name) / 'certs.json')
+        Path(cls.certs_path).write_text(json.dumps({'test-key': cert}))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+        super().tearDownClass()
+
+    def setUp(self):
+        google._stores.clear()
+        self.client = APIClient()
+        settings_override = override_settings(GOOGLE_CERTS_URL=self.certs_path, GOOGLE_CLIENT_IDS=['test-client'])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _token(self, email, **claims):
+        now = int(time.time())
+        payload = {'iss': 'https://accounts.google.com', 'aud': 'test-client', 'iat': now, 'exp': now + 600, 'email': email, 'email_verified': True, **claims}
+        return jwt.encode(self.signer, payload).decode()
+
+    def _login(self, token):
+        return self.client.post('/api/v1/auth/google/', {'token': token}, format='json')
+
+    def test_login_creates_users_without_refetching_certs(self):
+        """測試 Google 登入建立帳號、使用者名稱衝突時加上後綴，且憑證只讀取一次"""
+        User.objects.create_user(username='jane', email='jane@other.com', password='password')
+        with mock.patch.object(google.CertificateStore, '_download', autospec=True, side_effect=google.CertificateStore._download) as download:
+            first = self._login(self._token('jane@example.com'))
+            again = self._login(self._token('jane@example.com'))
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertRegex(first.data['user']['username'], r'^jane_[0-9a-f]{6}$')
+        self.assertEqual(again.data['user']['id'], first.data['user']['id'])
+        self.assertEqual(download.call_count, 1)
+        self.assertFalse(User.objects.get(email='jane@example.com').has_usable_password())
+
+    def test_rejects_wrong_audience_issuer_and_unverified_email(self):
+        """測試拒絕錯誤的 audience、issuer 與未驗證的 email"""
+        self.assertEqual(self._login(self._token('a@example.com', aud='other-client')).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._login(self._token('a@example.com', iss='https://evil.example.com')).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self._login(self._token('a@example.com', email_verified=False)).status_code, status.HTTP_400_BAD_REQUEST)
+        with override_settings(GOOGLE_CLIENT_IDS=[]):
+            self.assertEqual(self._login(self._token('a@example.com')).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(User.objects.filter(email='a@example.com').exists())
+
+    def test_certificate_cache_honors_max_age(self):
+        """測試憑證依 Cache-Control max-age 快取"""
+        response = mock.Mock(headers={'Cache-Control': 'public, max-age=120, must-revalidate'})
+        response.json.return_value = {'k1': 'cert'}
+        store = google.CertificateStore('https://certs.example.com')
+        with mock.patch.object(google.requests, 'get', return_value=response) as get:
+            self.assertEqual(store.get('k1'), {'k1': 'cert'})
+            self.assertEqual(store.get('k1'), {'k1': 'cert'})
+            # 未知的 key id 在最短間隔內不重新下載
+            store.get('k2')
+        self.assertEqual(get.call_count, 1)
+        self.assertAlmostEqual(store.expires_at - store.fetched_at, 120)
@@ -1,12 +1,13 @@
-from django.contrib.auth import get_user_model
-from google.auth.transport import requests as google_requests
-from google.oauth2 import id_token
+import secrets
+
+from django.db import IntegrityError, transaction
 from rest_framework import permissions, status, views, viewsets
 from rest_framework.decorators import action
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from .google import verify_id_token
 from .models import User
 from .serializers import UserRegistrationSerializer, UserSerializer
 
@@ -61,6 +62,32 @@ class RegisterView(views.APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+def _create_google_user(email):
+    """
+    New USER account for a first Google login. The username is the email's
+    local part, or that plus a random suffix when taken; each candidate costs
+    one lookup on the unique username index, and a concurrent insert of the
+    same username or email is caught by the constraint itself.
+    """
+    base = email.split('@')[0][:140]
+    username = base
+    for _ in range(5):
+        if not User.objects.filter(username=username).exists():
+            try:
+                with transaction.atomic():
+                    # No password given: create_user marks it unusable
+                    return User.objects.create_user(
+                        username=username, email=email, role=User.Role.USER
+                    )
+            except IntegrityError:
+                # Same email signed in concurrently: use that account
+                user = User.objects.filter(email=email).first()
+                if user is not None:
+                    return user
+        username = f'{base}_{secrets.token_hex(3)}'
+    raise ValidationError({'error': 'Could not allocate a username'})
+
+
 class GoogleLoginView(views.APIView):
     permission_classes = [permissions.AllowAny]
 
@@ -73,56 +100,35 @@ class GoogleLoginView(views.APIView):
             )
 
         try:
-            # Verify the token with Google
-            # Note: In production, you should verify the AUDIENCE (CLIENT_ID) here too
-            # Adding clock_skew_in_seconds to handle slight time differences between Docker and Google
-            id_info = id_token.verify_oauth2_token(
-                token, google_requests.Request(), clock_skew_in_seconds=10
-            )
-            print(f'Google Token Verified: {id_info.get("email")}')
-
-            email = id_info.get('email')
-
-            if not email:
-                return Response(
-                    {'error': 'Invalid token: no email found'},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            # Find or Create User
-            user_model = get_user_model()
-            try:
-                user = user_model.objects.get(email=email)
-            except user_model.DoesNotExist:
-                # Create a new user
-                # We use email as username or generate a unique one
-                username = email.split('@')[0]
-                # Handle username collision simply for now
-                if user_model.objects.filter(username=username).exists():
-                    username = f'{username}_{user_model.objects.count()}'
-
-                user = user_model.objects.create_user(
-                    username=username,
-                    email=email,
-                    role='USER',  # Default role
-                )
-                user.set_unusable_password()
-                user.save()
-
-            # Generate JWT
-            refresh = RefreshToken.for_user(user)
-
-            return Response(
-                {
-                    'access': str(refresh.access_token),
-                    'refresh': str(refresh),
-                    'user': UserSerializer(user).data,
-                }
-            )
-
+            # Signature, expiry, issuer and audience (GOOGLE_CLIENT_IDS), with
+            # Google's certificates cached between logins
+            id_info = verify_id_token(token)
         except ValueError as e:
             print(f'Google Token Verification Failed: {str(e)}')
             return Response(
                 {'error': f'Token verification failed: {str(e)}'},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+
+        email = id_info.get('email')
+        if not email or not id_info.get('email_verified'):
+            return Response(
+                {'error': 'Invalid token: no verified email found'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Find or Create User
+        user = User.objects.filter(email=email).first()
+        if user is None:
+            user = _create_google_user(email)
+
+        # Generate JWT
+        refresh = RefreshToken.for_user(user)
+
+        return Response(
+            {
+                'access': str(refresh.access_token),
+                'refresh': str(refresh),
+                'user': UserSerializer(user).data,
+            }
+        )
@@ -2,6 +2,8 @@
 ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Served this way, equipment detail, scan and QR reads run as async views (see
+config/urls_async.py); every other endpoint is the same as under WSGI.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
@@ -12,5 +14,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+os.environ.setdefault('ROOT_URLCONF', 'config.urls_async')
+# Django's async views open connections from changing threads; don't keep them
+os.environ.setdefault('CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
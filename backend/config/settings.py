@@ -50,20 +50,25 @@ INSTALLED_APPS = [
     'apps.equipment',
     'apps.transactions',
     'apps.locations',
+    'apps.audits',
 ]
 
 MIDDLEWARE = [
+    'apps.common.middleware.RequestMetricsMiddleware',
+    'apps.common.middleware.QueryInspectorMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'apps.common.middleware.ReplicaRoutingMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'config.urls'
+# config/asgi.py switches to config.urls_async (async equipment read views)
+ROOT_URLCONF = config('ROOT_URLCONF', default='config.urls')
 
 TEMPLATES = [
     {
@@ -90,10 +95,33 @@ WSGI_APPLICATION = 'config.wsgi.application'
 DATABASES = {
     'default': dj_database_url.config(
         default=config('DATABASE_URL', default='sqlite:///db.sqlite3'),
-        conn_max_age=600,
+        # config/asgi.py sets 0: persistent connections leak under ASGI
+        conn_max_age=config('CONN_MAX_AGE', default=600, cast=int),
         conn_health_checks=True,
     )
 }
+# Read replicas (comma-separated URLs). Safe-method requests read from them;
+# see apps/common/db.py for what stays on the primary
+DATABASE_REPLICAS = []
+_replica_urls = [
+    url.strip()
+    for url in config('DATABASE_REPLICA_URLS', default='').split(',')
+    if url.strip()
+]
+for index, url in enumerate(_replica_urls):
+    alias = f'replica_{index}'
+    DATABASES[alias] = {
+        **dj_database_url.parse(
+            url,
+            conn_max_age=DATABASES['default']['CONN_MAX_AGE'],
+            conn_health_checks=True,
+        ),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['apps.common.db.PrimaryReplicaRouter']
+# After a write, the client's reads stay on the primary for this long
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=5, cast=int)
 
 
 # Password validation
@@ -178,6 +206,41 @@ else:
     MEDIA_URL = '/api/media/'
     MEDIA_ROOT = BASE_DIR / 'media'
 
+    # Served by apps.common.media.serve_media: uploads get immutable names and
+    # signed URLs; the byte transfer can be handed to the front proxy
+    STORAGES = {
+        'default': {'BACKEND': 'apps.common.media.ProtectedMediaStorage'},
+        'staticfiles': {
+            'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+        },
+    }
+    MEDIA_URL_TTL = config('MEDIA_URL_TTL', default=86400, cast=int)
+    # '' (Django streams the file), 'x-accel-redirect' (nginx) or 'x-sendfile'
+    MEDIA_SENDFILE = config('MEDIA_SENDFILE', default='')
+    # nginx `internal` location aliased to MEDIA_ROOT
+    MEDIA_ACCEL_PREFIX = config('MEDIA_ACCEL_PREFIX', default='/protected-media/')
+
+
+# Direct uploads (apps.common.uploads): presigned PUT URL lifetime; upload
+# tokens can be finalized for twice as long
+UPLOAD_URL_EXPIRES = config('UPLOAD_URL_EXPIRES', default=900, cast=int)
+UPLOAD_MAX_BYTES = config('UPLOAD_MAX_BYTES', default=20 * 1024 * 1024, cast=int)
+
+
+# Request metrics (apps.common.metrics). Under several worker processes set
+# METRICS_DIR to a directory shared by them and emptied on start
+METRICS_DIR = config('METRICS_DIR', default='')
+METRICS_FLUSH_SECONDS = config('METRICS_FLUSH_SECONDS', default=5, cast=float)
+# Bearer token required by /metrics; empty leaves it open
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# N+1 query detection (apps.common.queries): 'off', 'warn' (log) or 'raise'.
+# The test runner switches to 'raise'
+QUERY_INSPECTOR = config('QUERY_INSPECTOR', default='warn' if DEBUG else 'off')
+TEST_RUNNER = 'apps.common.queries.QueryCheckingTestRunner'
+# A statement shape run this many times in one request counts as an N+1
+QUERY_REPEAT_THRESHOLD = config('QUERY_REPEAT_THRESHOLD', default=3, cast=int)
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
@@ -191,7 +254,7 @@ AUTH_USER_MODEL = 'users.User'
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
@@ -233,6 +296,63 @@ else:
     X_FRAME_OPTIONS = 'SAMEORIGIN'
     SECURE_CROSS_ORIGIN_OPENER_POLICY = 'same-origin-allow-popups'
 
+# Transactions resolved longer ago than this are moved to the archive table
+# by `manage.py archive_transactions`
+TRANSACTION_ARCHIVE_AFTER_DAYS = config(
+    'TRANSACTION_ARCHIVE_AFTER_DAYS', default=365, cast=int
+)
+TRANSACTION_ARCHIVE_BATCH_SIZE = config(
+    'TRANSACTION_ARCHIVE_BATCH_SIZE', default=1000, cast=int
+)
+
+# Borrow reminders (`manage.py send_borrow_reminders`): borrows due within
+# this many hours get a "due soon" notice, past-due ones an "overdue" notice
+BORROW_REMINDER_DUE_SOON_HOURS = config(
+    'BORROW_REMINDER_DUE_SOON_HOURS', default=24, cast=int
+)
+BORROW_REMINDER_BATCH_SIZE = config('BORROW_REMINDER_BATCH_SIZE', default=500, cast=int)
+
+# Server-Sent Events (/api/v1/events/). Each open stream holds a worker
+# thread, so run gunicorn with threaded workers (e.g. --worker-class gthread)
+EVENT_STREAM_MAX_SECONDS = config('EVENT_STREAM_MAX_SECONDS', default=300, cast=int)
+EVENT_STREAM_POLL_SECONDS = config('EVENT_STREAM_POLL_SECONDS', default=1.0, cast=float)
+EVENT_STREAM_KEEPALIVE_SECONDS = 15
+EVENT_STREAM_RETRY_MS = 3000
+EVENT_STREAM_RETENTION_SECONDS = config(
+    'EVENT_STREAM_RETENTION_SECONDS', default=3600, cast=int
+)
+
+# Delta sync (/api/v1/sync/): change-log rows younger than this are held
+# back so a transaction still in flight cannot be skipped by a watermark
+SYNC_SAFETY_LAG_SECONDS = config('SYNC_SAFETY_LAG_SECONDS', default=2, cast=int)
+
+# Cache (per-process memory by default; point at Redis for multiple workers,
+# e.g. CACHE_BACKEND=django.core.cache.backends.redis.RedisCache)
+CACHES = {
+    'default': {
+        'BACKEND': config(
+            'CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': config('CACHE_LOCATION', default='qr-ems'),
+    }
+}
+# Scan payloads are keyed by equipment version; the timeout only bounds how
+# long a renamed location or user can show up stale
+SCAN_CACHE_TIMEOUT = config('SCAN_CACHE_TIMEOUT', default=300, cast=int)
+# Authenticated users are cached for this long; saving a user drops its entry
+AUTH_USER_CACHE_TIMEOUT = config('AUTH_USER_CACHE_TIMEOUT', default=60, cast=int)
+
+# Email
+EMAIL_BACKEND = config(
+    'EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend'
+)
+EMAIL_HOST = config('EMAIL_HOST', default='localhost')
+EMAIL_PORT = config('EMAIL_PORT', default=25, cast=int)
+EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
+EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
+EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=False, cast=bool)
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='QR-EMS <noreply@localhost>')
+
 # JWT Settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
@@ -241,3 +361,20 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
     'UPDATE_LAST_LOGIN': True,
 }
+
+# Google Sign-In: OAuth client ids accepted as ID-token audience (comma-separated)
+GOOGLE_CLIENT_IDS = [
+    client_id.strip()
+    for client_id in config('GOOGLE_CLIENT_IDS', default='').split(',')
+    if client_id.strip()
+]
+# Signing certificates; a local JSON file path works too (tests, offline setups)
+GOOGLE_CERTS_URL = config(
+    'GOOGLE_CERTS_URL', default='https://www.googleapis.com/oauth2/v1/certs'
+)
+# Used when the certificate response carries no Cache-Control max-age
+GOOGLE_CERTS_DEFAULT_MAX_AGE = config(
+    'GOOGLE_CERTS_DEFAULT_MAX_AGE', default=3600, cast=int
+)
+GOOGLE_CERTS_TIMEOUT = config('GOOGLE_CERTS_TIMEOUT', default=5, cast=float)
+GOOGLE_CLOCK_SKEW_SECONDS = 10
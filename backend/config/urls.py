@@ -1,5 +1,4 @@
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 from drf_spectacular.views import (
@@ -12,6 +11,9 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 
+from apps.common.media import serve_media
+from apps.common.metrics import metrics_view
+from apps.common.uploads import UploadView, local_upload
 from apps.users.views import RegisterView  # Import RegisterView
 
 urlpatterns = [
@@ -24,11 +26,17 @@ urlpatterns = [
     path(
         'api/v1/auth/register/', RegisterView.as_view(), name='register'
     ),  # Added registration path
+    # Direct uploads (apps.common.uploads)
+    path('api/v1/uploads/', UploadView.as_view(), name='upload'),
+    path('api/v1/uploads/local/', local_upload, name='upload-local'),
     # Apps
     path('api/v1/', include('apps.users.urls')),
     path('api/v1/', include('apps.equipment.urls')),
     path('api/v1/', include('apps.transactions.urls')),
     path('api/v1/locations/', include('apps.locations.urls')),
+    path('api/v1/', include('apps.audits.urls')),
+    # Prometheus scrape endpoint
+    path('metrics', metrics_view, name='metrics'),
     # Documentation
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     path(
@@ -43,5 +51,7 @@ urlpatterns = [
     ),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+if not settings.USE_S3:
+    urlpatterns += [
+        path('api/media/<path:path>', serve_media, name='media'),
+    ]
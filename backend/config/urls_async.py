@@ -0,0 +1,30 @@
+"""
+URLconf for the ASGI application (config/asgi.py): the async equipment read
+views take their paths ahead of the DRF router, everything else is shared
+with config/urls.py.
+"""
+
+from django.urls import path
+
+from apps.equipment import async_views
+
+from .urls import urlpatterns as wsgi_urlpatterns
+
+urlpatterns = [
+    path(
+        'api/v1/equipment/<uuid:uuid>/',
+        async_views.equipment_detail,
+        name='equipment-detail-async',
+    ),
+    path(
+        'api/v1/equipment/<str:uuid>/scan/',
+        async_views.equipment_scan,
+        name='equipment-scan-async',
+    ),
+    path(
+        'api/v1/equipment/<uuid:uuid>/qr/',
+        async_views.equipment_qr,
+        name='equipment-qr-async',
+    ),
+    *wsgi_urlpatterns,
+]
@@ -6,6 +6,7 @@ import { RegisterPage } from './pages/Auth/RegisterPage';
 import { Dashboard } from './pages/Dashboard/Dashboard';
 import { EquipmentDetailPage } from './pages/Equipment/EquipmentDetailPage';
 import { ScanPage } from './pages/Scan/ScanPage';
+import { ScanRedirectPage } from './pages/Scan/ScanRedirectPage';
 import { UserManagement } from './pages/Admin/UserManagement';
 import { ReturnRequests } from './pages/Admin/ReturnRequests';
 import { BorrowRequests } from './pages/Admin/BorrowRequests';
@@ -49,6 +50,8 @@ function App() {
               
               {/* Scan Routes */}
               <Route path="/scan" element={<ScanPage />} />
+              <Route path="/scan/:code" element={<ScanRedirectPage />} />
+              <Route path="/s/:code" element={<ScanRedirectPage />} />
 
               {/* Admin Routes */}
               <Route path="/admin/users" element={<UserManagement />} />
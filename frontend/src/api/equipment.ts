@@ -1,3 +1,4 @@
+import axios from 'axios';
 import client from './client';
 import type { Equipment, PaginatedResponse } from '../types';
 import type { Transaction } from './transactions';
@@ -23,11 +24,24 @@ export const getEquipmentDetail = async (uuid: string) => {
   return data;
 };
 
-export const getEquipmentHistory = async (uuid: string) => {
-  const { data } = await client.get<Transaction[]>(`/equipment/${uuid}/history/`);
+export interface EquipmentHistoryPage {
+  equipment: Pick<Equipment, 'uuid' | 'name' | 'status' | 'location' | 'zone' | 'cabinet' | 'number' | 'version'>;
+  next: string | null;
+  previous: string | null;
+  results: Transaction[];
+}
+
+export const getEquipmentHistory = async (uuid: string, cursor?: string | null) => {
+  const { data } = await client.get<EquipmentHistoryPage>(`/equipment/${uuid}/history/`, {
+    params: cursor ? { cursor } : undefined,
+  });
   return data;
 };
 
+// The history endpoint is cursor-paginated; `next` is an absolute URL.
+export const getHistoryCursor = (next: string | null) =>
+  next ? new URL(next, window.location.origin).searchParams.get('cursor') : null;
+
 export const createEquipment = async (data: Partial<Equipment> | FormData) => {
   const isFormData = data instanceof FormData;
   const { data: response } = await client.post<Equipment>('/equipment/', data, {
@@ -36,14 +50,28 @@ export const createEquipment = async (data: Partial<Equipment> | FormData) => {
   return response;
 };
 
-export const updateEquipment = async (uuid: string, data: Partial<Equipment> | FormData) => {
+export const updateEquipment = async (
+  uuid: string,
+  data: Partial<Equipment> | FormData,
+  version?: number
+) => {
   const isFormData = data instanceof FormData;
+  const headers: Record<string, string | undefined> = {};
+  if (isFormData) headers['Content-Type'] = undefined;
+  // Optimistic locking: the backend answers 412 if someone saved in between
+  if (version !== undefined) headers['If-Match'] = `"${version}"`;
   const { data: response } = await client.patch<Equipment>(`/equipment/${uuid}/`, data, {
-    headers: isFormData ? { 'Content-Type': undefined } : undefined,
+    headers,
   });
   return response;
 };
 
+// A 412 from updateEquipment: the equipment changed after `version` was loaded
+export const isVersionConflict = (err: unknown) =>
+  axios.isAxiosError(err) && err.response?.status === 412;
+
+export const VERSION_CONFLICT_MESSAGE = '此設備已被其他人修改，已重新載入最新資料，請確認後再操作一次。';
+
 export const deleteEquipment = async (uuid: string) => {
   await client.delete(`/equipment/${uuid}/`);
 };
@@ -51,3 +79,27 @@ export const deleteEquipment = async (uuid: string) => {
 export const bulkDeleteEquipment = async (uuids: string[]) => {
   await client.post('/equipment/bulk-delete/', { uuids });
 };
+
+export interface ScanEvent {
+  uuid: string;
+  scanned_at: string;
+  location?: string;
+  zone?: string;
+  cabinet?: string;
+  number?: string;
+}
+
+export interface ScanBatchReport {
+  received: number;
+  applied: string[];
+  unchanged: string[];
+  stale: string[];
+  not_found: string[];
+  invalid_location: string[];
+}
+
+// Replays scans queued while offline; the backend accepts up to 2000 per request
+export const uploadScans = async (scans: ScanEvent[]) => {
+  const { data } = await client.post<ScanBatchReport>('/equipment/scans/', { scans });
+  return data;
+};
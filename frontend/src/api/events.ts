@@ -0,0 +1,44 @@
+import { useEffect } from 'react';
+import { useQueryClient } from '@tanstack/react-query';
+import { useAuthStore } from '../store/useAuthStore';
+
+const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || '/api/v1';
+
+const TRANSACTION_EVENTS = ['transaction.created', 'transaction.approved', 'transaction.rejected'];
+const RECONNECT_DELAY_MS = 5000;
+
+// Subscribes to the server event stream and invalidates the affected queries,
+// so approval screens update without polling.
+export const useLiveUpdates = () => {
+  const queryClient = useQueryClient();
+  const accessToken = useAuthStore((state) => state.accessToken);
+
+  useEffect(() => {
+    if (!accessToken) return;
+
+    let source: EventSource | null = null;
+    let retryTimer: ReturnType<typeof setTimeout> | undefined;
+
+    const connect = () => {
+      // EventSource cannot send headers, so the token goes in the query string
+      const token = useAuthStore.getState().accessToken ?? '';
+      source = new EventSource(`${API_BASE_URL}/events/?access_token=${encodeURIComponent(token)}`);
+      TRANSACTION_EVENTS.forEach((kind) =>
+        source?.addEventListener(kind, () => queryClient.invalidateQueries({ queryKey: ['transactions'] }))
+      );
+      source.addEventListener('equipment.status', () => queryClient.invalidateQueries({ queryKey: ['equipment'] }));
+      source.onerror = () => {
+        // The browser retries dropped connections itself; a rejected token closes the stream
+        if (source?.readyState === EventSource.CLOSED) {
+          retryTimer = setTimeout(connect, RECONNECT_DELAY_MS);
+        }
+      };
+    };
+
+    connect();
+    return () => {
+      clearTimeout(retryTimer);
+      source?.close();
+    };
+  }, [accessToken, queryClient]);
+};
@@ -1,11 +1,13 @@
 import React, { useState } from 'react';
 import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import { transactionsApi } from '../../api/transactions';
+import { useLiveUpdates } from '../../api/events';
 import { CheckCircle, XCircle, Clock, User, Box, ArrowLeft, Shield, AlertCircle, FileText, Truck } from 'lucide-react';
 import { useNavigate } from 'react-router-dom';
 
 export const DispatchRequests = () => {
   const queryClient = useQueryClient();
+  useLiveUpdates();
   const navigate = useNavigate();
   const [filter, setFilter] = useState<'PENDING_APPROVAL' | 'ALL'>('PENDING_APPROVAL');
   const [selectedIds, setSelectedIds] = useState<number[]>([]);
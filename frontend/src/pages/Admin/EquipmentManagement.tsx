@@ -1,6 +1,6 @@
 import React, { useState } from 'react';
 import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
-import { getEquipmentList, updateEquipment, createEquipment } from '../../api/equipment';
+import { getEquipmentList, updateEquipment, createEquipment, isVersionConflict, VERSION_CONFLICT_MESSAGE } from '../../api/equipment';
 import { getLocations } from '../../api/locations';
 
 import { getCategories } from '../../api/categories';
@@ -68,7 +68,7 @@ export const EquipmentManagement = () => {
 
 
   const updateMutation = useMutation({
-    mutationFn: ({ uuid, data }: { uuid: string; data: Partial<Equipment> | FormData }) => updateEquipment(uuid, data),
+    mutationFn: ({ uuid, data, version }: { uuid: string; data: Partial<Equipment> | FormData; version?: number }) => updateEquipment(uuid, data, version),
     onSuccess: () => {
       queryClient.invalidateQueries({ queryKey: ['equipment'] });
       setIsModalOpen(false);
@@ -76,7 +76,17 @@ export const EquipmentManagement = () => {
       setSelectedFile(null);
       alert('更新成功');
     },
-    onError: (err: Error) => alert('更新失敗: ' + err.message)
+    onError: (err: Error) => {
+      if (isVersionConflict(err)) {
+        // The form holds the stale copy; close it so the reloaded row is edited instead
+        queryClient.invalidateQueries({ queryKey: ['equipment'] });
+        setIsModalOpen(false);
+        setEditingItem(null);
+        alert(VERSION_CONFLICT_MESSAGE);
+        return;
+      }
+      alert('更新失敗: ' + err.message);
+    }
   });
 
   const createMutation = useMutation({
@@ -155,7 +165,7 @@ export const EquipmentManagement = () => {
     }
 
     if (editingItem.uuid) {
-      updateMutation.mutate({ uuid: editingItem.uuid, data: formData });
+      updateMutation.mutate({ uuid: editingItem.uuid, data: formData, version: editingItem.version });
     } else {
       createMutation.mutate(formData);
     }
@@ -2,7 +2,7 @@ import React, { useState } from 'react';
 import { useSearchParams, useNavigate } from 'react-router-dom';
 import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import { getLocationDetail } from '../../../api/locations';
-import { getEquipmentDetail, updateEquipment } from '../../../api/equipment';
+import { getEquipmentDetail, updateEquipment, isVersionConflict, VERSION_CONFLICT_MESSAGE } from '../../../api/equipment';
 import type { Equipment } from '../../../types';
 import { ArrowLeft, MapPin, Box, CheckCircle, QrCode } from 'lucide-react';
 
@@ -34,13 +34,23 @@ export const LocationConfirmPage = () => {
   });
 
   const updateMutation = useMutation({
-    mutationFn: ({ uuid, data }: { uuid: string; data: Partial<Equipment> }) => updateEquipment(uuid, data),
+    mutationFn: ({ uuid, data, version }: { uuid: string; data: Partial<Equipment>; version?: number }) => updateEquipment(uuid, data, version),
     onSuccess: () => {
       alert('設備位置已更新！');
       navigate('/');
       queryClient.invalidateQueries({ queryKey: ['equipment'] });
     },
-    onError: (err: Error) => {
+    onError: async (err: Error, { uuid }) => {
+      if (isVersionConflict(err)) {
+        // Show the current state so the placement is confirmed against it
+        try {
+          setScannedEquipment(await getEquipmentDetail(uuid));
+        } catch {
+          setScannedEquipment(null);
+        }
+        setError(VERSION_CONFLICT_MESSAGE);
+        return;
+      }
       // @ts-expect-error - Axios error response structure
       const detail = err.response?.data?.detail;
       setError('更新失敗：' + (detail || err.message));
@@ -78,6 +88,7 @@ export const LocationConfirmPage = () => {
 
     updateMutation.mutate({
       uuid: scannedEquipment.uuid,
+      version: scannedEquipment.version,
       data: { 
           location: locationUuid,
           target_location: null,
@@ -94,6 +105,7 @@ export const LocationConfirmPage = () => {
 
     updateMutation.mutate({
       uuid: scannedEquipment.uuid,
+      version: scannedEquipment.version,
       data: { 
           target_location: locationUuid,
           status: 'TO_BE_MOVED'
@@ -1,7 +1,7 @@
 import React, { useState } from 'react';
 import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import { getLocations, createLocation, updateLocation, deleteLocation } from '../../../api/locations';
-import { getEquipmentList, updateEquipment } from '../../../api/equipment';
+import { getEquipmentList, updateEquipment, isVersionConflict, VERSION_CONFLICT_MESSAGE } from '../../../api/equipment';
 import { getCategories } from '../../../api/categories';
 import type { Equipment, Location } from '../../../types';
 import { ArrowLeft, Warehouse, Plus, Edit, Trash2, X, Save, Search, ChevronRight, ChevronLeft, QrCode, ExternalLink, Box } from 'lucide-react';
@@ -85,11 +85,22 @@ export const LocationManagement = () => {
   };
 
   const equipmentMutation = useMutation({
-    mutationFn: ({ uuid, data }: { uuid: string; data: Partial<Equipment> }) => updateEquipment(uuid, data),
+    mutationFn: ({ uuid, data, version }: { uuid: string; data: Partial<Equipment>; version?: number }) => updateEquipment(uuid, data, version),
     onSuccess: () => {
         queryClient.invalidateQueries({ queryKey: ['equipment-inventory'] });
         setMovingItem(null);
         alert('位置資訊已更新');
+    },
+    onError: (err: Error) => {
+        if (isVersionConflict(err)) {
+            queryClient.invalidateQueries({ queryKey: ['equipment-inventory'] });
+            setMovingItem(null);
+            alert(VERSION_CONFLICT_MESSAGE);
+            return;
+        }
+        // @ts-expect-error - Custom error response structure from axios
+        const detail = err.response?.data?.detail;
+        alert('更新失敗：' + (detail || err.message));
     }
   });
 
@@ -124,7 +135,7 @@ export const LocationManagement = () => {
           target_number: '',
           status: 'AVAILABLE'
       };
-      equipmentMutation.mutate({ uuid: movingItem.uuid, data: payload });
+      equipmentMutation.mutate({ uuid: movingItem.uuid, data: payload, version: movingItem.version });
   };
 
   return (
@@ -1,6 +1,7 @@
 import React, { useState } from 'react';
 import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import { transactionsApi } from '../../api/transactions';
+import { useLiveUpdates } from '../../api/events';
 import { getLocations } from '../../api/locations';
 import type { Transaction } from '../../api/transactions';
 import { CheckCircle, XCircle, Clock, User, Box, MapPin, X, ArrowLeft, Shield, AlertCircle } from 'lucide-react';
@@ -12,6 +13,7 @@ const LOCATION_NUMBERS = Array.from({ length: 10 }, (_, i) => `${i + 1}號`).con
 
 export const ReturnRequests = () => {
   const queryClient = useQueryClient();
+  useLiveUpdates();
   const navigate = useNavigate();
   const [filter, setFilter] = useState<'PENDING_APPROVAL' | 'ALL'>('PENDING_APPROVAL');
   const [selectedIds, setSelectedIds] = useState<number[]>([]);
@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useParams, useNavigate, useSearchParams } from 'react-router-dom';
-import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
-import { getEquipmentDetail, getEquipmentHistory, updateEquipment } from '../../api/equipment';
+import { useQuery, useInfiniteQuery, useMutation, useQueryClient } from '@tanstack/react-query';
+import { getEquipmentDetail, getEquipmentHistory, getHistoryCursor, updateEquipment, isVersionConflict, VERSION_CONFLICT_MESSAGE } from '../../api/equipment';
 import { getLocations } from '../../api/locations';
 import { transactionsApi } from '../../api/transactions';
 import type { Equipment, Transaction } from '../../types';
@@ -61,11 +61,19 @@ export const EquipmentDetailPage = () => {
     enabled: !!uuid,
   });
 
-  const { data: history } = useQuery({
+  const {
+    data: historyPages,
+    fetchNextPage: fetchMoreHistory,
+    hasNextPage: hasMoreHistory,
+    isFetchingNextPage: isFetchingMoreHistory,
+  } = useInfiniteQuery({
     queryKey: ['equipment-history', uuid],
-    queryFn: () => getEquipmentHistory(uuid!),
+    queryFn: ({ pageParam }) => getEquipmentHistory(uuid!, pageParam),
+    initialPageParam: null as string | null,
+    getNextPageParam: (lastPage) => getHistoryCursor(lastPage.next),
     enabled: !!uuid,
   });
+  const history = historyPages?.pages.flatMap((page) => page.results);
 
   const { data: locations } = useQuery({
     queryKey: ['locations'],
@@ -90,7 +98,7 @@ export const EquipmentDetailPage = () => {
   }, [intent, equipment]);
 
   const moveMutation = useMutation({
-    mutationFn: ({ uuid, data }: { uuid: string; data: Partial<Equipment> | FormData }) => updateEquipment(uuid, data),
+    mutationFn: ({ uuid, data, version }: { uuid: string; data: Partial<Equipment> | FormData; version?: number }) => updateEquipment(uuid, data, version),
     onSuccess: () => {
       alert('操作成功！');
       setIsMoveModalOpen(false);
@@ -101,6 +109,12 @@ export const EquipmentDetailPage = () => {
       queryClient.invalidateQueries({ queryKey: ['equipment-history', uuid] });
     },
     onError: (err: Error) => {
+      if (isVersionConflict(err)) {
+        queryClient.invalidateQueries({ queryKey: ['equipment', uuid] });
+        queryClient.invalidateQueries({ queryKey: ['equipment-history', uuid] });
+        alert(VERSION_CONFLICT_MESSAGE);
+        return;
+      }
       // @ts-expect-error - Custom axios error response
       const detail = (err as Record<string, unknown>).response?.data?.detail;
       alert('操作失敗：' + (detail || err.message));
@@ -216,7 +230,7 @@ export const EquipmentDetailPage = () => {
     formData.append('target_cabinet', targetCabinet || '');
     formData.append('target_number', targetNumber || '');
     formData.append('status', 'TO_BE_MOVED');
-    moveMutation.mutate({ uuid, data: formData });
+    moveMutation.mutate({ uuid, data: formData, version: equipment.version });
   };
 
   const handleConfirmAction = async (e: React.FormEvent) => {
@@ -245,12 +259,12 @@ export const EquipmentDetailPage = () => {
         }
         setIsCompressing(false);
     }
-    moveMutation.mutate({ uuid, data: formData });
+    moveMutation.mutate({ uuid, data: formData, version: equipment.version });
   };
 
   const actionMap: Record<string, string> = {
     BORROW: '借用', RETURN: '歸還', MAINTENANCE_IN: '送修', MAINTENANCE_OUT: '修復',
-    MOVE_START: '開始搬運', MOVE_CONFIRM: '搬運送達', DISPATCH: '出庫'
+    MOVE_START: '開始搬運', MOVE_CONFIRM: '搬運送達', DISPATCH: '出庫', MARK_LOST: '盤點遺失'
   };
 
   if (isLoading) return <div className="p-8 text-center text-gray-500 font-bold italic animate-pulse">載入設備詳情...</div>;
@@ -431,6 +445,15 @@ export const EquipmentDetailPage = () => {
                         </div>
                     </div>
                 )) : <div className="p-10 text-center text-gray-400 text-xs font-bold italic">暫無歷史紀錄</div>}
+                {hasMoreHistory && (
+                    <button
+                        onClick={() => fetchMoreHistory()}
+                        disabled={isFetchingMoreHistory}
+                        className="w-full p-4 text-xs font-bold text-gray-500 hover:bg-gray-50 disabled:opacity-50"
+                    >
+                        {isFetchingMoreHistory ? '載入中...' : '載入更多'}
+                    </button>
+                )}
             </div>
         </div>
       </div>
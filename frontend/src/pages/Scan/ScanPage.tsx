@@ -2,6 +2,7 @@ import React, { useEffect, useState, useRef } from 'react';
 import { Html5Qrcode, Html5QrcodeSupportedFormats } from 'html5-qrcode';
 import { useNavigate, useSearchParams } from 'react-router-dom';
 import { ArrowLeft, Search, QrCode, Camera, X, Image as ImageIcon } from 'lucide-react';
+import { extractEquipmentUuid } from '../../utils/equipmentCode';
 
 export const ScanPage = () => {
   const navigate = useNavigate();
@@ -40,12 +41,6 @@ export const ScanPage = () => {
     };
   }, []);
 
-  const extractUuid = (text: string): string | null => {
-    const uuidPattern = /[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}/i;
-    const match = text.match(uuidPattern);
-    return match ? match[0] : null;
-  };
-
   const handleScanSuccess = (decodedText: string) => {
     if (decodedText.startsWith('location:')) {
       const locationContent = decodedText.substring(9); // Everything after 'location:'
@@ -57,7 +52,7 @@ export const ScanPage = () => {
       return;
     }
 
-    const uuid = extractUuid(decodedText);
+    const uuid = extractEquipmentUuid(decodedText);
     if (uuid) {
       stopScanning();
       if (intent) {
@@ -114,7 +109,7 @@ export const ScanPage = () => {
 
   const handleManualSubmit = (e: React.FormEvent) => {
     e.preventDefault();
-    const uuid = extractUuid(manualId);
+    const uuid = extractEquipmentUuid(manualId);
     if (uuid) {
       if (intent) {
         navigate(`/equipment/${uuid}?intent=${intent}`);
@@ -1,18 +1,21 @@
 import React, { useEffect } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
+import { extractEquipmentUuid } from '../../utils/equipmentCode';
 
 export const ScanRedirectPage = () => {
-  const { uuid } = useParams<{ uuid: string }>();
+  // `/s/:code` for short-code labels, `/scan/:code` for older UUID labels
+  const { code } = useParams<{ code: string }>();
   const navigate = useNavigate();
 
   useEffect(() => {
+    const uuid = code ? extractEquipmentUuid(code) : null;
     if (uuid) {
       // Redirect to the detail page
       navigate(`/equipment/${uuid}`, { replace: true });
     } else {
       navigate('/', { replace: true });
     }
-  }, [uuid, navigate]);
+  }, [code, navigate]);
 
   return (
     <div className="min-h-screen flex items-center justify-center bg-gray-50">
@@ -474,9 +474,10 @@ export interface components {
          *     * `MOVE_START` - Move Start
          *     * `MOVE_CONFIRM` - Move Confirm
          *     * `DISPATCH` - Dispatch
+         *     * `MARK_LOST` - Mark Lost
          * @enum {string}
          */
-        ActionEnum: "BORROW" | "RETURN" | "MAINTENANCE_IN" | "MAINTENANCE_OUT" | "MOVE_START" | "MOVE_CONFIRM" | "DISPATCH";
+        ActionEnum: "BORROW" | "RETURN" | "MAINTENANCE_IN" | "MAINTENANCE_OUT" | "MOVE_START" | "MOVE_CONFIRM" | "DISPATCH" | "MARK_LOST";
         Attachment: {
             readonly id: number;
             /**
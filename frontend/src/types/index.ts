@@ -50,6 +50,7 @@ export interface Equipment {
   target_number?: string;
   image?: string;
   rdf_metadata?: Record<string, unknown>;
+  version?: number;
   current_possession?: {
     id: number;
     username: string;
@@ -0,0 +1,37 @@
+// Short equipment codes printed in QR labels: the UUID's 16 bytes in
+// RFC 4648 base32 without padding (26 characters, A-Z and 2-7).
+// Mirrors backend/apps/equipment/codes.py.
+const BASE32_ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ234567';
+const UUID_PATTERN = /[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}/i;
+const SHORT_URL_PATTERN = /\/S\/([A-Z2-7]{26})(?:[/?#]|$)/i;
+const CODE_PATTERN = /^[A-Z2-7]{26}$/i;
+
+export const decodeShortCode = (code: string): string | null => {
+  if (!CODE_PATTERN.test(code)) return null;
+
+  let bits = 0;
+  let value = 0;
+  const bytes: number[] = [];
+  for (const char of code.toUpperCase()) {
+    value = (value << 5) | BASE32_ALPHABET.indexOf(char);
+    bits += 5;
+    if (bits >= 8) {
+      bits -= 8;
+      bytes.push((value >> bits) & 0xff);
+    }
+  }
+  const hex = bytes.slice(0, 16).map((byte) => byte.toString(16).padStart(2, '0')).join('');
+  return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`;
+};
+
+// Equipment UUID from scanned or typed text: a short-code label URL, a bare
+// short code, or anything containing a hyphenated UUID (older labels).
+export const extractEquipmentUuid = (text: string): string | null => {
+  const trimmed = text.trim();
+  const shortUrl = trimmed.match(SHORT_URL_PATTERN);
+  if (shortUrl) return decodeShortCode(shortUrl[1]);
+  if (CODE_PATTERN.test(trimmed)) return decodeShortCode(trimmed);
+
+  const match = trimmed.match(UUID_PATTERN);
+  return match ? match[0].toLowerCase() : null;
+};